@@ -0,0 +1,333 @@
+import os
+import re
+import json
+import glob
+import struct
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock, Thread
+
+# Posting list entry on disk: document id inside the segment
+POSTING = struct.Struct("<I")
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+STOP_WORDS = {
+    'a', 'an', 'the', 'and', 'or', 'but', 'is', 'are', 'was', 'were', 'be', 'to', 'of',
+    'in', 'on', 'at', 'for', 'with', 'about', 'what', 'did', 'do', 'does', 'you', 'your',
+    'i', 'me', 'my', 'it', 'that', 'this', 'tell', 'told', 'have', 'has', 'had'
+}
+
+def tokenize(text: str) -> list:
+    """Lowercase text and split it into index terms"""
+    return [t.strip("'") for t in TOKEN_PATTERN.findall((text or "").lower())
+            if t.strip("'") and t.strip("'") not in STOP_WORDS]
+
+class ChatIndex:
+    """Incremental per-user inverted index over chat log turns"""
+
+    def __init__(self, base_dir: str = "chat_index", flush_every: int = 256, merge_factor: int = 4,
+                 cache_size: int = 128):
+        """Initialize index directory, in-memory buffers, tiered merge policy and header cache bound"""
+        self.base_dir = base_dir
+        os.makedirs(self.base_dir, exist_ok=True)
+        self.flush_every = flush_every
+        self.merge_factor = merge_factor
+        self.cache_size = cache_size
+        self._lock = Lock()
+        self._buffers = {}
+        self._segment_cache = OrderedDict()
+        self._merging = set()
+
+    def _user_dir(self, username: str) -> str:
+        """Return the on-disk directory holding a user's segments"""
+        path = os.path.join(self.base_dir, re.sub(r"[^A-Za-z0-9_.@-]", "_", username))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def add_turn(self, record: dict, segment_path: str) -> None:
+        """Index one chat turn written by ChatLogger.append"""
+        username = record.get('user', '')
+        terms = tokenize(record.get('user_msg', '')) + tokenize(record.get('bot_msg', ''))
+        doc = {
+            'segment': chat_segment_base(segment_path),
+            'session': record.get('session'),
+            'turn': record.get('turn'),
+            'ts': record.get('ts')
+        }
+
+        with self._lock:
+            buffer = self._buffers.setdefault(username, {'docs': [], 'postings': {}})
+            doc_id = len(buffer['docs'])
+            buffer['docs'].append(doc)
+            for term in set(terms):
+                buffer['postings'].setdefault(term, []).append(doc_id)
+            should_flush = len(buffer['docs']) >= self.flush_every
+
+        if should_flush:
+            self.flush(username)
+
+    def flush(self, username: str = None) -> None:
+        """Write buffered postings for one or all users as new immutable segments"""
+        with self._lock:
+            users = [username] if username else list(self._buffers)
+            pending = [(user, self._buffers.pop(user)) for user in users if user in self._buffers]
+
+        for user, buffer in pending:
+            if not buffer['docs']:
+                continue
+            self._write_segment(self._user_dir(user), buffer['docs'], buffer['postings'])
+            self._advance_checkpoint(user, buffer['docs'])
+            if self._merge_candidates(user):
+                self._schedule_merge(user)
+
+    def _checkpoint_path(self, username: str) -> str:
+        """Return the file recording how many turns of each chat segment are on disk"""
+        return os.path.join(self._user_dir(username), "flushed.json")
+
+    def _read_checkpoint(self, username: str) -> dict:
+        """Load the flushed turn count per chat segment for a user"""
+        try:
+            with open(self._checkpoint_path(username), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _advance_checkpoint(self, username: str, docs: list) -> None:
+        """Record the turns of a flushed segment as durable"""
+        with self._lock:
+            checkpoint = self._read_checkpoint(username)
+            for doc in docs:
+                base = os.path.basename(doc['segment'])
+                checkpoint[base] = max(checkpoint.get(base, 0), (doc.get('turn') or 0) + 1)
+            path = self._checkpoint_path(username)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(checkpoint, f)
+            os.replace(path + ".tmp", path)
+
+    def _write_segment(self, user_dir: str, docs: list, postings: dict) -> str:
+        """Write a segment as a JSON header plus a binary postings file"""
+        name = f"seg_{datetime.now().strftime('%Y%m%d%H%M%S%f')}_{len(docs)}"
+        post_path = os.path.join(user_dir, name + ".post")
+        terms = {}
+        with open(post_path, "wb") as f:
+            for term in sorted(postings):
+                ids = postings[term]
+                terms[term] = [f.tell() // POSTING.size, len(ids)]
+                f.write(b"".join(POSTING.pack(doc_id) for doc_id in ids))
+
+        # The header is written last so readers never see a half-written segment
+        header_path = os.path.join(user_dir, name + ".json")
+        with open(header_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({'docs': docs, 'terms': terms}, f)
+        os.replace(header_path + ".tmp", header_path)
+        return header_path
+
+    def _segment_paths(self, username: str) -> list:
+        """List a user's segment headers, oldest first"""
+        return sorted(glob.glob(os.path.join(self._user_dir(username), "seg_*.json")))
+
+    def _segment_size(self, header_path: str) -> int:
+        """Return the number of docs in a segment, taken from its name when present"""
+        name = os.path.basename(header_path)[:-len(".json")]
+        parts = name.split("_")
+        if len(parts) == 3 and parts[2].isdigit():
+            return int(parts[2])
+        return len(self._load_segment(header_path)['docs'])
+
+    def _load_segment(self, header_path: str) -> dict:
+        """Load a segment header through a bounded LRU cache"""
+        with self._lock:
+            segment = self._segment_cache.get(header_path)
+            if segment is not None:
+                self._segment_cache.move_to_end(header_path)
+                return segment
+
+        with open(header_path, "r", encoding="utf-8") as f:
+            segment = json.load(f)
+        segment['post_path'] = header_path[:-len(".json")] + ".post"
+        with self._lock:
+            self._segment_cache[header_path] = segment
+            while len(self._segment_cache) > self.cache_size:
+                self._segment_cache.popitem(last=False)
+        return segment
+
+    def _forget_segment(self, header_path: str) -> None:
+        """Drop a segment from the header cache"""
+        with self._lock:
+            self._segment_cache.pop(header_path, None)
+
+    def _read_postings(self, segment: dict, term: str) -> list:
+        """Read one term's posting list from a segment by seeking"""
+        entry = segment['terms'].get(term)
+        if not entry:
+            return []
+        start, count = entry
+        with open(segment['post_path'], "rb") as f:
+            f.seek(start * POSTING.size)
+            data = f.read(count * POSTING.size)
+        return [doc_id for (doc_id,) in POSTING.iter_unpack(data)]
+
+    def _schedule_merge(self, username: str) -> None:
+        """Merge a user's segments in the background"""
+        with self._lock:
+            if username in self._merging:
+                return
+            self._merging.add(username)
+        Thread(target=self.merge, args=(username,), daemon=True).start()
+
+    def _merge_candidates(self, username: str) -> list:
+        """Pick the oldest `merge_factor` segments of the smallest tier that is full"""
+        tiers = {}
+        for path in self._segment_paths(username):
+            size = max(self._segment_size(path), 1)
+            tier = 0
+            while size >= self.merge_factor ** (tier + 1):
+                tier += 1
+            tiers.setdefault(tier, []).append(path)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= self.merge_factor:
+                return tiers[tier][:self.merge_factor]
+        return []
+
+    def merge(self, username: str) -> None:
+        """Merge similarly sized segments of a user, tier by tier, until no tier is full"""
+        try:
+            while True:
+                paths = self._merge_candidates(username)
+                if not paths:
+                    return
+
+                docs = []
+                postings = {}
+                for path in paths:
+                    segment = self._load_segment(path)
+                    base = len(docs)
+                    docs.extend(segment['docs'])
+                    for term in segment['terms']:
+                        postings.setdefault(term, []).extend(base + doc_id for doc_id in self._read_postings(segment, term))
+
+                self._write_segment(self._user_dir(username), docs, postings)
+                for path in paths:
+                    self._forget_segment(path)
+                    os.remove(path)
+                    os.remove(path[:-len(".json")] + ".post")
+        except Exception as e:
+            print(f"Error merging chat index for {username}: {e}")
+        finally:
+            with self._lock:
+                self._merging.discard(username)
+
+    def search(self, username: str, query: str, limit: int = 10, since: str = None, until: str = None) -> list:
+        """Search a user's chat history, ranking turns by matched query terms then recency"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        candidates = []
+        with self._lock:
+            buffer = self._buffers.get(username)
+            if buffer:
+                buffer = {'docs': list(buffer['docs']),
+                          'postings': {t: list(buffer['postings'].get(t, [])) for t in terms}}
+        if buffer:
+            candidates.append((buffer['docs'], buffer['postings']))
+
+        for path in self._segment_paths(username):
+            try:
+                segment = self._load_segment(path)
+                candidates.append((segment['docs'], {t: self._read_postings(segment, t) for t in terms}))
+            except (OSError, ValueError):
+                continue  # Removed by a concurrent merge
+
+        scores = {}
+        for docs, postings in candidates:
+            for term, doc_ids in postings.items():
+                for doc_id in doc_ids:
+                    doc = docs[doc_id]
+                    key = (doc['segment'], doc['turn'])
+                    if key not in scores:
+                        scores[key] = [set(), doc]
+                    scores[key][0].add(term)
+
+        results = []
+        for matched, doc in scores.values():
+            score = len(matched)
+            if since and (doc.get('ts') or '') < since:
+                continue
+            if until and (doc.get('ts') or '') > until:
+                continue
+            results.append({'user': username, 'score': score, **doc})
+
+        results.sort(key=lambda r: (r['score'], r.get('ts') or ''), reverse=True)
+        return results[:limit]
+
+    def search_turns(self, username: str, query: str, limit: int = 10, **kwargs) -> list:
+        """Search and return the matching turn records read from the chat logs"""
+        from chat_logger import read_turns
+
+        turns = []
+        for hit in self.search(username, query, limit=limit, **kwargs):
+            path = resolve_chat_segment(hit['segment'])
+            if not path:
+                continue
+            records = read_turns(path, hit['turn'], hit['turn'] + 1)
+            if records:
+                turns.append({**hit, 'user_msg': records[0].get('user_msg'), 'bot_msg': records[0].get('bot_msg')})
+        return turns
+
+    def rebuild_user(self, username: str, chat_logger) -> int:
+        """Rebuild a user's index from their chat log segments"""
+        from chat_logger import read_turns
+
+        with self._lock:
+            self._buffers.pop(username, None)
+        for path in self._segment_paths(username):
+            self._forget_segment(path)
+            os.remove(path)
+            os.remove(path[:-len(".json")] + ".post")
+        if os.path.exists(self._checkpoint_path(username)):
+            os.remove(self._checkpoint_path(username))
+
+        count = 0
+        for path in reversed(chat_logger.get_user_chat_files(username)):
+            for record in read_turns(path):
+                self.add_turn(record, path)
+                count += 1
+        self.flush(username)
+        return count
+
+    def recover(self, segment_paths: list) -> int:
+        """Re-index turns of closed chat segments written after the last flush, e.g. lost in a crash"""
+        from chat_logger import read_turns, count_turns
+
+        by_user = {}
+        for path in segment_paths:
+            by_user.setdefault(os.path.basename(path).rsplit("_episode_", 1)[0], []).append(path)
+
+        count = 0
+        for username, paths in by_user.items():
+            checkpoint = self._read_checkpoint(username)
+            for path in paths:
+                path = resolve_chat_segment(chat_segment_base(path))
+                if not path:
+                    continue
+                flushed = checkpoint.get(os.path.basename(chat_segment_base(path)), 0)
+                total = count_turns(path)
+                for record in read_turns(path, flushed, total) if total > flushed else []:
+                    self.add_turn(record, path)
+                    count += 1
+            self.flush(username)
+        return count
+
+def chat_segment_base(segment_path: str) -> str:
+    """Strip compression suffixes so postings survive segment compression"""
+    for suffix in (".gz", ".zst"):
+        if segment_path.endswith(suffix):
+            return segment_path[:-len(suffix)]
+    return segment_path
+
+def resolve_chat_segment(base_path: str) -> str:
+    """Find the current file for a chat segment, compressed or not"""
+    for suffix in ("", ".gz", ".zst"):
+        if os.path.exists(base_path + suffix):
+            return base_path + suffix
+    return None
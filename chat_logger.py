@@ -1,81 +1,395 @@
 import os
+import re
+import json
+import gzip
+import zlib
+import struct
+import time
 from datetime import datetime
-from threading import Lock
+from threading import Lock, Thread
 import glob
+import tempfile
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Index entry per turn: (block offset in segment, offset inside the block, record length)
+INDEX_ENTRY = struct.Struct("<QII")
+SEGMENT_SUFFIXES = (".jsonl", ".jsonl.gz", ".jsonl.zst")
+SEGMENT_NAME = re.compile(r"_episode_(\d{8}_\d{6}(?:_\d{6})?)(?:_part(\d+))?\.jsonl(?:\.gz|\.zst)?$")
 
 class ChatLogger:
     """Handles chat logging functionality for user sessions"""
-    
+
     _lock = Lock()
 
-    def __init__(self, base_dir: str = "chat_logs"):
-        """Initialize chat logger with base directory"""
+    def __init__(self, base_dir: str = "chat_logs", max_segment_bytes: int = 4 * 1024 * 1024,
+                 max_segment_age: int = 24 * 3600, compression: str = "gzip", block_records: int = 64,
+                 index=None, compress_orphans: bool = True):
+        """Initialize chat logger with base directory, segment rotation settings and optional search index"""
         self.base_dir = base_dir
         os.makedirs(self.base_dir, exist_ok=True)
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.compression = compression if compression != "zstd" or zstandard else "gzip"
+        self.block_records = block_records
+        self.index = index
         self._current_files = {}
+        self.compress_orphans = compress_orphans
+        if (self.compression and compress_orphans) or self.index:
+            # Only segments present before this logger opened any are left over from a previous run
+            leftover = [path for path in glob.glob(os.path.join(self.base_dir, "*_episode_*"))
+                        if path.endswith(SEGMENT_SUFFIXES)]
+            Thread(target=self._recover, args=(leftover,), daemon=True).start()
+
+    def _recover(self, paths: list) -> None:
+        """Finish work interrupted by the previous run: compress its open segments, then catch up the index"""
+        if self.compression and self.compress_orphans:
+            for i, path in enumerate(paths):
+                try:
+                    paths[i] = self.compress_segment(path)
+                except Exception as e:
+                    print(f"Error compressing chat segment {path}: {e}")
+        if self.index:
+            try:
+                self.index.recover(paths)
+            except Exception as e:
+                print(f"Error recovering chat index: {e}")
 
     def start_session(self, username: str, session_key: str) -> None:
-        """Create a new log file for a user's login session"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{username}_episode_{timestamp}.txt"
-        path = os.path.join(self.base_dir, filename)
-        open(path, "a", encoding="utf-8").close()
-        self._current_files[session_key] = path
-
-    def append(self, session_key: str, username: str, user_msg: str, bot_msg: str) -> None:
-        """Append a user-bot conversation turn to the active log file"""
+        """Create a new log segment for a user's login session"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        self._open_segment(username, session_key, timestamp, 0)
+
+    def _open_segment(self, username: str, session_key: str, timestamp: str, part: int) -> None:
+        """Open a fresh segment and its offset index for a session"""
+        while True:
+            suffix = f"_part{part}" if part else ""
+            path = os.path.join(self.base_dir, f"{username}_episode_{timestamp}{suffix}.jsonl")
+            # Never reopen a name that was already closed and compressed
+            if not any(os.path.exists(path + ext) for ext in (".gz", ".zst")):
+                try:
+                    # Exclusive create, so two sessions can never share a segment
+                    open(path, "x", encoding="utf-8").close()
+                    break
+                except FileExistsError:
+                    pass
+            part += 1
+        open(index_path(path), "ab").close()
+        self._current_files[session_key] = {
+            'path': path,
+            'username': username,
+            'timestamp': timestamp,
+            'part': part,
+            'opened_at': time.time(),
+            'size': os.path.getsize(path),
+            'turn': 0
+        }
+
+    def append(self, session_key: str, username: str, user_msg: str, bot_msg: str,
+               latency_ms: float = None) -> None:
+        """Append a user-bot conversation turn to the active log segment"""
         if session_key not in self._current_files:
             self.start_session(username, session_key)
 
-        user_line = f"{username} : {user_msg}\n"
-        bot_line = f"Bot : {bot_msg}\n"
-
         with ChatLogger._lock:
-            with open(self._current_files[session_key], "a", encoding="utf-8") as f:
-                f.write(user_line)
-                f.write(bot_line)
+            segment = self._current_files[session_key]
+            if (segment['size'] >= self.max_segment_bytes or
+                    time.time() - segment['opened_at'] >= self.max_segment_age):
+                self._rotate(session_key)
+                segment = self._current_files[session_key]
+
+            record = {
+                'ts': datetime.now().isoformat(),
+                'session': session_key,
+                'user': username,
+                'turn': segment['turn'],
+                'user_msg': user_msg,
+                'bot_msg': bot_msg,
+                'latency_ms': round(latency_ms, 2) if latency_ms is not None else None
+            }
+            line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+            with open(segment['path'], "ab") as f:
+                offset = f.tell()
+                f.write(line)
+            with open(index_path(segment['path']), "ab") as f:
+                f.write(INDEX_ENTRY.pack(offset, 0, len(line)))
+
+            segment['size'] = offset + len(line)
+            segment['turn'] += 1
+            path = segment['path']
+
+        if self.index:
+            try:
+                self.index.add_turn(record, path)
+            except Exception as e:
+                print(f"Error indexing chat turn: {e}")
+
+    def _rotate(self, session_key: str) -> None:
+        """Close the active segment of a session and continue in a new one"""
+        segment = self._current_files[session_key]
+        self._close_segment(segment['path'])
+        self._open_segment(segment['username'], session_key, segment['timestamp'], segment['part'] + 1)
+
+    def _close_segment(self, path: str) -> None:
+        """Compress a closed segment in the background"""
+        if self.compression:
+            Thread(target=self.compress_segment, args=(path,), daemon=True).start()
 
     def end_session(self, session_key: str) -> None:
-        """End session and remove file mapping"""
-        self._current_files.pop(session_key, None)
-    
+        """End session, compress its segment and remove file mapping"""
+        segment = self._current_files.pop(session_key, None)
+        if segment:
+            self._close_segment(segment['path'])
+            if self.index:
+                self.index.flush(segment['username'])
+
+    def compress_segment(self, path: str) -> str:
+        """Rewrite a closed segment as independently compressed blocks with a new index"""
+        if not path.endswith(".jsonl") or not os.path.exists(path):
+            return path
+
+        # Closed segments are never appended to again, so no lock is held while compressing
+        entries = read_index(path)
+        with open(path, "rb") as f:
+            data = f.read()
+
+        ext = ".zst" if self.compression == "zstd" else ".gz"
+        out_path = path + ext
+        if os.path.exists(out_path):
+            # Left behind by a crash after the compressed copy was already in place
+            _remove_segment(path)
+            return out_path
+
+        new_entries = []
+        fd, tmp_path = tempfile.mkstemp(dir=self.base_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as out:
+            for start in range(0, len(entries), self.block_records):
+                block = entries[start:start + self.block_records]
+                block_offset = out.tell()
+                raw = bytearray()
+                for offset, _, length in block:
+                    new_entries.append((block_offset, len(raw), length))
+                    raw += data[offset:offset + length]
+                out.write(_compress_block(bytes(raw), self.compression))
+
+        fd, tmp_index = tempfile.mkstemp(dir=self.base_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            for entry in new_entries:
+                f.write(INDEX_ENTRY.pack(*entry))
+
+        # The index goes first so a visible compressed segment always has a complete index
+        os.replace(tmp_index, index_path(out_path))
+        os.replace(tmp_path, out_path)
+        _remove_segment(path)
+        return out_path
+
     def get_user_chat_files(self, username: str) -> list:
-        """Get all chat files for a specific user, sorted by modification time"""
-        pattern = os.path.join(self.base_dir, f"{username}_episode_*.txt")
-        return sorted(glob.glob(pattern), key=os.path.getmtime, reverse=True)
-    
+        """Get all chat segments for a specific user, newest first by session timestamp and part"""
+        pattern = os.path.join(self.base_dir, f"{username}_episode_*")
+        segments = {}
+        for path in glob.glob(pattern):
+            match = SEGMENT_NAME.search(path)
+            if not match:
+                continue
+            # A segment caught between compression and cleanup exists twice; keep the compressed copy
+            key = (match.group(1), int(match.group(2) or 0))
+            if key not in segments or not path.endswith(".jsonl"):
+                segments[key] = path
+        return [segments[key] for key in sorted(segments, reverse=True)]
+
+    def read_turns(self, path: str, start: int = 0, stop: int = None) -> list:
+        """Read a range of turn records from a segment by seeking through its offset index"""
+        return read_turns(path, start, stop)
+
     def get_recent_conversations(self, username: str, limit: int = 10) -> list:
-        """Get recent conversations from the most recent chat file"""
-        chat_files = self.get_user_chat_files(username)
-        if not chat_files:
-            return []
-        
-        conversations = []
+        """Get the last `limit` conversation turns across the user's most recent segments"""
+        records = []
         try:
-            with open(chat_files[0], 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            for i in range(0, len(lines), 2):
-                if i + 1 < len(lines):
-                    user_line = lines[i].strip()
-                    bot_line = lines[i + 1].strip()
-                    
-                    if " : " in user_line and " : " in bot_line:
-                        user_msg = user_line.split(" : ", 1)[1]
-                        bot_msg = bot_line.split(" : ", 1)[1]
-                        conversations.append({
-                            'user_msg': user_msg,
-                            'bot_msg': bot_msg
-                        })
-                        
-                        if len(conversations) >= limit:
-                            break
-            
-            return conversations
+            for path in self.get_user_chat_files(username):
+                needed = limit - len(records)
+                if needed <= 0:
+                    break
+                count = count_turns(path)
+                records[:0] = read_turns(path, max(count - needed, 0), count)
         except Exception as e:
             print(f"Error reading chat file: {e}")
             return []
-    
+
+        return [{
+            'user_msg': record.get('user_msg', ''),
+            'bot_msg': record.get('bot_msg', '')
+        } for record in records]
+
+    def search_history(self, username: str, query: str, limit: int = 10, **kwargs) -> list:
+        """Search a user's chat history through the inverted index"""
+        if not self.index:
+            return []
+        return self.index.search_turns(username, query, limit=limit, **kwargs)
+
     def has_previous_chats(self, username: str) -> bool:
         """Check if user has any previous chat history"""
         return len(self.get_user_chat_files(username)) > 0
+
+def index_path(segment_path: str) -> str:
+    """Return the sidecar offset index path for a segment"""
+    return segment_path + ".idx"
+
+def read_index(segment_path: str, start: int = 0, stop: int = None) -> list:
+    """Read offset index entries [start, stop) for a segment"""
+    path = index_path(segment_path)
+    if not os.path.exists(path):
+        return []
+
+    with open(path, "rb") as f:
+        f.seek(start * INDEX_ENTRY.size)
+        if stop is None:
+            data = f.read()
+        else:
+            data = f.read(max(stop - start, 0) * INDEX_ENTRY.size)
+    usable = len(data) - len(data) % INDEX_ENTRY.size
+    return list(INDEX_ENTRY.iter_unpack(data[:usable]))
+
+def count_turns(segment_path: str) -> int:
+    """Return the number of turns recorded in a segment's offset index"""
+    try:
+        return os.path.getsize(index_path(segment_path)) // INDEX_ENTRY.size
+    except OSError:
+        return 0
+
+def read_turns(segment_path: str, start: int = 0, stop: int = None) -> list:
+    """Read turn records [start, stop) from a plain or block-compressed segment"""
+    entries = read_index(segment_path, start, stop)
+    if not entries:
+        return []
+
+    records = []
+    compression = _segment_compression(segment_path)
+    with open(segment_path, "rb") as f:
+        if compression is None:
+            for offset, _, length in entries:
+                f.seek(offset)
+                records.append(json.loads(f.read(length)))
+            return records
+
+        block_cache = {}
+        for block_offset, inner, length in entries:
+            if block_offset not in block_cache:
+                f.seek(block_offset)
+                block_cache = {block_offset: _decompress_block(f, compression)}
+            raw = block_cache[block_offset]
+            records.append(json.loads(raw[inner:inner + length]))
+    return records
+
+def _remove_segment(segment_path: str) -> None:
+    """Delete a segment and its offset index, tolerating concurrent removal"""
+    for path in (index_path(segment_path), segment_path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def _segment_compression(path: str) -> str:
+    """Detect segment compression from its file name"""
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return None
+
+def _compress_block(raw: bytes, compression: str) -> bytes:
+    """Compress one block as a standalone gzip member or zstd frame"""
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().compress(raw)
+    return gzip.compress(raw)
+
+def _decompress_block(f, compression: str) -> bytes:
+    """Decompress the single block starting at the current file position"""
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read .zst chat segments")
+        reader = zstandard.ZstdDecompressor().decompressobj()
+    else:
+        reader = zlib.decompressobj(wbits=31)
+
+    chunks = []
+    while not reader.eof:
+        chunk = f.read(65536)
+        if not chunk:
+            break
+        chunks.append(reader.decompress(chunk))
+    return b"".join(chunks)
+
+def convert_legacy_logs(base_dir: str = "chat_logs", compression: str = "gzip", remove: bool = False) -> list:
+    """Convert free-text `name : message` logs into structured JSONL segments"""
+    converted = []
+    logger = ChatLogger(base_dir, compression=compression, compress_orphans=False)
+
+    for txt_path in sorted(glob.glob(os.path.join(base_dir, "*_episode_*.txt"))):
+        filename = os.path.basename(txt_path)[:-len(".txt")]
+        username, timestamp = filename.rsplit("_episode_", 1)
+        try:
+            started = datetime.strptime(timestamp, "%Y%m%d_%H%M%S").isoformat()
+        except ValueError:
+            started = datetime.fromtimestamp(os.path.getmtime(txt_path)).isoformat()
+
+        # Lines without a speaker prefix are continuations of a multi-line message
+        messages = []
+        with open(txt_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if line.startswith("Bot : "):
+                    messages.append(["bot", line[len("Bot : "):]])
+                elif line.startswith(f"{username} : "):
+                    messages.append(["user", line[len(username) + 3:]])
+                elif messages:
+                    messages[-1][1] += "\n" + line
+
+        out_path = os.path.join(base_dir, f"{filename}.jsonl")
+        with open(out_path, "wb") as out, open(index_path(out_path), "wb") as idx:
+            turn = 0
+            pending_user = None
+            for speaker, text in messages:
+                if speaker == "user":
+                    pending_user = text
+                    continue
+                record = {
+                    'ts': started,
+                    'session': timestamp,
+                    'user': username,
+                    'turn': turn,
+                    'user_msg': pending_user or "",
+                    'bot_msg': text,
+                    'latency_ms': None
+                }
+                line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+                idx.write(INDEX_ENTRY.pack(out.tell(), 0, len(line)))
+                out.write(line)
+                pending_user = None
+                turn += 1
+
+        os.utime(out_path, (os.path.getatime(txt_path), os.path.getmtime(txt_path)))
+        if compression:
+            mtime = os.path.getmtime(out_path)
+            out_path = logger.compress_segment(out_path)
+            os.utime(out_path, (mtime, mtime))
+        if remove:
+            os.remove(txt_path)
+        converted.append(out_path)
+
+    return converted
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Convert legacy chat_logs/*.txt files to JSONL segments")
+    arg_parser.add_argument("--dir", default="chat_logs")
+    arg_parser.add_argument("--compression", choices=["gzip", "zstd", "none"], default="gzip")
+    arg_parser.add_argument("--remove", action="store_true", help="delete the .txt files after conversion")
+    args = arg_parser.parse_args()
+
+    results = convert_legacy_logs(args.dir, None if args.compression == "none" else args.compression, args.remove)
+    print(f"Converted {len(results)} chat log files")
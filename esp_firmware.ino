@@ -61,6 +61,7 @@ unsigned long lastSensorRead = 0;
 unsigned long lastHeartbeat = 0;
 const unsigned long sensorInterval = 5000;  // Read sensor every 5 seconds
 const unsigned long heartbeatInterval = 10000;  // Send heartbeat every 10 seconds
+const int commandPollWait = 8;  // Seconds a command long poll may wait; kept below the heartbeat interval
 
 // LED status colors
 enum LedColor {
@@ -370,51 +371,62 @@ void sendHeartbeat() {
   http.end();
 }
 
+void runCommand(JsonObject cmd) {
+  String command = cmd["command"] | "";
+  
+  if (command == "play_audio") {
+    if (cmd.containsKey("audio_data")) {
+      String audioData = cmd["audio_data"];
+      playAudio(audioData);
+    }
+  } else if (command == "set_led") {
+    if (cmd.containsKey("color")) {
+      String color = cmd["color"];
+      setLEDByColor(color);
+    }
+  } else if (command == "beep") {
+    int freq = cmd.containsKey("frequency") ? cmd["frequency"] : 1000;
+    int duration = cmd.containsKey("duration") ? cmd["duration"] : 200;
+    beep(freq, duration);
+  } else if (command == "get_sensors") {
+    readSensors();
+    sendHeartbeat();
+  }
+  
+  // Acknowledge command
+  if (cmd.containsKey("command_id")) {
+    acknowledgeCommand(cmd["command_id"]);
+  }
+}
+
 void checkServerCommands() {
   if (WiFi.status() != WL_CONNECTED) return;
   
+  // Long poll: the server holds the request until commands arrive or the wait passes,
+  // and returns every pending command at once
   HTTPClient http;
-  http.begin(String(serverURL) + "/api/hardware/commands/" + deviceId);
-  http.setTimeout(5000);
+  http.begin(String(serverURL) + "/api/hardware/commands/" + deviceId + "/poll?wait=" + String(commandPollWait));
+  http.setTimeout((commandPollWait + 5) * 1000);
   
   int httpResponseCode = http.GET();
   
   if (httpResponseCode == 200) {
     String response = http.getString();
-    Serial.println("Received command: " + response);
+    Serial.println("Received commands: " + response);
     
-    StaticJsonDocument<1000> doc;
-    deserializeJson(doc, response);
+    // Audio commands carry base64 data, so size the document from the response
+    DynamicJsonDocument doc(response.length() * 2 + 1024);
+    DeserializationError error = deserializeJson(doc, response);
     
-    if (doc.containsKey("command")) {
-      String command = doc["command"];
-      
-      if (command == "play_audio") {
-        if (doc.containsKey("audio_data")) {
-          String audioData = doc["audio_data"];
-          playAudio(audioData);
-        }
-      } else if (command == "set_led") {
-        if (doc.containsKey("color")) {
-          String color = doc["color"];
-          setLEDByColor(color);
-        }
-      } else if (command == "beep") {
-        int freq = doc.containsKey("frequency") ? doc["frequency"] : 1000;
-        int duration = doc.containsKey("duration") ? doc["duration"] : 200;
-        beep(freq, duration);
-      } else if (command == "get_sensors") {
-        readSensors();
-        sendHeartbeat();
-      }
-      
-      // Acknowledge command
-      if (doc.containsKey("command_id")) {
-        acknowledgeCommand(doc["command_id"]);
+    if (!error) {
+      for (JsonObject cmd : doc["commands"].as<JsonArray>()) {
+        runCommand(cmd);
       }
+    } else {
+      Serial.printf("Error parsing commands: %s\n", error.c_str());
     }
   } else if (httpResponseCode != 204) {
-    // 204 means no pending commands, which is normal
+    // 204 means no commands arrived during the wait, which is normal
     Serial.printf("Error getting commands: %d\n", httpResponseCode);
   }
   
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Family Import
+Bulk import of a user's family tree from CSV, JSON or GEDCOM-like rows of
+(person, relation, age, gender). Relations are validated against the
+relationship_patterns aliases, Person nodes and typed edges are written in
+chunked UNWIND transactions and the matching Prolog facts are stored in bulk.
+"""
+
+import io
+import csv
+import json
+import time
+import argparse
+from memories.fact_store import fact_store
+from memories.kinship_rules import format_fact
+from relationship_manager import (relationship_manager, neo4j_relationship_type,
+                                  RELATION_GENDERS, UNIQUE_RELATIONSHIPS)
+
+FORMATS = ('csv', 'json', 'gedcom')
+GEDCOM_SEX = {'M': 'male', 'F': 'female'}
+# Key under which CSV rows keep fields beyond the header, so validate can report them
+EXTRA_FIELDS = '_extra'
+
+def parse_csv(text):
+    """Parse CSV text with a person,relation[,age][,gender] header into row dicts"""
+    rows = []
+    for row in csv.DictReader(io.StringIO(text), restkey=EXTRA_FIELDS):
+        extra = row.pop(EXTRA_FIELDS, None)
+        row = {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+        if extra:
+            row[EXTRA_FIELDS] = extra
+        rows.append(row)
+    return rows
+
+def parse_json(text):
+    """Parse a JSON list of row objects (or {"rows": [...]})"""
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get('rows', [])
+    if not isinstance(data, list):
+        raise ValueError("JSON import must be a list of rows")
+    return [{str(key).lower(): value for key, value in row.items()} for row in data if isinstance(row, dict)]
+
+def parse_gedcom(text):
+    """Parse GEDCOM-like INDI records: NAME, SEX, AGE and RELA (the person's relation to the user)"""
+    rows = []
+    row = None
+    for line in text.splitlines():
+        parts = line.strip().split(' ', 2)
+        if len(parts) < 2:
+            continue
+        level, tag = parts[0], parts[1]
+        value = parts[2].strip() if len(parts) > 2 else ''
+        if level == '0':
+            row = {} if value == 'INDI' else None
+            if row is not None:
+                rows.append(row)
+        elif row is not None and level == '1':
+            if tag == 'NAME':
+                row['person'] = ' '.join(value.replace('/', ' ').split())
+            elif tag == 'SEX':
+                row['gender'] = GEDCOM_SEX.get(value.upper(), '')
+            elif tag == 'AGE':
+                row['age'] = value
+            elif tag == 'RELA':
+                row['relation'] = value
+    return rows
+
+def parse_rows(text, fmt='csv'):
+    """Parse import text in one of FORMATS into row dicts"""
+    if fmt == 'json':
+        return parse_json(text)
+    if fmt == 'gedcom':
+        return parse_gedcom(text)
+    if fmt == 'csv':
+        return parse_csv(text)
+    raise ValueError(f"Unknown import format: {fmt}")
+
+def guess_format(filename):
+    """Pick an import format from a file name"""
+    name = (filename or '').lower()
+    if name.endswith('.json'):
+        return 'json'
+    if name.endswith(('.ged', '.gedcom')):
+        return 'gedcom'
+    return 'csv'
+
+class FamilyImporter:
+    """Validates family rows and writes them for one user in chunked UNWIND transactions"""
+
+    def __init__(self, manager=relationship_manager, facts=fact_store, chunk_size=500):
+        """Initialize with the relationship manager, fact store and rows per transaction"""
+        self.manager = manager
+        self.facts = facts
+        self.chunk_size = chunk_size
+
+    def validate(self, rows, unique_holders=None):
+        """Return (prepared rows, errors); errors are {'row': n, 'error': ...} with 1-based row numbers
+
+        unique_holders maps unique relationship types (father, mother, ...) the user already has to
+        the person holding them, so a second father is reported instead of written.
+        """
+        prepared, errors = [], []
+        unique_holders = dict(unique_holders or {})
+        for number, row in enumerate(rows, 1):
+            if row.get(EXTRA_FIELDS):
+                errors.append({'row': number, 'error': f"More fields than the header: {row[EXTRA_FIELDS]!r}"})
+                continue
+            person = ' '.join(str(row.get('person') or row.get('name') or '').split()).title()
+            relation = str(row.get('relation') or row.get('relationship') or '')
+            rel_type = self.manager.canonical_relationship(relation)
+            if not person or not self.manager.is_valid_name(person):
+                errors.append({'row': number, 'error': f"Invalid person name: {person!r}"})
+                continue
+            if not rel_type:
+                errors.append({'row': number, 'error': f"Unknown relation: {relation!r}"})
+                continue
+
+            age = row.get('age')
+            if age in (None, ''):
+                age = None
+            else:
+                try:
+                    age = int(float(str(age).strip().rstrip('y')))
+                except (ValueError, OverflowError):
+                    errors.append({'row': number, 'error': f"Invalid age: {age!r}"})
+                    continue
+                if not 0 <= age <= 150:
+                    errors.append({'row': number, 'error': f"Invalid age: {age}"})
+                    continue
+
+            gender = str(row.get('gender') or '').strip().lower()
+            gender = GEDCOM_SEX.get(gender.upper(), gender)
+            if gender not in ('male', 'female'):
+                gender = RELATION_GENDERS.get(rel_type, 'unknown')
+
+            if rel_type in UNIQUE_RELATIONSHIPS:
+                holder = unique_holders.setdefault(rel_type, person)
+                if holder != person:
+                    errors.append({'row': number, 'error': f"{person!r} conflicts with {rel_type} {holder!r}"})
+                    continue
+
+            prepared.append({
+                'index': len(prepared),
+                'person_name': person,
+                'relationship_type': rel_type,
+                'neo4j_type': neo4j_relationship_type(rel_type),
+                'gender': gender,
+                'age': age
+            })
+        return prepared, errors
+
+    def facts_for(self, user_name, rows):
+        """Return the Prolog facts for written rows: relation(person, user) plus known genders"""
+        facts = []
+        for row in rows:
+            person = row['person_name'].lower()
+            facts.append(format_fact(row['relationship_type'], (person, user_name.lower())))
+            if row['gender'] in ('male', 'female'):
+                facts.append(format_fact('gender', (person, row['gender'])))
+        return facts
+
+    def import_rows(self, user_name, rows, progress=None):
+        """Validate and write rows for a user; returns counts, errors and throughput
+
+        progress, if given, is called as progress(done, total, rows_per_second) after each chunk.
+        """
+        started = time.perf_counter()
+        prepared, errors = self.validate(rows, self.manager.get_unique_relationship_holders(user_name))
+        written = 0
+        facts_added = 0
+        for start in range(0, len(prepared), self.chunk_size):
+            chunk = prepared[start:start + self.chunk_size]
+            indexes = self.manager.write_relationship_rows(user_name, chunk)
+            done = [row for row in chunk if row['index'] in indexes]
+            written += len(done)
+            if len(done) < len(chunk):
+                errors.append({'row': None, 'error': f"{len(chunk) - len(done)} rows were not written (is {user_name!r} a known user?)"})
+            try:
+                facts_added += len(self.facts.add_facts(user_name, self.facts_for(user_name, done)))
+            except Exception as e:
+                print(f"Error storing imported facts for {user_name}: {e}")
+            if progress:
+                elapsed = time.perf_counter() - started
+                progress(start + len(chunk), len(prepared), (start + len(chunk)) / elapsed if elapsed else 0.0)
+
+        elapsed = time.perf_counter() - started
+        return {
+            'rows': len(rows),
+            'valid': len(prepared),
+            'written': written,
+            'facts_added': facts_added,
+            'errors': errors,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(len(rows) / elapsed, 1) if elapsed else 0.0
+        }
+
+# Global instance
+family_importer = FamilyImporter()
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Import a family tree for a user from CSV, JSON or GEDCOM-like files")
+    arg_parser.add_argument("user", help="User node name the relatives belong to")
+    arg_parser.add_argument("file")
+    arg_parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension")
+    arg_parser.add_argument("--chunk-size", type=int, default=500)
+    args = arg_parser.parse_args()
+
+    with open(args.file, "r", encoding="utf-8") as f:
+        import_rows = parse_rows(f.read(), args.format or guess_format(args.file))
+
+    importer = FamilyImporter(chunk_size=args.chunk_size)
+    stats = importer.import_rows(args.user, import_rows,
+        progress=lambda done, total, rate: print(f"{done}/{total} rows ({rate:.0f} rows/s)", flush=True))
+    for error in stats['errors'][:20]:
+        print(f"  row {error['row']}: {error['error']}")
+    print(f"{stats['written']}/{stats['rows']} rows written, {stats['facts_added']} new facts, "
+          f"{stats['seconds']}s ({stats['rows_per_second']} rows/s)")
+    relationship_manager.close()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Character n-gram naive Bayes model for names missing from the name-gender dataset
+"""
+
+import csv
+import zlib
+import numpy as np
+
+class NgramGenderModel:
+    """Hashed character n-gram naive Bayes model stored as NumPy arrays"""
+
+    def __init__(self, weights, bias, n_min=1, n_max=4):
+        """Initialize from per-feature log-likelihood ratios and a log prior ratio"""
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.n_min = n_min
+        self.n_max = n_max
+        self.dim = len(self.weights)
+
+    @staticmethod
+    def features(name, n_min=1, n_max=4, dim=1 << 18):
+        """Hash the boundary-marked character n-grams of a name into feature ids"""
+        padded = f"^{name.lower().strip()}$".encode("utf-8")
+        return [zlib.crc32(padded[i:i + n]) % dim
+                for n in range(n_min, n_max + 1)
+                for i in range(len(padded) - n + 1)]
+
+    def _feature_batch(self, names):
+        """Return flat feature ids and per-name segment offsets for a batch"""
+        ids = []
+        offsets = []
+        for name in names:
+            offsets.append(len(ids))
+            ids.extend(self.features(name, self.n_min, self.n_max, self.dim))
+        return np.asarray(ids, dtype=np.int64), np.asarray(offsets, dtype=np.int64)
+
+    def decision_function(self, names):
+        """Score a batch of names; positive means male"""
+        if not names:
+            return np.zeros(0, dtype=np.float32)
+        ids, offsets = self._feature_batch(names)
+        scores = np.full(len(names), self.bias, dtype=np.float32)
+        # Names always produce at least the boundary n-grams, so no segment is empty
+        scores += np.add.reduceat(self.weights[ids], offsets)
+        return scores
+
+    def predict_proba(self, names):
+        """Return P(male) for a batch of names"""
+        return 1.0 / (1.0 + np.exp(-self.decision_function(names)))
+
+    def predict_one(self, name):
+        """Return P(male) for a single name"""
+        return float(self.predict_proba([name])[0])
+
+    def save(self, model_file):
+        """Save the model arrays as an uncompressed .npz file"""
+        np.savez(model_file, weights=self.weights, bias=np.float32(self.bias),
+                 ngram_range=np.array([self.n_min, self.n_max], dtype=np.int32))
+
+    @classmethod
+    def load(cls, model_file):
+        """Load a model saved by save()"""
+        with np.load(model_file) as data:
+            n_min, n_max = (int(n) for n in data['ngram_range'])
+            return cls(data['weights'], float(data['bias']), n_min, n_max)
+
+    @classmethod
+    def train(cls, names, labels, n_min=1, n_max=4, dim=1 << 18, alpha=0.5):
+        """Fit multinomial naive Bayes counts over hashed n-grams (deterministic)"""
+        labels = np.asarray(labels, dtype=bool)
+        counts = np.zeros((2, dim), dtype=np.float64)
+        for name, is_male in zip(names, labels):
+            np.add.at(counts[int(is_male)], cls.features(name, n_min, n_max, dim), 1)
+
+        log_probs = np.log(counts + alpha) - np.log(counts.sum(axis=1, keepdims=True) + alpha * dim)
+        weights = log_probs[1] - log_probs[0]
+        bias = np.log(labels.sum() + 1) - np.log((~labels).sum() + 1)
+        return cls(weights, bias, n_min, n_max)
+
+def load_training_rows(csv_file="names_to_train.csv"):
+    """Read deduplicated (name, is_male) rows; later rows win, as in the name table"""
+    rows = {}
+    with open(csv_file, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            name = row['Names'].lower().strip()
+            if name:
+                rows[name] = row['Labels'].strip() == "1"
+    names = sorted(rows)
+    return names, [rows[name] for name in names]
+
+def train_from_csv(csv_file="names_to_train.csv", model_file="gender_ngram_model.npz", holdout=0.1, seed=13):
+    """Train the model, report holdout accuracy, then refit on all rows and save"""
+    names, labels = load_training_rows(csv_file)
+    order = np.random.default_rng(seed).permutation(len(names))
+    split = int(len(names) * (1 - holdout))
+    train_idx, test_idx = order[:split], order[split:]
+
+    model = NgramGenderModel.train([names[i] for i in train_idx], [labels[i] for i in train_idx])
+    predicted = model.predict_proba([names[i] for i in test_idx]) > 0.5
+    accuracy = float(np.mean(predicted == np.asarray([labels[i] for i in test_idx])))
+
+    NgramGenderModel.train(names, labels).save(model_file)
+    return accuracy
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Train the character n-gram gender model")
+    arg_parser.add_argument("--csv", default="names_to_train.csv")
+    arg_parser.add_argument("--out", default="gender_ngram_model.npz")
+    args = arg_parser.parse_args()
+
+    holdout_accuracy = train_from_csv(args.csv, args.out)
+    print(f"Holdout accuracy: {holdout_accuracy:.3f}; model saved to {args.out}")
@@ -0,0 +1,579 @@
+"""
+Graph Explorer
+User-scoped, paginated access to the Neo4j memory graph for the visualization
+pages. A user's subgraph is everything reachable from their User nodes along
+the memory layers' own edges (texts, sentences, words and their semantic and
+perceptual annotations, people, IPs, episodes). Pages are cut with keyset
+cursors over the user's sorted member ids, listed once per graph version and
+kept while a client pages through them, and only carry edges whose endpoints
+are already on the client, so the pages received so far always form a
+consistent subgraph.
+Node positions come from a server-side layout of the whole subgraph, computed
+in the background once per graph version (refining only new nodes and their
+neighbours) while requests get the last finished layout, so the client can
+draw pages without running physics.
+Neighborhood reads return the k-hop surroundings of a node with a cap on
+neighbors per node and a "more" cursor for supernodes (words on NEXT_WORD
+chains), so the explorer can start small and expand on demand.
+"""
+
+import json
+import base64
+from bisect import bisect_right
+from collections import OrderedDict
+from threading import Lock, Thread
+import numpy as np
+from memories.graph_versions import graph_versions
+from graph_layout import force_layout, extend_layout, refine_layout, LAYOUT_SCALE
+
+# Paths from a User node u to the members n of their subgraph, with an optional condition on n
+SUBGRAPH_PATHS = [
+    ("(u)-->({n})", "NOT {n}:User"),
+    ("(u)-[:CREATED_TEXT]->(:Text)-[:HAS_A_SENTENCE]->({n})", None),
+    ("(u)-[:CREATED_TEXT]->(:Text)-[:HAS_A_SENTENCE]->(:Sentence)-[:HAS_A_WORD]->({n})", None),
+    ("(u)-[:CREATED_TEXT]->(:Text)-[:HAS_A_SENTENCE]->(:Sentence)"
+     "-[:HAS_SENTIMENT|HAS_TYPE|HAS_NAMED_ENTITY]->({n})", None),
+    ("(u)-[:CREATED_TEXT]->(:Text)-[:HAS_A_SENTENCE]->(:Sentence)-[:HAS_A_WORD]->(:Word)"
+     "-[:HAS_POS_TAG|REFERS_TO|HAS_SYNONYM|HAS_ANTONYM|IS_A|BELONGS_TO_DOMAIN]->({n})", None),
+    ("(u)-[:ACCESSED_FROM]->(:IPAddress)-[:LOCATED_AT]->({n})", None),
+    ("(u)-[:EXPERIENCED]->(:Episode)-[:HAS_INTERACTION]->({n})", None),
+]
+
+USER_MATCH = "u.name = $username OR u.id = $username"
+LABEL_FILTER = "(size($labels) = 0 OR any(label IN labels({n}) WHERE label IN $labels))"
+
+def subgraph_union():
+    """Return the UNION body (run once per User node u) yielding every member n"""
+    branches = ["RETURN u AS n"] + [
+        f"MATCH {pattern.format(n='n')}" + (f" WHERE {condition.format(n='n')}" if condition else "") + " RETURN n"
+        for pattern, condition in SUBGRAPH_PATHS]
+    return "\n    UNION\n    WITH u ".join(branches)
+
+def member_condition(var):
+    """Return a predicate that holds when node `var` belongs to the subgraph of the $username User nodes"""
+    branches = [f"({var}:User AND ({var}.name = $username OR {var}.id = $username))"] + [
+        f"EXISTS {{ MATCH {pattern.replace('(u)', '(u:User)', 1).format(n=var)} WHERE ({USER_MATCH})"
+        + (f" AND {condition.format(n=var)}" if condition else "") + " }"
+        for pattern, condition in SUBGRAPH_PATHS]
+    return "(" + "\n     OR ".join(branches) + ")"
+
+MEMBERS_QUERY = """
+MATCH (u:User) WHERE %s
+CALL {
+    WITH u %s
+}
+WITH DISTINCT n
+WHERE %s
+RETURN elementId(n) AS id
+""" % (USER_MATCH, subgraph_union(), LABEL_FILTER.format(n='n'))
+
+NODES_QUERY = """
+UNWIND $ids AS node_id
+MATCH (n) WHERE elementId(n) = node_id
+RETURN elementId(n) AS id, labels(n) AS labels, properties(n) AS properties
+"""
+
+MEMBER_NODES_QUERY = """
+UNWIND $ids AS node_id
+MATCH (n) WHERE elementId(n) = node_id AND %s
+RETURN elementId(n) AS id, labels(n) AS labels, properties(n) AS properties
+""" % member_condition('n')
+
+# Edges from each node to nodes at or before it in element id order; callers keep those that are members
+EDGES_QUERY = """
+UNWIND $ids AS node_id
+MATCH (a) WHERE elementId(a) = node_id
+MATCH (a)-[r]-(b)
+WHERE elementId(b) <= node_id AND (size($types) = 0 OR type(r) IN $types)
+RETURN DISTINCT elementId(r) AS id, elementId(startNode(r)) AS source, elementId(endNode(r)) AS target,
+       elementId(b) AS other, type(r) AS type
+"""
+
+# Every edge of the listed nodes, for placing nodes new to an existing layout
+INCIDENT_EDGES_QUERY = """
+UNWIND $ids AS node_id
+MATCH (a) WHERE elementId(a) = node_id
+MATCH (a)-[r]-(b)
+RETURN DISTINCT elementId(startNode(r)) AS source, elementId(endNode(r)) AS target
+"""
+
+# Edges between listed nodes, for laying out a member list that is already known
+MEMBER_EDGES_QUERY = """
+UNWIND $ids AS node_id
+MATCH (a) WHERE elementId(a) = node_id
+MATCH (a)-[r]-(b)
+WHERE elementId(b) <= node_id
+RETURN DISTINCT elementId(r) AS id, elementId(startNode(r)) AS source, elementId(endNode(r)) AS target,
+       elementId(b) AS other, type(r) AS type
+"""
+
+ROOTS_QUERY = """
+MATCH (u:User) WHERE u.name = $username OR u.id = $username
+RETURN elementId(u) AS id ORDER BY id
+"""
+
+# Up to $fetch neighbors per node in element id order, after $after. The limit applies before
+# relationships are collected and membership is checked, so a supernode costs a top-k over its
+# neighbor ids; neighbors outside the user's subgraph come back with member = false and no rels
+NEIGHBORS_QUERY = """
+UNWIND $ids AS node_id
+MATCH (a) WHERE elementId(a) = node_id
+CALL {
+    WITH a
+    MATCH (a)-[r]-(b)
+    WHERE elementId(b) > $after AND (size($types) = 0 OR type(r) IN $types)
+    WITH DISTINCT b
+    ORDER BY elementId(b)
+    LIMIT $fetch
+    RETURN b
+}
+WITH node_id, a, b, %s AS member
+CALL {
+    WITH a, b, member
+    OPTIONAL MATCH (a)-[r]-(b)
+    WHERE member AND (size($types) = 0 OR type(r) IN $types)
+    RETURN collect(r) AS rels
+}
+RETURN node_id, elementId(b) AS other, member,
+       [r IN rels | [elementId(r), elementId(startNode(r)), elementId(endNode(r)), type(r)]] AS rels
+""" % member_condition('b')
+
+# Node colors by label, first match wins
+LABEL_COLORS = [
+    ("User", "#ff6b6b"),
+    ("Person", "#4ecdc4"),
+    ("Text", "#ffe66d"),
+    ("SensoryMemory", "#ffe66d"),
+    ("Sentence", "#a8e6cf"),
+    ("Word", "#dcedc1"),
+    ("Concept", "#ffd93d"),
+    ("Memory", "#ff8b94"),
+]
+DEFAULT_COLOR = "#97c2fc"
+
+def node_caption(node_id, labels, properties):
+    """Return the short display label of a node"""
+    if 'name' in properties:
+        return str(properties['name'])
+    if 'email' in properties:
+        return str(properties['email'])
+    for key, width in (('sentence_text', 50), ('full_text', 30), ('word_text', 30)):
+        if key in properties:
+            text = str(properties[key])
+            return text[:width] + "..." if len(text) > width else text
+    return f"{labels[0] if labels else 'Node'} {node_id}"
+
+def node_color(labels):
+    """Return the display color for a node's labels"""
+    for label, color in LABEL_COLORS:
+        if label in labels:
+            return color
+    return DEFAULT_COLOR
+
+class StyleTable:
+    """Assigns small integer codes to repeated strings (groups, colors, edge types) of one payload"""
+
+    def __init__(self):
+        """Initialize an empty table"""
+        self.values = []
+        self.codes = {}
+
+    def code(self, value):
+        """Return the code of a value, adding it on first use"""
+        if value not in self.codes:
+            self.codes[value] = len(self.values)
+            self.values.append(value)
+        return self.codes[value]
+
+def encode_compact(nodes, edges, positions, offset, coords=None):
+    """Encode (id, labels, properties) nodes and (id, source, target, type) edges as column arrays
+
+    Each node's group is a code into styles.groups, whose colors are in styles.colors and edge
+    types are codes into styles.types. Edge endpoints found in positions ({id: index}) are sent as
+    that index, others (nodes of earlier pages) as their element id. With coords ({id: (x, y)}
+    pixels) the nodes also get x and y columns, null where a node has no position yet.
+    """
+    groups, types = StyleTable(), StyleTable()
+    colors = []
+    node_groups = []
+    for node_id, labels, properties in nodes:
+        group = labels[0] if labels else "Unknown"
+        if group not in groups.codes:
+            colors.append(node_color(labels))
+        node_groups.append(groups.code(group))
+    edge_columns = {
+        "source": [positions.get(source, source) for _, source, _, _ in edges],
+        "target": [positions.get(target, target) for _, _, target, _ in edges],
+        "type": [types.code(rel_type) for _, _, _, rel_type in edges]
+    }
+    node_columns = {
+        "offset": offset,
+        "id": [node_id for node_id, _, _ in nodes],
+        "group": node_groups,
+        "caption": [node_caption(node_id, labels, properties) for node_id, labels, properties in nodes]
+    }
+    if coords:
+        node_columns["x"] = [coords[node_id][0] if node_id in coords else None for node_id, _, _ in nodes]
+        node_columns["y"] = [coords[node_id][1] if node_id in coords else None for node_id, _, _ in nodes]
+    return {
+        "format": "columns",
+        "styles": {"groups": groups.values, "colors": colors, "types": types.values},
+        "nodes": node_columns,
+        "edges": edge_columns
+    }
+
+def encode_verbose(nodes, edges, coords=None):
+    """Encode nodes and edges as one vis.js object each"""
+    coords = coords or {}
+    return {
+        "nodes": [{
+            "id": node_id,
+            "label": node_caption(node_id, labels, properties),
+            "color": node_color(labels),
+            "title": f"Type: {', '.join(labels)}\nProperties: {str(properties)[:200]}",
+            "group": labels[0] if labels else "Unknown",
+            **({"x": coords[node_id][0], "y": coords[node_id][1]} if node_id in coords else {})
+        } for node_id, labels, properties in nodes],
+        "edges": [{"id": edge_id, "from": source, "to": target, "label": rel_type}
+                  for edge_id, source, target, rel_type in edges]
+    }
+
+class GraphExplorer:
+    """Cursor-paginated reads of one user's memory subgraph over a shared driver"""
+
+    def __init__(self, driver, max_page_nodes=500, max_page_edges=2000, max_cached_users=64,
+                 max_layout_nodes=10000, max_layout_edges=50000, max_hops=3, max_neighbors=100):
+        """Initialize with an open Neo4j driver, the per-page payload caps and the layout size caps"""
+        self.driver = driver
+        self.max_hops = max_hops
+        self.max_neighbors = max_neighbors
+        self.max_page_nodes = max_page_nodes
+        self.max_page_edges = max_page_edges
+        self.max_cached_users = max_cached_users
+        self.max_layout_nodes = max_layout_nodes
+        self.max_layout_edges = max_layout_edges
+        self._members = OrderedDict()
+        self._layouts = OrderedDict()
+        self._layout_jobs = set()
+        self._lock = Lock()
+
+    @staticmethod
+    def _pack(data):
+        """Return an opaque cursor string for a small dict"""
+        raw = json.dumps(data, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def _unpack(cursor):
+        """Return the dict inside a cursor string"""
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        except Exception:
+            raise ValueError("Invalid cursor")
+        if not isinstance(data, dict):
+            raise ValueError("Invalid cursor")
+        return data
+
+    @classmethod
+    def encode_cursor(cls, after, offset, labels, types):
+        """Return an opaque cursor for the page after element id `after`, the offset-th node of the subgraph"""
+        return cls._pack({'a': after, 'o': offset, 'l': labels, 't': types})
+
+    @classmethod
+    def decode_cursor(cls, cursor, labels, types):
+        """Return (element id to continue after, nodes sent so far); cursors only work with their own filters"""
+        if not cursor:
+            return '', 0
+        data = cls._unpack(cursor)
+        if data.get('l') != labels or data.get('t') != types:
+            raise ValueError("Cursor does not match the label and type filters")
+        return data.get('a', ''), int(data.get('o', 0))
+
+    @classmethod
+    def encode_neighbor_cursor(cls, node_id, after, types):
+        """Return a "more" cursor for the neighbors of node_id after element id `after`"""
+        return cls._pack({'n': node_id, 'a': after, 't': types})
+
+    @classmethod
+    def decode_neighbor_cursor(cls, cursor, types):
+        """Return (node id, element id to continue after) from a "more" cursor"""
+        data = cls._unpack(cursor)
+        if not data.get('n') or data.get('t') != types:
+            raise ValueError("Cursor does not match the type filter")
+        return data['n'], data.get('a', '')
+
+    def members(self, username, labels, fresh=True):
+        """Return a user's sorted subgraph element ids and their positions, cached per graph version
+
+        Listing the members costs O(subgraph), so it runs at most once per version. With
+        fresh=False any cached listing is returned, even one older than the graph.
+        """
+        key = (username, tuple(labels))
+        version = graph_versions.version(username)
+        with self._lock:
+            cached = self._members.get(key)
+            if cached and (cached[0] == version or not fresh):
+                self._members.move_to_end(key)
+                return cached[1], cached[2]
+
+        with self.driver.session() as neo4j_session:
+            ids = sorted({record['id'] for record in neo4j_session.run(MEMBERS_QUERY, username=username, labels=labels)})
+        positions = {node_id: i for i, node_id in enumerate(ids)}
+        with self._lock:
+            self._members[key] = (version, ids, positions)
+            self._members.move_to_end(key)
+            while len(self._members) > self.max_cached_users:
+                self._members.popitem(last=False)
+        return ids, positions
+
+    def member_edges(self, ids, positions, chunk_size=5000):
+        """Return the (source id, target id) pairs of the edges between members, up to max_layout_edges"""
+        pairs = []
+        with self.driver.session() as neo4j_session:
+            for start in range(0, len(ids), chunk_size):
+                for record in neo4j_session.run(MEMBER_EDGES_QUERY, ids=ids[start:start + chunk_size]):
+                    if record['other'] in positions:
+                        pairs.append((record['source'], record['target']))
+                    if len(pairs) == self.max_layout_edges:
+                        return pairs
+        return pairs
+
+    def incident_edges(self, ids, positions, chunk_size=5000):
+        """Return the (source id, target id) pairs of the edges from the listed nodes to other members"""
+        pairs = set()
+        with self.driver.session() as neo4j_session:
+            for start in range(0, len(ids), chunk_size):
+                for record in neo4j_session.run(INCIDENT_EDGES_QUERY, ids=ids[start:start + chunk_size]):
+                    if record['source'] in positions and record['target'] in positions:
+                        pairs.add((record['source'], record['target']))
+        return pairs
+
+    def layout_version(self, username, labels=()):
+        """Return the graph version of the layout layout() currently serves, or None if there is none"""
+        with self._lock:
+            cached = self._layouts.get((username, tuple(sorted(set(labels)))))
+        return cached[0] if cached else None
+
+    def layout(self, username, labels=()):
+        """Return {element id: (x, y)} pixel positions for a user's subgraph, or {} if none is ready
+
+        Never computes in the request: if the cached layout is older than the graph, one
+        background job per (user, labels) brings it up to date and the old positions are
+        served meanwhile (nodes added since have none yet).
+        """
+        labels = sorted(set(labels))
+        key = (username, tuple(labels))
+        version = graph_versions.version(username)
+        with self._lock:
+            cached = self._layouts.get(key)
+            if cached:
+                self._layouts.move_to_end(key)
+            if (not cached or cached[0] != version) and key not in self._layout_jobs:
+                self._layout_jobs.add(key)
+                Thread(target=self._update_layout, args=(key, version), daemon=True).start()
+        return cached[2] if cached else {}
+
+    def _update_layout(self, key, version):
+        """Bring the cached layout of key up to date with graph version `version`"""
+        username, labels = key
+        try:
+            with self._lock:
+                cached = self._layouts.get(key)
+            ids, positions = self.members(username, list(labels))
+            if len(ids) > self.max_layout_nodes:
+                self._store_layout(key, (version, {}, {}, set()))
+                return
+
+            previous = cached[1] if cached else {}
+            known = sum(node_id in previous for node_id in ids)
+            if previous and known * 2 >= len(ids):
+                # Keep the old edges between surviving members and add the edges of new nodes
+                new_ids = [node_id for node_id in ids if node_id not in previous]
+                pairs = {(a, b) for a, b in cached[3] if a in positions and b in positions}
+                pairs |= self.incident_edges(new_ids, positions)
+                edges = np.array([(positions[a], positions[b]) for a, b in pairs], dtype=np.int64).reshape(-1, 2)
+
+                # Only new nodes and their direct neighbours move; everything else stays put
+                movable = np.zeros(len(ids), dtype=bool)
+                movable[[positions[node_id] for node_id in new_ids]] = True
+                if len(edges):
+                    touched = movable[edges[:, 0]] | movable[edges[:, 1]]
+                    movable[edges[touched].ravel()] = True
+                initial = extend_layout([previous.get(node_id) for node_id in ids], len(ids), edges)
+                coords = refine_layout(initial, edges, movable)
+            else:
+                pairs = set(self.member_edges(ids, positions))
+                edges = np.array([(positions[a], positions[b]) for a, b in pairs], dtype=np.int64).reshape(-1, 2)
+                coords = force_layout(len(ids), edges)
+
+            raw = {node_id: (float(x), float(y)) for node_id, (x, y) in zip(ids, coords)}
+            pixels = {node_id: (round(x * LAYOUT_SCALE), round(y * LAYOUT_SCALE)) for node_id, (x, y) in raw.items()}
+            self._store_layout(key, (version, raw, pixels, pairs))
+        except Exception as e:
+            print(f"Error computing graph layout for {username}: {e}")
+        finally:
+            with self._lock:
+                self._layout_jobs.discard(key)
+
+    def _store_layout(self, key, entry):
+        """Cache a finished layout, evicting the least recently used ones"""
+        with self._lock:
+            self._layouts[key] = entry
+            self._layouts.move_to_end(key)
+            while len(self._layouts) > self.max_cached_users:
+                self._layouts.popitem(last=False)
+
+    def subgraph_size(self, username, labels=()):
+        """Return the subgraph size seen by the last member listing (possibly older), or None if unknown"""
+        with self._lock:
+            cached = self._members.get((username, tuple(sorted(set(labels)))))
+        return len(cached[1]) if cached else None
+
+    def page(self, username, labels=(), types=(), cursor=None, limit=200, compact=False, layout=False):
+        """Return one page of a user's subgraph: nodes, edges back to already-sent nodes and the next cursor
+
+        The first page lists the user's members if the graph changed since the last listing
+        (O(subgraph), once per graph version); later pages keep paging through the listing their
+        first page used, so each costs O(page) plus its edges. Nodes come in element id order;
+        with compact=True nodes of this page are numbered from the number of nodes sent before it,
+        so indexes stay valid as the client appends pages. With layout=True nodes carry
+        precomputed x and y coordinates.
+        """
+        labels, types = sorted(set(labels)), sorted(set(types))
+        after, offset = self.decode_cursor(cursor, labels, types)
+        limit = max(1, min(int(limit), self.max_page_nodes))
+
+        # Keep paging through the listing the first page used, even if the graph changed since
+        ids, members = self.members(username, labels, fresh=not cursor)
+        start = bisect_right(ids, after) if after else 0
+        page_ids = ids[start:start + limit]
+        has_more = start + limit < len(ids)
+
+        nodes, edges = [], []
+        truncated = False
+        with self.driver.session() as neo4j_session:
+            found = {record['id']: (record['labels'], record['properties'])
+                     for record in neo4j_session.run(NODES_QUERY, ids=page_ids)}
+            # Nodes deleted since the listing are skipped
+            nodes = [(node_id, *found[node_id]) for node_id in page_ids if node_id in found]
+
+            # Each edge is sent once, with the page holding its later endpoint; results stream, so
+            # stopping at the cap leaves the rest of a supernode's edges unread
+            if nodes:
+                for record in neo4j_session.run(EDGES_QUERY, ids=[node_id for node_id, _, _ in nodes],
+                                                types=types):
+                    if record['other'] not in members:
+                        continue
+                    if len(edges) == self.max_page_edges:
+                        truncated = True
+                        break
+                    edges.append((record['id'], record['source'], record['target'], record['type']))
+
+        coords = self.layout(username, labels) if layout else {}
+        result = {
+            "cursor": self.encode_cursor(page_ids[-1], offset + len(nodes), labels, types) if has_more else None,
+            "truncated": truncated,
+            "stats": {
+                "total_nodes": len(nodes),
+                "total_edges": len(edges),
+                "subgraph_nodes": self.subgraph_size(username, labels)
+            }
+        }
+        if compact:
+            positions = {node_id: offset + i for i, (node_id, _, _) in enumerate(nodes)}
+            result.update(encode_compact(nodes, edges, positions, offset, coords))
+        else:
+            result.update(encode_verbose(nodes, edges, coords))
+        return result
+
+    def roots(self, username):
+        """Return the element ids of a user's User nodes"""
+        with self.driver.session() as neo4j_session:
+            return [record['id'] for record in neo4j_session.run(ROOTS_QUERY, username=username)]
+
+    def neighborhood(self, username, node_id=None, hops=1, limit=25, cursor=None, types=(),
+                     compact=False, layout=False):
+        """Return the k-hop neighborhood of a node (the user's User nodes by default), or None if unknown
+
+        Each expanded node contributes at most `limit` neighbors (fewer when some of the next `limit`
+        lie outside the user's subgraph); nodes with more get an entry in "more" whose cursor
+        fetches their next neighbors (one hop). With compact=True edge endpoints
+        are positions in this response's node list.
+        """
+        types = sorted(set(types))
+        hops = max(1, min(int(hops), self.max_hops))
+        limit = max(1, min(int(limit), self.max_neighbors))
+        after = ''
+        if cursor:
+            node_id, after = self.decode_neighbor_cursor(cursor, types)
+            hops = 1
+
+        centers = [node_id] if node_id else self.roots(username)
+        found = {}
+        with self.driver.session() as neo4j_session:
+            # Membership is checked per node in Cypher, so nothing here grows with the subgraph
+            for record in neo4j_session.run(MEMBER_NODES_QUERY, ids=centers, username=username):
+                found[record['id']] = (record['labels'], record['properties'])
+            if not centers or any(center not in found for center in centers):
+                return None
+
+            order, seen = list(centers), set(centers)
+            edges, more = {}, {}
+            frontier = centers
+            for _ in range(hops):
+                if not frontier or len(order) >= self.max_page_nodes:
+                    break
+                neighbors = {}
+                for record in neo4j_session.run(NEIGHBORS_QUERY, ids=frontier, after=after, username=username,
+                                                types=types, fetch=limit + 1):
+                    neighbors.setdefault(record['node_id'], []).append(record)
+                next_frontier = []
+                for center in frontier:
+                    records = sorted(neighbors.get(center, []), key=lambda record: record['other'])
+                    if len(records) > limit:
+                        records = records[:limit]
+                        more[center] = self.encode_neighbor_cursor(center, records[-1]['other'], types)
+                    for record in records:
+                        other = record['other']
+                        if not record['member']:
+                            continue  # Counted towards the limit, so the "more" cursor moves past it
+                        if other not in seen and len(order) < self.max_page_nodes:
+                            seen.add(other)
+                            order.append(other)
+                            next_frontier.append(other)
+                        for edge_id, source, target, rel_type in record['rels']:
+                            edges[edge_id] = (edge_id, source, target, rel_type)
+                frontier = next_frontier
+                after = ''
+
+            for record in neo4j_session.run(NODES_QUERY, ids=[node for node in order if node not in found]):
+                found[record['id']] = (record['labels'], record['properties'])
+
+        nodes = [(node, *found.get(node, ([], {}))) for node in order]
+        # Neighbors dropped by the node cap take their edges with them
+        edges = [edge for edge in edges.values() if edge[1] in seen and edge[2] in seen]
+        coords = self.layout(username) if layout else {}
+        result = {
+            "centers": centers,
+            "more": more,
+            "stats": {
+                "total_nodes": len(nodes),
+                "total_edges": len(edges),
+                "subgraph_nodes": self.subgraph_size(username)
+            }
+        }
+        if compact:
+            result.update(encode_compact(nodes, edges, {node: i for i, node in enumerate(order)}, 0, coords))
+        else:
+            result.update(encode_verbose(nodes, edges, coords))
+        return result
+
+    def node_details(self, username, node_id):
+        """Return the labels and properties of one node of the user's subgraph, or None"""
+        with self.driver.session() as neo4j_session:
+            record = neo4j_session.run(MEMBER_NODES_QUERY, ids=[node_id], username=username).single()
+        if not record:
+            return None
+        properties = {key: value if isinstance(value, (int, float, bool)) else str(value)[:500]
+                      for key, value in record['properties'].items()}
+        return {"id": node_id, "labels": record['labels'], "properties": properties}
@@ -0,0 +1,197 @@
+"""
+Graph Layout
+Server-side force-directed layout for the memory graph pages. Small graphs
+start from a spectral embedding and use exact pairwise repulsion; larger ones
+use a Barnes-Hut-style grid where distant cells act as one mass at their
+centroid. Everything is vectorized with NumPy, and an existing layout can be
+extended with new nodes and refined for a few iterations, moving only the new
+nodes and their neighbours, instead of redone.
+"""
+
+import numpy as np
+
+# Pixels per unit of ideal edge length in the coordinates sent to vis.js
+LAYOUT_SCALE = 80.0
+
+def spectral_positions(n, edges):
+    """Return an (n, 2) embedding from the two smallest non-trivial Laplacian eigenvectors"""
+    adjacency = np.zeros((n, n))
+    if len(edges):
+        adjacency[edges[:, 0], edges[:, 1]] = 1.0
+        adjacency[edges[:, 1], edges[:, 0]] = 1.0
+    np.fill_diagonal(adjacency, 0.0)
+    laplacian = np.diag(adjacency.sum(axis=1)) - adjacency
+    _, vectors = np.linalg.eigh(laplacian)
+    coords = vectors[:, 1:3] if n > 2 else np.zeros((n, 2))
+    span = np.ptp(coords, axis=0)
+    span[span == 0] = 1.0
+    return (coords - coords.mean(axis=0)) / span * np.sqrt(n)
+
+def exact_repulsion(pos):
+    """Return the summed k^2/d repulsion on every node from every other node (k = 1)"""
+    delta = pos[:, None, :] - pos[None, :, :]
+    dist2 = np.einsum('ijk,ijk->ij', delta, delta) + 1e-9
+    return np.einsum('ijk,ij->ik', delta, 1.0 / dist2)
+
+def grid_repulsion(pos, cells_per_side):
+    """Return Barnes-Hut-style repulsion: exact within neighbouring grid cells, cell to cell beyond"""
+    low = pos.min(axis=0)
+    size = np.maximum(pos.max(axis=0) - low, 1e-9)
+    grid = np.minimum((pos - low) / size * cells_per_side, cells_per_side - 1).astype(np.int64)
+    cell = grid[:, 0] * cells_per_side + grid[:, 1]
+    n_cells = cells_per_side * cells_per_side
+
+    mass = np.bincount(cell, minlength=n_cells).astype(float)
+    occupied = np.nonzero(mass)[0]
+    centroids = np.stack([np.bincount(cell, weights=pos[:, axis], minlength=n_cells)[occupied]
+                          for axis in (0, 1)], axis=1) / mass[occupied, None]
+    cell_x, cell_y = occupied // cells_per_side, occupied % cells_per_side
+
+    # Far field: cells more than one step apart act on each other as their mass at their centroid,
+    # and every node feels the force on its own cell's centroid
+    near = ((np.abs(cell_x[:, None] - cell_x[None, :]) <= 1) &
+            (np.abs(cell_y[:, None] - cell_y[None, :]) <= 1))
+    weights = np.where(near, 0.0, mass[occupied][None, :])
+    delta = centroids[:, None, :] - centroids[None, :, :]
+    dist2 = np.einsum('ijk,ijk->ij', delta, delta) + 1e-9
+    cell_force = np.zeros((n_cells, 2))
+    cell_force[occupied] = np.einsum('ijk,ij->ik', delta, weights / dist2)
+    force = cell_force[cell]
+
+    # Near field: exact pairs between each node and every node of its cell's 3x3 neighbourhood,
+    # gathered for all nodes at once per neighbour offset. Pairs across cells are formed for one
+    # of each pair of opposite offsets and applied to both ends; within a cell every ordered pair
+    # is formed (a node paired with itself adds nothing)
+    order = np.argsort(cell, kind='stable')
+    starts = np.searchsorted(cell[order], np.arange(n_cells + 1))
+    counts = np.diff(starts)
+    for dx, dy in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+        x, y = grid[:, 0] + dx, grid[:, 1] + dy
+        valid = (x >= 0) & (x < cells_per_side) & (y >= 0) & (y < cells_per_side)
+        other = np.where(valid, x * cells_per_side + y, 0)
+        reps = np.where(valid, counts[other], 0)
+        total = reps.sum()
+        if not total:
+            continue
+        left = np.repeat(np.arange(len(pos)), reps)
+        within = np.arange(total) - np.repeat(np.cumsum(reps) - reps, reps)
+        right = order[np.repeat(starts[other], reps) + within]
+        delta_x = pos[left, 0] - pos[right, 0]
+        delta_y = pos[left, 1] - pos[right, 1]
+        inverse = 1.0 / (delta_x * delta_x + delta_y * delta_y + 1e-9)
+        for axis, delta in ((0, delta_x), (1, delta_y)):
+            push = delta * inverse
+            force[:, axis] += np.bincount(left, weights=push, minlength=len(pos))
+            if dx or dy:
+                force[:, axis] -= np.bincount(right, weights=push, minlength=len(pos))
+    return force
+
+def force_layout(n, edges, initial=None, iterations=None, temperature=None, exact_limit=800,
+                 gravity=1.0, seed=7):
+    """Return (n, 2) Fruchterman-Reingold coordinates with ideal edge length 1
+
+    edges is an (m, 2) int array of node indexes. initial, if given, is the starting layout
+    (used for incremental updates with fewer iterations and a lower temperature).
+    """
+    rng = np.random.default_rng(seed)
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    if n == 0:
+        return np.zeros((0, 2))
+    if initial is not None:
+        pos = np.array(initial, dtype=float)
+    elif n <= exact_limit and len(edges):
+        pos = spectral_positions(n, edges)
+    else:
+        pos = rng.uniform(-0.5, 0.5, (n, 2)) * np.sqrt(n)
+    # Coincident nodes feel no repulsion, so nudge everything apart slightly
+    pos += rng.normal(scale=1e-3, size=pos.shape)
+
+    if iterations is None:
+        iterations = 120 if n <= exact_limit else 60
+    # About ten nodes per grid cell keeps both the cell-to-cell and the near-field work small
+    cells_per_side = int(np.clip(np.sqrt(n / 10), 8, 48))
+    start = 0.1 * np.sqrt(n) if temperature is None else temperature
+    for step in range(iterations):
+        if n <= exact_limit:
+            displacement = exact_repulsion(pos)
+        else:
+            displacement = grid_repulsion(pos, cells_per_side)
+
+        if len(edges):
+            delta = pos[edges[:, 0]] - pos[edges[:, 1]]
+            pull = delta * np.linalg.norm(delta, axis=1)[:, None]
+            np.add.at(displacement, edges[:, 0], -pull)
+            np.add.at(displacement, edges[:, 1], pull)
+        displacement -= gravity * pos
+
+        # Move each node at most the current temperature, cooling linearly
+        limit = start * (1.0 - step / iterations)
+        length = np.linalg.norm(displacement, axis=1)
+        scale = np.minimum(length, limit) / np.maximum(length, 1e-9)
+        pos += displacement * scale[:, None]
+    return pos - pos.mean(axis=0)
+
+def refine_layout(initial, edges, movable, iterations=30, temperature=0.25, exact_limit=800,
+                  gravity=1.0, chunk_size=256, seed=7):
+    """Return initial with only the movable nodes (a boolean mask) refined, the rest pinned
+
+    With few movable nodes, repulsion is computed exactly for those rows only, in chunks, so a
+    step costs O(movable * n) instead of O(n^2); with many it falls back to the grid.
+    """
+    rng = np.random.default_rng(seed)
+    pos = np.array(initial, dtype=float)
+    n = len(pos)
+    moving = np.nonzero(movable)[0]
+    if not len(moving):
+        return pos
+    pos[moving] += rng.normal(scale=1e-3, size=(len(moving), 2))
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    edges = edges[movable[edges[:, 0]] | movable[edges[:, 1]]]
+    cells_per_side = int(np.clip(np.sqrt(n / 10), 8, 48))
+
+    for step in range(iterations):
+        displacement = np.zeros((n, 2))
+        if len(moving) > exact_limit:
+            displacement[moving] = grid_repulsion(pos, cells_per_side)[moving]
+        else:
+            for start in range(0, len(moving), chunk_size):
+                rows = moving[start:start + chunk_size]
+                delta = pos[rows, None, :] - pos[None, :, :]
+                dist2 = np.einsum('ijk,ijk->ij', delta, delta) + 1e-9
+                displacement[rows] = np.einsum('ijk,ij->ik', delta, 1.0 / dist2)
+
+        if len(edges):
+            delta = pos[edges[:, 0]] - pos[edges[:, 1]]
+            pull = delta * np.linalg.norm(delta, axis=1)[:, None]
+            np.add.at(displacement, edges[:, 0], -pull)
+            np.add.at(displacement, edges[:, 1], pull)
+        displacement -= gravity * pos
+
+        limit = temperature * (1.0 - step / iterations)
+        length = np.linalg.norm(displacement[moving], axis=1)
+        scale = np.minimum(length, limit) / np.maximum(length, 1e-9)
+        pos[moving] += displacement[moving] * scale[:, None]
+    return pos
+
+def extend_layout(previous, n, edges, seed=7):
+    """Place nodes missing from previous (an n-long list of old coordinates or None) next to their neighbours"""
+    rng = np.random.default_rng(seed)
+    known = np.array([coords is not None for coords in previous])
+    pos = np.zeros((n, 2))
+    if known.any():
+        pos[known] = np.array([coords for coords in previous if coords is not None])
+    spread = np.sqrt(n) / 2
+
+    # New nodes start at the centroid of their already placed neighbours, else anywhere
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    totals, counts = np.zeros((n, 2)), np.zeros(n)
+    for a, b in ((0, 1), (1, 0)):
+        placed = known[edges[:, b]] & ~known[edges[:, a]]
+        np.add.at(totals, edges[placed, a], pos[edges[placed, b]])
+        np.add.at(counts, edges[placed, a], 1)
+    new = ~known
+    attached = new & (counts > 0)
+    pos[attached] = totals[attached] / counts[attached, None] + rng.normal(scale=0.3, size=(attached.sum(), 2))
+    loose = new & (counts == 0)
+    pos[loose] = rng.uniform(-spread, spread, (loose.sum(), 2))
+    return pos
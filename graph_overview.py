@@ -0,0 +1,96 @@
+"""
+Graph Overview
+Label-level summary of the memory graph. Node counts per label, relationship
+counts per type and per (label, type) side come from Neo4j's count store,
+which answers single-label patterns in constant time, and the label graph's
+shape comes from db.schema.visualization(). Per-user layer sizes come from the
+counters the memory writers maintain (memories/memory_counts.py).
+"""
+
+import time
+from threading import Lock
+from memories.memory_counts import memory_counts, MEMORY_LAYERS
+
+# Count-store backed patterns; every UNION ALL branch names one label or type literally
+LABEL_COUNT = "MATCH (n:{label}) RETURN {i} AS i, count(n) AS count"
+TYPE_COUNT = "MATCH ()-[r:{rel_type}]->() RETURN {i} AS i, count(r) AS count"
+OUT_COUNT = "MATCH (:{label})-[r:{rel_type}]->() RETURN {i} AS i, count(r) AS count"
+IN_COUNT = "MATCH ()-[r:{rel_type}]->(:{label}) RETURN {i} AS i, count(r) AS count"
+
+def quote_name(name):
+    """Backtick-quote a label or relationship type for use in Cypher"""
+    return "`" + name.replace("`", "``") + "`"
+
+class GraphOverview:
+    """Constant-time label and type counts over a shared driver, cached for a few seconds"""
+
+    def __init__(self, driver, ttl=5.0, chunk_size=100):
+        """Initialize with an open Neo4j driver"""
+        self.driver = driver
+        self.ttl = ttl
+        self.chunk_size = chunk_size
+        self._cached = None
+        self._cached_at = 0.0
+        self._lock = Lock()
+
+    def _counts(self, neo4j_session, template, items):
+        """Run one count-store query per item, batched with UNION ALL; returns counts in item order"""
+        counts = [0] * len(items)
+        for start in range(0, len(items), self.chunk_size):
+            branches = [template.format(i=start + i, **{key: quote_name(value) for key, value in item.items()})
+                        for i, item in enumerate(items[start:start + self.chunk_size])]
+            for record in neo4j_session.run(" UNION ALL ".join(branches)):
+                counts[record['i']] = record['count']
+        return counts
+
+    def graph_counts(self):
+        """Return label counts, type counts and label-to-label edges with upper-bound counts"""
+        with self._lock:
+            if self._cached and time.time() - self._cached_at < self.ttl:
+                return self._cached
+
+        with self.driver.session() as neo4j_session:
+            labels = [record['label'] for record in neo4j_session.run("CALL db.labels() YIELD label RETURN label")]
+            types = [record['relationshipType'] for record in neo4j_session.run(
+                "CALL db.relationshipTypes() YIELD relationshipType RETURN relationshipType")]
+
+            schema = neo4j_session.run("CALL db.schema.visualization()").single()
+            names = {node.element_id: node.get('name', next(iter(node.labels), '')) for node in schema['nodes']}
+            triples = sorted({(names[rel.start_node.element_id], rel.type, names[rel.end_node.element_id])
+                              for rel in schema['relationships']})
+
+            label_counts = self._counts(neo4j_session, LABEL_COUNT, [{'label': label} for label in labels])
+            type_counts = self._counts(neo4j_session, TYPE_COUNT, [{'rel_type': rel_type} for rel_type in types])
+            sides = sorted({(source, rel_type) for source, rel_type, _ in triples})
+            ends = sorted({(rel_type, target) for _, rel_type, target in triples})
+            out_counts = dict(zip(sides, self._counts(neo4j_session, OUT_COUNT,
+                                                      [{'label': label, 'rel_type': rel_type} for label, rel_type in sides])))
+            in_counts = dict(zip(ends, self._counts(neo4j_session, IN_COUNT,
+                                                    [{'label': label, 'rel_type': rel_type} for rel_type, label in ends])))
+
+        # The count store has no (:A)-[:T]->(:B) entries, so an edge's count is bounded by both sides
+        edges = [{
+            "source": source,
+            "target": target,
+            "type": rel_type,
+            "count": min(out_counts[(source, rel_type)], in_counts[(rel_type, target)])
+        } for source, rel_type, target in triples]
+        edges = [edge for edge in edges if edge["count"]]
+
+        result = {
+            "labels": sorted(({"name": label, "count": count, "layer": label in MEMORY_LAYERS}
+                              for label, count in zip(labels, label_counts)), key=lambda item: -item["count"]),
+            "types": sorted(({"name": rel_type, "count": count} for rel_type, count in zip(types, type_counts)),
+                            key=lambda item: -item["count"]),
+            "edges": edges,
+            "layers": {layer: dict(zip(labels, label_counts)).get(layer, 0) for layer in MEMORY_LAYERS}
+        }
+        with self._lock:
+            self._cached, self._cached_at = result, time.time()
+        return result
+
+    def overview(self, username):
+        """Return the graph-wide counts plus the user's per-layer counts"""
+        result = dict(self.graph_counts())
+        result["user"] = memory_counts.for_user(username)
+        return result
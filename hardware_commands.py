@@ -0,0 +1,253 @@
+"""
+Hardware Commands
+Durable command queue for ESP32 devices, stored in SQLite so queued commands
+survive a restart. Each command moves through queued -> delivered -> acked
+(or failed): a delivered command that is not acknowledged within the ack
+timeout is delivered again, up to a few attempts; commands older than their
+TTL are dropped as failed; and each device has a maximum queue depth. A
+condition per device lets a long-poll request block until commands arrive and
+then take every pending command in one response. Waiting polls only read: they
+write when there is something to claim, and otherwise sleep until a push or
+the next unacked delivery falls due. Marking expired commands failed and
+deleting old finished ones is left to a periodic sweeper thread.
+"""
+
+import os
+import json
+import math
+import time
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hardware_commands (
+    command_id TEXT PRIMARY KEY,
+    device_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    first_delivered_at REAL,
+    delivered_at REAL,
+    finished_at REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS hardware_commands_pending ON hardware_commands (device_id, state, created_at);
+CREATE INDEX IF NOT EXISTS hardware_commands_finished ON hardware_commands (state, finished_at);
+"""
+
+COMMAND_STATES = ('queued', 'delivered', 'acked', 'failed')
+ACK_STATUSES = ('completed', 'ok', 'success', 'acknowledged')
+
+# Rows a poll may claim: queued, or delivered without an ack in time and with attempts left, and not expired
+DELIVERABLE = """
+device_id = ? AND expires_at > ? AND (state = 'queued' OR
+    (state = 'delivered' AND delivered_at <= ? AND attempts < ?))
+"""
+
+def percentile(values, q):
+    """Return the q-th percentile of sorted values, interpolating linearly between ranks"""
+    rank = (len(values) - 1) * q / 100.0
+    low, high = math.floor(rank), math.ceil(rank)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+class CommandQueue:
+    """Per-device command queues in SQLite with ack tracking and long-poll delivery"""
+
+    def __init__(self, db_path="data/hardware_commands.db", ttl=300, ack_timeout=30, max_attempts=3,
+                 max_depth=50, max_wait=30, retention=86400, sweep_interval=30):
+        """Initialize the store; connections are opened per thread on first use"""
+        self.db_path = db_path
+        self.ttl = ttl
+        self.ack_timeout = ack_timeout
+        self.max_attempts = max_attempts
+        self.max_depth = max_depth
+        self.max_wait = max_wait
+        self.retention = retention
+        self.sweep_interval = sweep_interval
+        self._sweeper = None
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+        self._conditions = {}
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """Return this thread's connection, creating the database and schema if needed"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+                if self._sweeper is None:
+                    self._sweeper = threading.Thread(target=self._sweep_loop, daemon=True)
+                    self._sweeper.start()
+            self._local.conn = conn
+        return conn
+
+    def _sweep_loop(self):
+        """Expire and clean up commands every sweep_interval seconds"""
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Error sweeping hardware commands: {e}")
+
+    def sweep(self):
+        """Fail expired or exhausted commands of every device and delete finished ones past retention"""
+        conn = self._connect()
+        with conn:
+            self._expire(conn, time.time())
+
+    def _condition(self, device_id):
+        """Return the condition long polls for a device wait on, creating it on first use"""
+        with self._lock:
+            if device_id not in self._conditions:
+                self._conditions[device_id] = threading.Condition()
+            return self._conditions[device_id]
+
+    def _expire(self, conn, now):
+        """Fail commands past their TTL or out of attempts, and delete finished ones past retention"""
+        conn.execute("""
+            UPDATE hardware_commands SET state = 'failed', finished_at = ?, error = 'expired'
+            WHERE state IN ('queued', 'delivered') AND expires_at <= ?
+        """, (now, now))
+        conn.execute("""
+            UPDATE hardware_commands SET state = 'failed', finished_at = ?, error = 'not acknowledged'
+            WHERE state = 'delivered' AND attempts >= ? AND delivered_at <= ?
+        """, (now, self.max_attempts, now - self.ack_timeout))
+        conn.execute("DELETE FROM hardware_commands WHERE state IN ('acked', 'failed') AND finished_at <= ?",
+                     (now - self.retention,))
+
+    def push(self, device_id, command, ttl=None):
+        """Queue a command dict (with a command_id) and wake any poll for the device; False if the queue is full"""
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            # Expired commands waiting for the sweeper do not count towards the depth
+            depth = conn.execute(
+                "SELECT COUNT(*) FROM hardware_commands WHERE device_id = ? AND state IN ('queued', 'delivered') "
+                "AND expires_at > ?", (device_id, now)).fetchone()[0]
+            if depth >= self.max_depth:
+                return False
+            conn.execute("""
+                INSERT INTO hardware_commands (command_id, device_id, payload, created_at, expires_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (command['command_id'], device_id, json.dumps(command), now, now + (ttl or self.ttl)))
+
+        condition = self._condition(device_id)
+        with condition:
+            condition.notify_all()
+        return True
+
+    def take(self, device_id, limit=None):
+        """Claim a device's queued commands, plus delivered ones unacked past the timeout, oldest first"""
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            # A single UPDATE ... RETURNING claims the rows, so two polls never get the same delivery
+            rows = conn.execute(f"""
+                UPDATE hardware_commands
+                SET state = 'delivered', attempts = attempts + 1, delivered_at = ?,
+                    first_delivered_at = COALESCE(first_delivered_at, ?)
+                WHERE command_id IN (
+                    SELECT command_id FROM hardware_commands WHERE {DELIVERABLE}
+                    ORDER BY created_at LIMIT ?
+                )
+                RETURNING created_at, payload
+            """, (now, now, device_id, now, now - self.ack_timeout, self.max_attempts,
+                  -1 if limit is None else limit)).fetchall()
+        return [json.loads(payload) for _, payload in sorted(rows)]
+
+    def _poll_state(self, device_id, now):
+        """Read-only check: (whether anything is deliverable now, when the next unacked delivery falls due)"""
+        deliverable, next_due = self._connect().execute(f"""
+            SELECT EXISTS (SELECT 1 FROM hardware_commands WHERE {DELIVERABLE}),
+                   (SELECT MIN(delivered_at) FROM hardware_commands
+                    WHERE device_id = ? AND state = 'delivered' AND attempts < ? AND expires_at > ?)
+        """, (device_id, now, now - self.ack_timeout, self.max_attempts,
+              device_id, self.max_attempts, now)).fetchone()
+        return bool(deliverable), (next_due + self.ack_timeout if next_due is not None else None)
+
+    def pop(self, device_id):
+        """Return the oldest deliverable command, or None"""
+        commands = self.take(device_id, limit=1)
+        return commands[0] if commands else None
+
+    def wait(self, device_id, timeout):
+        """Block until the device has deliverable commands or timeout seconds pass; returns them all"""
+        deadline = time.time() + max(0, min(timeout, self.max_wait))
+        condition = self._condition(device_id)
+        with condition:
+            while True:
+                now = time.time()
+                deliverable, next_due = self._poll_state(device_id, now)
+                if deliverable:
+                    commands = self.take(device_id)
+                    if commands:
+                        return commands
+                remaining = deadline - now
+                if remaining <= 0:
+                    return []
+                # Sleep until a push notifies us or the next unacked delivery may be redelivered
+                if next_due is not None:
+                    remaining = min(remaining, max(next_due - now, 0.05))
+                condition.wait(remaining)
+
+    def acknowledge(self, command_id, status='completed', error=None):
+        """Record a device's ack: acked for a success status, failed otherwise; returns the new state or None"""
+        state = 'acked' if status in ACK_STATUSES else 'failed'
+        conn = self._connect()
+        with conn:
+            row = conn.execute("""
+                UPDATE hardware_commands SET state = ?, finished_at = ?, error = ?
+                WHERE command_id = ? AND state IN ('queued', 'delivered')
+                RETURNING state
+            """, (state, time.time(), None if state == 'acked' else (error or status), command_id)).fetchall()
+        return row[0][0] if row else None
+
+    def pending(self, device_id):
+        """Return the number of queued or unacked commands for a device"""
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM hardware_commands WHERE device_id = ? AND state IN ('queued', 'delivered') "
+            "AND expires_at > ?", (device_id, time.time())).fetchone()[0]
+
+    def stats(self, window=3600):
+        """Return fleet-wide state counts and delivery/ack latency percentiles (seconds) over the last window"""
+        now = time.time()
+        conn = self._connect()
+        counts = dict.fromkeys(COMMAND_STATES, 0)
+        counts.update(conn.execute("SELECT state, COUNT(*) FROM hardware_commands GROUP BY state").fetchall())
+        rows = conn.execute("""
+            SELECT first_delivered_at - created_at,
+                   CASE WHEN state = 'acked' THEN finished_at - created_at END
+            FROM hardware_commands WHERE created_at >= ? AND first_delivered_at IS NOT NULL
+        """, (now - window,)).fetchall()
+
+        def summary(values):
+            values = sorted(float(value) for value in values if value is not None)
+            if not values:
+                return {'count': 0}
+            return {'count': len(values), 'mean': sum(values) / len(values), 'p50': percentile(values, 50),
+                    'p95': percentile(values, 95), 'p99': percentile(values, 99), 'max': values[-1]}
+
+        redelivered = conn.execute(
+            "SELECT COUNT(*) FROM hardware_commands WHERE created_at >= ? AND attempts > 1", (now - window,)).fetchone()[0]
+        devices = conn.execute(
+            "SELECT COUNT(DISTINCT device_id) FROM hardware_commands WHERE state IN ('queued', 'delivered')").fetchone()[0]
+        return {
+            'states': counts,
+            'devices_with_pending': devices,
+            'window_seconds': window,
+            'redelivered': redelivered,
+            'delivery_latency': summary(row[0] for row in rows),
+            'ack_latency': summary(row[1] for row in rows)
+        }
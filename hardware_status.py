@@ -0,0 +1,136 @@
+"""
+Hardware Status
+Registry of connected ESP32 devices that pushes changes to the web UI over
+Server-Sent Events. Heartbeats update the registry and publish an event only
+when a device comes online or its readings change; a watcher thread publishes
+the offline transition when heartbeats stop. Each open page holds one stream
+instead of polling /api/hardware/status.
+"""
+
+import json
+import time
+import queue
+from datetime import datetime
+from threading import Lock, Thread
+
+READING_FIELDS = ('temperature', 'humidity', 'pressure', 'wifi_rssi')
+
+class HardwareStatus:
+    """Device registry with online/offline tracking and SSE subscribers"""
+
+    def __init__(self, devices=None, offline_after=30, check_interval=5, max_queue=100):
+        """Initialize over a device dict (device_id -> info) shared with the hardware endpoints"""
+        self.devices = {} if devices is None else devices
+        self.offline_after = offline_after
+        self.check_interval = check_interval
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._lock = Lock()
+        self._watcher = None
+
+    def device_view(self, device_id, info):
+        """Return the public status of one device"""
+        return {
+            'device_id': device_id,
+            'online': info.get('online', False),
+            'status': info.get('status'),
+            'last_seen': info['last_seen'].isoformat(),
+            **{field: info.get(field) for field in READING_FIELDS}
+        }
+
+    def snapshot(self):
+        """Return the status of every known device"""
+        with self._lock:
+            return [self.device_view(device_id, info) for device_id, info in self.devices.items()]
+
+    def heartbeat(self, device_id, data):
+        """Record a heartbeat; publishes 'device' when the device comes online and 'reading' when readings change"""
+        self._ensure_watcher()
+        readings = {field: data.get(field) for field in READING_FIELDS}
+        with self._lock:
+            previous = self.devices.get(device_id)
+            info = {
+                'last_seen': datetime.now(),
+                'status': data.get('status', 'unknown'),
+                'timestamp': data.get('timestamp'),
+                'online': True,
+                **readings
+            }
+            self.devices[device_id] = info
+            came_online = not previous or not previous.get('online')
+            changed = not previous or any(previous.get(field) != value for field, value in readings.items())
+            view = self.device_view(device_id, info)
+
+        if came_online:
+            self.publish('device', view)
+        elif changed:
+            self.publish('reading', view)
+
+    def _ensure_watcher(self):
+        """Start the offline watcher thread on first use"""
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = Thread(target=self._watch, daemon=True)
+                self._watcher.start()
+
+    def _watch(self):
+        """Mark devices offline once their heartbeats stop and publish the transition"""
+        while True:
+            time.sleep(self.check_interval)
+            now = datetime.now()
+            went_offline = []
+            with self._lock:
+                for device_id, info in self.devices.items():
+                    if info.get('online') and (now - info['last_seen']).total_seconds() >= self.offline_after:
+                        info['online'] = False
+                        went_offline.append(self.device_view(device_id, info))
+            for view in went_offline:
+                self.publish('device', view)
+
+    def subscribe(self):
+        """Register a subscriber queue that starts with a snapshot of every device"""
+        self._ensure_watcher()
+        subscriber = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        # Taken after registering, so any event queued before it is already reflected in it
+        subscriber.put(('snapshot', {'devices': self.snapshot()}))
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """Remove a subscriber queue"""
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event, data):
+        """Send an event to every subscriber; one that has fallen behind gets a fresh snapshot instead"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event, data))
+            except queue.Full:
+                while True:
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        break
+                try:
+                    subscriber.put_nowait(('snapshot', {'devices': self.snapshot()}))
+                except queue.Full:
+                    pass  # Refilled by a concurrent publisher; its next event resyncs this subscriber
+
+    def stream(self, keepalive=15):
+        """Yield Server-Sent Events for one client until it disconnects"""
+        subscriber = self.subscribe()
+        try:
+            while True:
+                try:
+                    event, data = subscriber.get(timeout=keepalive)
+                except queue.Empty:
+                    # Comment lines keep proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
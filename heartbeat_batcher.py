@@ -0,0 +1,87 @@
+"""
+Heartbeat Batcher
+Decouples heartbeat requests from the graph write. Requests only record the
+device's latest reading here; a background thread flushes the latest reading
+of every device that reported since the last flush in one batch call per
+interval. A newer reading replaces an unflushed one (coalesced), and readings
+for new devices are dropped once max_pending devices are waiting.
+"""
+
+import time
+from threading import Lock, Thread
+
+class HeartbeatBatcher:
+    """Latest-reading-per-device buffer flushed by a background thread"""
+
+    def __init__(self, write_batch, interval=2.0, max_pending=10000):
+        """Initialize with write_batch(readings), called with a list of reading dicts per flush"""
+        self.write_batch = write_batch
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = Lock()
+        self._flusher = None
+        self._metrics = {
+            'received': 0,
+            'coalesced': 0,
+            'dropped': 0,
+            'flushed': 0,
+            'failed': 0,
+            'batches': 0,
+            'last_batch_size': 0,
+            'last_flush_ms': 0.0
+        }
+
+    def submit(self, device_id, reading):
+        """Record a device's latest reading; returns False if it was dropped because the buffer is full"""
+        self._ensure_flusher()
+        with self._lock:
+            self._metrics['received'] += 1
+            if device_id in self._pending:
+                self._metrics['coalesced'] += 1
+            elif len(self._pending) >= self.max_pending:
+                self._metrics['dropped'] += 1
+                return False
+            self._pending[device_id] = reading
+        return True
+
+    def _ensure_flusher(self):
+        """Start the flush thread on first use"""
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = Thread(target=self._flush_loop, daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        """Flush pending readings every interval seconds"""
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        """Write every pending reading in one batch; on failure they are kept unless a newer one arrived"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        started = time.time()
+        try:
+            self.write_batch(list(batch.values()))
+        except Exception as e:
+            print(f"Error flushing heartbeat batch: {e}")
+            with self._lock:
+                self._metrics['failed'] += len(batch)
+                for device_id, reading in batch.items():
+                    if device_id not in self._pending and len(self._pending) < self.max_pending:
+                        self._pending[device_id] = reading
+            return
+        with self._lock:
+            self._metrics['flushed'] += len(batch)
+            self._metrics['batches'] += 1
+            self._metrics['last_batch_size'] = len(batch)
+            self._metrics['last_flush_ms'] = round((time.time() - started) * 1000, 1)
+
+    def metrics(self):
+        """Return the ingestion counters plus the current number of pending devices"""
+        with self._lock:
+            return {**self._metrics, 'pending': len(self._pending), 'interval': self.interval}
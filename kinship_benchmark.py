@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Benchmark the native kinship engine against pytholog on synthetic family trees
+"""
+
+import re
+import sys
+import time
+import random
+import argparse
+import pytholog as pl
+from memories.kinship_engine import KinshipEngine
+from memories.kinship_rules import parse_program, goal_predicates
+
+RULE_LINE = re.compile(r"^\s*([a-z]\w*\(.*:-.*\.)\s*(%.*)?$")
+
+def synthetic_family(people=10000, seed=7, founders=200):
+    """Generate parent/married/male/female/dob facts for a multi-generation family tree"""
+    rng = random.Random(seed)
+    facts = []
+    count = 0
+
+    def person(generation):
+        nonlocal count
+        name = f"p{count}"
+        count += 1
+        gender = rng.choice(("male", "female"))
+        facts.append(f"{gender}({name}).")
+        facts.append(f"dob({name}, date({1900 + 25 * generation + rng.randint(0, 20)},"
+                     f"{rng.randint(1, 12)},{rng.randint(1, 28)})).")
+        return name, gender
+
+    generation = [person(0) for _ in range(founders)]
+    level = 0
+    while count < people:
+        level += 1
+        men = [p for p, g in generation if g == "male"]
+        women = [p for p, g in generation if g == "female"]
+        rng.shuffle(men)
+        rng.shuffle(women)
+        children = []
+        for husband, wife in zip(men, women):
+            facts.append(f"married({husband},{wife}).")
+            for _ in range(rng.randint(1, 4)):
+                if count >= people:
+                    break
+                child = person(level)
+                facts.append(f"parent({husband},{child[0]}).")
+                facts.append(f"parent({wife},{child[0]}).")
+                children.append(child)
+        # Spouses marrying in keep every generation large enough to continue
+        generation = children + [person(level) for _ in range(max(0, founders - len(children)))]
+    return facts
+
+def portable_rules(kb_file="prolog/kb.pl"):
+    """Return the single-line kb.pl rules pytholog can evaluate, keyed by predicate
+
+    pytholog has no \\=, \\+, disjunction or compound terms, so rules using them (and
+    every rule depending on one) are left out of the comparison.
+    """
+    candidates = {}
+    with open(kb_file, "r", encoding="utf-8") as f:
+        for line in f:
+            match = RULE_LINE.match(line)
+            if not match or re.search(r"\\=|\\\+|;|date\(", match.group(1)):
+                continue
+            pred, _, body = parse_program(match.group(1))[0]
+            candidates.setdefault(pred, []).append((match.group(1)[:-1], body))
+
+    base = {'parent', 'married', 'male', 'female'}
+    portable = {}
+    changed = True
+    while changed:
+        changed = False
+        for pred, clauses in candidates.items():
+            if pred not in portable and all(dep in base or dep in portable
+                                            for _, body in clauses for dep, _ in goal_predicates(body)):
+                portable[pred] = [text for text, _ in clauses]
+                changed = True
+    return portable
+
+def normalize(result):
+    """Turn a pytholog-style result list into a comparable set"""
+    return {tuple(sorted(r.items())) if isinstance(r, dict) else r for r in result}
+
+def run(people, queries, seed, kb_file, skip_pytholog, reference_queries=None):
+    """Load both engines, run the same random queries and report timings and mismatches"""
+    facts = synthetic_family(people, seed)
+    rules = portable_rules(kb_file)
+    names = sorted({m for fact in facts for m in re.findall(r"\b(p\d+)\b", fact)})
+    rng = random.Random(seed)
+    workload = []
+    for _ in range(queries):
+        relation, name = rng.choice(sorted(rules)), rng.choice(names)
+        workload.append(f"{relation}(X,{name})" if rng.random() < 0.5 else f"{relation}({name},X)")
+    print(f"{len(names)} people, {len(facts)} facts, {len(workload)} queries over {len(rules)} relations")
+
+    started = time.perf_counter()
+    engine = KinshipEngine()
+    engine.from_file(kb_file)
+    engine.add_text("\n".join(facts))
+    print(f"native   load {time.perf_counter() - started:8.2f}s", flush=True)
+    started = time.perf_counter()
+    native = [engine.query(q) for q in workload]
+    native_time = time.perf_counter() - started
+    print(f"native   {native_time:8.2f}s  {len(workload) / native_time:10.1f} queries/s  {engine.table_stats()}")
+
+    if skip_pytholog:
+        return
+
+    started = time.perf_counter()
+    kb = pl.KnowledgeBase("benchmark")
+    # pytholog cannot parse date terms, and none of the portable rules use dob
+    kb([fact[:-1] for fact in facts if not fact.startswith("dob(")] +
+       [text for texts in rules.values() for text in texts])
+    print(f"pytholog load {time.perf_counter() - started:8.2f}s", flush=True)
+    # pytholog scans every clause per goal, so large trees are compared on a prefix of the workload
+    checked = workload[:reference_queries] if reference_queries else workload
+    started = time.perf_counter()
+    reference = [kb.query(pl.Expr(q)) for q in checked]
+    reference_time = time.perf_counter() - started
+    print(f"pytholog {reference_time:8.2f}s  {len(checked) / reference_time:10.1f} queries/s ({len(checked)} queries)")
+
+    mismatches = [q for q, a, b in zip(checked, native, reference) if normalize(a) != normalize(b)]
+    speedup = (reference_time / len(checked)) / (native_time / len(workload))
+    print(f"speedup  {speedup:8.1f}x per query, {len(mismatches)} mismatching answers")
+    for q in mismatches[:10]:
+        print(f"  mismatch: {q}")
+
+def check_equivalence(people=300, seed=7, kb_file="prolog/kb.pl", sample=40):
+    """Compare both engines on every portable relation in both directions and return mismatching queries
+
+    Unlike run(), nothing is cut short: every query of the check goes through pytholog.
+    """
+    facts = synthetic_family(people, seed, founders=20)
+    rules = portable_rules(kb_file)
+    names = sorted({m for fact in facts for m in re.findall(r"\b(p\d+)\b", fact)})
+    sampled = random.Random(seed).sample(names, min(sample, len(names)))
+    workload = [q for relation in sorted(rules) for name in sampled
+                for q in (f"{relation}(X,{name})", f"{relation}({name},X)")]
+
+    engine = KinshipEngine()
+    engine.from_file(kb_file)
+    engine.add_text("\n".join(facts))
+    kb = pl.KnowledgeBase("equivalence")
+    kb([fact[:-1] for fact in facts if not fact.startswith("dob(")] +
+       [text for texts in rules.values() for text in texts])
+
+    mismatches = [q for q in workload if normalize(engine.query(q)) != normalize(kb.query(pl.Expr(q)))]
+    print(f"checked {len(workload)} queries over {len(rules)} relations, {len(mismatches)} mismatching answers")
+    for q in mismatches[:10]:
+        print(f"  mismatch: {q}")
+    return mismatches
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Compare the native kinship engine with pytholog")
+    arg_parser.add_argument("--people", type=int, default=10000)
+    arg_parser.add_argument("--queries", type=int, default=500)
+    arg_parser.add_argument("--seed", type=int, default=7)
+    arg_parser.add_argument("--kb", default="prolog/kb.pl")
+    arg_parser.add_argument("--skip-pytholog", action="store_true")
+    arg_parser.add_argument("--reference-queries", type=int, default=20,
+                            help="Number of queries to also run through pytholog (0 = all)")
+    arg_parser.add_argument("--check", action="store_true",
+                            help="Check answer equivalence on a small tree and exit non-zero on any mismatch")
+    args = arg_parser.parse_args()
+
+    if args.check:
+        sys.exit(1 if check_equivalence(kb_file=args.kb, seed=args.seed) else 0)
+    run(args.people, args.queries, args.seed, args.kb, args.skip_pytholog, args.reference_queries)
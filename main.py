@@ -1,7 +1,9 @@
 import aiml
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, Response
 from glob import glob
 import hashlib
+import gzip
+import json
 import re
 import dns.resolver
 import os
@@ -15,9 +17,18 @@ from datetime import datetime
 from threading import Thread
 from memories import MemoryManager
 from chat_logger import ChatLogger
+from chat_index import ChatIndex
 from neo4j import GraphDatabase
 from simple_gender_predictor import simple_gender_predictor as gender_predictor
 from relationship_manager import relationship_manager
+from family_import import family_importer, parse_rows, guess_format, FORMATS
+from graph_explorer import GraphExplorer, encode_compact
+from graph_overview import GraphOverview
+from hardware_status import HardwareStatus
+from hardware_commands import CommandQueue
+from heartbeat_batcher import HeartbeatBatcher
+from memories.graph_versions import graph_versions
+from memories.sensor_series import sensor_series, clean_readings
 import speech_recognition as sr
 import pyttsx3
 
@@ -98,19 +109,9 @@ def get_username(email):
         neo4j_session.close()
 
 def validate_relationship_from_csv(relationship):
-    """Validate if relationship exists using relationship patterns from relationship_manager"""
+    """Validate if relationship is a known alias, type or Relations_set.csv term of the relationship ontology"""
     try:
-        # Use the relationship patterns from relationship_manager
-        all_valid_relationships = []
-        for rel_type, patterns in relationship_manager.relationship_patterns.items():
-            all_valid_relationships.extend(patterns)
-            all_valid_relationships.append(rel_type)
-        
-        # Also add common relationship variations
-        additional_relationships = ['grandpa', 'grandma', 'granny', 'papa', 'mama', 'daddy', 'mommy']
-        all_valid_relationships.extend(additional_relationships)
-        
-        return relationship.lower() in [rel.lower() for rel in all_valid_relationships]
+        return relationship_manager.ontology.is_known(relationship)
     except Exception as e:
         print(f"Error validating relationship: {e}")
         # Fallback to common relationships if validation fails
@@ -119,6 +120,21 @@ def validate_relationship_from_csv(relationship):
                               'grandfather', 'grandmother', 'nephew', 'niece']
         return relationship.lower() in common_relationships
 
+def graph_response(etag, build_payload):
+    """Return a cacheable graph payload: 304 if the client has this ETag, else compact JSON gzipped when accepted"""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        body = json.dumps(build_payload(), separators=(',', ':')).encode('utf-8')
+        response = Response(body, mimetype='application/json')
+        if 'gzip' in request.accept_encodings and len(body) > 1024:
+            response.set_data(gzip.compress(body, compresslevel=6))
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['Vary'] = 'Accept-Encoding, Cookie'
+    return response
+
 def deduplicate_response(response):
     """Remove duplicate sentences from bot response"""
     if not response or len(response.strip()) == 0:
@@ -161,7 +177,7 @@ def deduplicate_response(response):
 def get_user_greeting(username):
     """Get appropriate greeting based on user's predicted gender"""
     try:
-        predicted_gender = gender_predictor.predict_gender(username)
+        predicted_gender = gender_predictor.predict(username)[0]
         return "Ma'am" if predicted_gender == 'female' else "Sir"
     except:
         return "Sir"  # Default fallback
@@ -186,15 +202,9 @@ def handle_relationship_query(query, username):
                 return f"{greeting}, I apologize, but '{relationship}' is not a relationship type I can recognize."
             
             try:
-                user_relationships = relationship_manager.get_user_relationships(username)
-                for rel in user_relationships:
-                    rel_type = rel.get('relationship', '').lower()
-                    rel_person = rel.get('person_name', '').lower()
-                    if ((rel_type == relationship.lower() or 
-                         rel_type == relationship.lower().replace(' ', '_') or
-                         rel_type.replace('_', ' ') == relationship.lower()) and
-                        rel_person == person_name.lower()):
-                        return f"Yes {greeting}, {person_name} is indeed your {relationship}."
+                # elder_brother counts as a brother and a sibling via the ontology's is-a closure
+                if relationship_manager.is_person_relationship(username, person_name, relationship):
+                    return f"Yes {greeting}, {person_name} is indeed your {relationship}."
                 
                 return f"No {greeting}, {person_name} is not your {relationship}."
             except:
@@ -256,15 +266,9 @@ def handle_relationship_query(query, username):
                 return f"{greeting}, I apologize, but '{relationship}' is not a relationship type I can recognize."
             
             try:
-                user_relationships = relationship_manager.get_user_relationships(username)
-                count = 0
-                
-                for rel in user_relationships:
-                    rel_type = rel.get('relationship', '').lower()
-                    if (rel_type == singular_relationship.lower() or 
-                        rel_type == singular_relationship.lower().replace(' ', '_') or
-                        rel_type.replace('_', ' ') == singular_relationship.lower()):
-                        count += 1
+                # One grouped count rolled up the ontology: "brothers" includes elder and younger brothers
+                counts = relationship_manager.get_relationship_counts(username)
+                count = counts.get(relationship_manager.ontology.canonical(relationship), 0)
                 
                 if count == 0:
                     return f"{greeting}, you don't have any {relationship} in my records."
@@ -298,20 +302,11 @@ def handle_relationship_query(query, username):
     # Handle plural forms and validate relationship
     singular_relationship = relationship.rstrip('s') if relationship.endswith('s') else relationship
     if not validate_relationship_from_csv(singular_relationship):
-        return f"{get_user_greeting(username)}, I apologize, but '{relationship}' is not a relationship type I can recognize."
+        return f"{greeting}, I apologize, but '{relationship}' is not a relationship type I can recognize."
     
     # Query the database for this relationship
     try:
-        user_relationships = relationship_manager.get_user_relationships(username)
-        matching_relationships = []
-        
-        for rel in user_relationships:
-            rel_type = rel.get('relationship', '').lower()
-            if (rel_type == singular_relationship.lower() or 
-                rel_type == singular_relationship.lower().replace(' ', '_') or
-                rel_type.replace('_', ' ') == singular_relationship.lower()):
-                person_name = rel.get('person_name', '')
-                matching_relationships.append(person_name)
+        matching_relationships = relationship_manager.get_people_by_relationship(username, relationship)
         
         if matching_relationships:
             if len(matching_relationships) == 1:
@@ -355,8 +350,7 @@ def store_credentials(name, email, password):
     driver = connect_neo4j()
     neo4j_session = driver.session()
     try:
-        predicted_gender = gender_predictor.predict_gender(name)
-        gender_confidence = gender_predictor.predict_with_confidence(name)[1]
+        predicted_gender, gender_confidence = gender_predictor.predict(name)
         
         query = """
         MERGE (u:User {email: $email})
@@ -402,16 +396,24 @@ memory_manager = MemoryManager(
     kb_file="prolog/kb.pl"
 )
 
-chat_logger = ChatLogger()
+chat_index = ChatIndex()
+graph_explorer = GraphExplorer(relationship_manager.driver)
+graph_overview = GraphOverview(relationship_manager.driver)
+chat_logger = ChatLogger(index=chat_index)
 myBot = aiml.Kernel()
 app = Flask(__name__, static_folder='static/images', static_url_path='/images')
 app.secret_key = 'your-secret-key'
 
 # Hardware management globals
 hardware_devices = {}  # Track connected ESP32 devices
-hardware_commands = {}  # Pending commands for devices
+hardware_commands = CommandQueue()  # Durable per-device command queues with acks and long-poll delivery
+hardware_status = HardwareStatus(hardware_devices)  # Pushes device changes to open pages
+heartbeat_batcher = HeartbeatBatcher(memory_manager.save_sensor_batch)  # Latest reading per device, flushed to Neo4j in batches
 tts_engine = pyttsx3.init()
 
+# Largest family tree accepted by one import request
+MAX_IMPORT_ROWS = 20000
+
 # Initialize speech recognition
 recognizer = sr.Recognizer()
 
@@ -428,8 +430,7 @@ def home():
             session.clear()
             return redirect(url_for('login'))
             
-        predicted_gender = gender_predictor.predict_gender(session['username'])
-        gender_confidence = gender_predictor.predict_with_confidence(session['username'])[1]
+        predicted_gender, gender_confidence = gender_predictor.predict(session['username'])
         
         return render_template("home.html", 
                              username=session['username'],
@@ -519,6 +520,7 @@ def signup():
 
 @app.route("/get")
 def get_bot_response():
+    request_started = time.time()
     if "email" not in session or "username" not in session:
         return "Please log in to use the bot."
     
@@ -535,7 +537,7 @@ def get_bot_response():
     try:
         memory_manager.social.reload_kb("prolog/kb.pl")
         if session.get("fact_file"):
-            memory_manager.social.load_user_facts(session["fact_file"])
+            memory_manager.social.load_user_facts(session["fact_file"], session.get("username"))
     except:
         pass
     
@@ -664,7 +666,8 @@ def get_bot_response():
             session_key=session["session_key"],
             username=session["username"],
             user_msg=query,
-            bot_msg=final_response)
+            bot_msg=final_response,
+            latency_ms=(time.time() - request_started) * 1000)
     except:
         pass
 
@@ -712,6 +715,40 @@ def get_relationships():
     except Exception as e:
         return f"Error retrieving relationships: {e}"
 
+@app.route('/api/relationships/import', methods=['POST'])
+def import_relationships():
+    """Bulk import relatives from an uploaded CSV/JSON/GEDCOM-like file or a JSON body of rows"""
+    if 'email' not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    try:
+        upload = request.files.get('file')
+        if upload:
+            fmt = request.form.get('format') or guess_format(upload.filename)
+            if fmt not in FORMATS:
+                return jsonify({"error": f"Unknown format: {fmt}"}), 400
+            rows = parse_rows(upload.read().decode('utf-8-sig'), fmt)
+        elif request.is_json:
+            data = request.get_json()
+            rows = data.get('rows', []) if isinstance(data, dict) else data
+            rows = [{str(key).lower(): value for key, value in row.items()} for row in rows if isinstance(row, dict)]
+        else:
+            fmt = request.args.get('format', 'csv')
+            if fmt not in FORMATS:
+                return jsonify({"error": f"Unknown format: {fmt}"}), 400
+            rows = parse_rows(request.get_data(as_text=True), fmt)
+        
+        if len(rows) > MAX_IMPORT_ROWS:
+            return jsonify({"error": f"Too many rows ({len(rows)}); the limit is {MAX_IMPORT_ROWS}"}), 413
+        
+        stats = family_importer.import_rows(session['username'], rows)
+        stats['errors'] = stats['errors'][:100]
+        return jsonify(stats)
+        
+    except Exception as e:
+        print(f"Error importing relationships: {e}")
+        return jsonify({"error": str(e)}), 400
+
 @app.route('/graph_visualization')
 def graph_visualization():
     """Display Neo4j graph visualization page"""
@@ -720,6 +757,14 @@ def graph_visualization():
     
     return render_template('graph_visualization.html', username=session['username'])
 
+@app.route('/memory_overview')
+def memory_overview():
+    """Display the label-level overview of the memory graph"""
+    if 'email' not in session:
+        return redirect(url_for('login'))
+    
+    return render_template('memory_overview.html', username=session['username'])
+
 @app.route('/social_memory')
 def social_memory():
     """Display social memory relationship visualization"""
@@ -739,15 +784,13 @@ def social_memory():
 
 @app.route('/api/social_graph')
 def get_social_graph_data():
-    """API endpoint to fetch relationship graph data for social memory visualization"""
+    """API endpoint to fetch relationship graph data for social memory visualization (compact columns)"""
     if 'email' not in session:
         return jsonify({"error": "Not authenticated"}), 401
     
-    try:
-        username = session['username']
-        driver = connect_neo4j()
-        neo4j_session = driver.session()
-        
+    username = session['username']
+    
+    def build_payload():
         # Get user and their relationships
         query = """
         MATCH (u:User {name: $username})
@@ -755,158 +798,131 @@ def get_social_graph_data():
         RETURN u.name as user_name, 
                collect({person: p.name, relationship: type(r), gender: p.gender}) as relationships
         """
-        result = neo4j_session.run(query, username=username).single()
-        
-        nodes = []
-        edges = []
+        with relationship_manager.driver.session() as neo4j_session:
+            result = neo4j_session.run(query, username=username).single()
         
+        nodes, edges, positions = [], [], {}
         if result:
-            # Add user node
-            nodes.append({
-                "id": result['user_name'],
-                "label": result['user_name'],
-                "color": "#ff6b6b",
-                "size": 30,
-                "group": "user"
-            })
-            
-            # Add person nodes and relationships
+            nodes.append((result['user_name'], ['User'], {'name': result['user_name']}))
+            positions[result['user_name']] = 0
             for rel in result['relationships']:
                 if rel['person']:
-                    # Determine color based on gender
-                    color = "#4ecdc4" if rel['gender'] == 'male' else "#ff9ff3" if rel['gender'] == 'female' else "#95a5a6"
-                    
-                    nodes.append({
-                        "id": rel['person'],
-                        "label": rel['person'],
-                        "color": color,
-                        "size": 20,
-                        "group": "person"
-                    })
-                    
-                    edges.append({
-                        "from": result['user_name'],
-                        "to": rel['person'],
-                        "label": rel['relationship'].lower(),
-                        "color": "#666",
-                        "arrows": "to"
-                    })
-        
-        return jsonify({
-            "nodes": nodes,
-            "edges": edges
-        })
-        
+                    if rel['person'] not in positions:
+                        positions[rel['person']] = len(nodes)
+                        nodes.append((rel['person'], [rel['gender'] or 'unknown'], {'name': rel['person']}))
+                    edges.append((None, result['user_name'], rel['person'], rel['relationship'].lower()))
+        
+        payload = encode_compact(nodes, edges, positions, 0)
+        # Social graph groups are genders rather than labels
+        colors = {'User': "#ff6b6b", 'male': "#4ecdc4", 'female': "#ff9ff3"}
+        payload['styles']['colors'] = [colors.get(group, "#95a5a6") for group in payload['styles']['groups']]
+        return payload
+    
+    try:
+        return graph_response(graph_versions.etag(username, 'social_graph'), build_payload)
     except Exception as e:
         return jsonify({"error": f"Failed to fetch social graph: {str(e)}"}), 500
-    finally:
-        try:
-            neo4j_session.close()
-            driver.close()
-        except:
-            pass
 
 @app.route('/api/graph_data')
 def get_graph_data():
-    """API endpoint to fetch Neo4j graph data for visualization"""
+    """API endpoint to fetch one page of the user's memory subgraph for visualization
+    
+    Query parameters: labels and types (comma-separated filters), cursor (from the previous
+    page), limit (nodes per page, capped server-side), format (compact columns by default,
+    or full for one object per node and edge) and layout (precomputed x/y positions unless 0).
+    """
     if 'email' not in session:
         return jsonify({"error": "Not authenticated"}), 401
     
+    labels = [label for label in request.args.get('labels', '').split(',') if label]
+    types = [rel_type for rel_type in request.args.get('types', '').split(',') if rel_type]
     try:
-        driver = connect_neo4j()
-        neo4j_session = driver.session()
-    except Exception as e:
-        return jsonify({"error": "Database connection failed"}), 503
+        limit = int(request.args.get('limit', 200))
+    except ValueError:
+        return jsonify({"error": "limit must be a number"}), 400
     
+    cursor = request.args.get('cursor')
+    compact = request.args.get('format', 'compact') != 'full'
+    layout = request.args.get('layout', '1') != '0'
+    username = session['username']
     try:
-        # Get nodes with labels and properties
-        nodes_query = """
-        MATCH (n)
-        RETURN elementId(n) as id, labels(n) as labels, properties(n) as properties
-        LIMIT 500
-        """
-        nodes_result = neo4j_session.run(nodes_query)
-        
-        # Get relationships
-        edges_query = """
-        MATCH (n1)-[r]->(n2)
-        RETURN elementId(n1) as source, elementId(n2) as target, type(r) as type, properties(r) as properties
-        LIMIT 1000
-        """
-        edges_result = neo4j_session.run(edges_query)
-        
-        # Format nodes for visualization
-        nodes = []
-        for record in nodes_result:
-            node_id = record['id']
-            labels = record['labels']
-            properties = record['properties']
-            
-            # Create display label
-            display_label = ""
-            if 'name' in properties:
-                display_label = properties['name']
-            elif 'email' in properties:
-                display_label = properties['email']
-            elif 'sentence_text' in properties:
-                display_label = properties['sentence_text'][:50] + "..." if len(properties['sentence_text']) > 50 else properties['sentence_text']
-            elif 'full_text' in properties:
-                display_label = properties['full_text'][:30] + "..." if len(properties['full_text']) > 30 else properties['full_text']
-            else:
-                display_label = f"{labels[0] if labels else 'Node'} {node_id}"
-            
-            # Assign colors based on node type
-            color = "#97c2fc"
-            if "User" in labels:
-                color = "#ff6b6b"
-            elif "Person" in labels:
-                color = "#4ecdc4"
-            elif "Text" in labels or "SensoryMemory" in labels:
-                color = "#ffe66d"
-            elif "Sentence" in labels:
-                color = "#a8e6cf"
-            elif "Word" in labels:
-                color = "#dcedc1"
-            elif "Concept" in labels:
-                color = "#ffd93d"
-            elif "Memory" in labels:
-                color = "#ff8b94"
-            
-            nodes.append({
-                "id": node_id,
-                "label": display_label,
-                "color": color,
-                "title": f"Type: {', '.join(labels)}\nProperties: {str(properties)[:200]}",
-                "group": labels[0] if labels else "Unknown"
-            })
-        
-        # Format edges for visualization
-        edges = []
-        for record in edges_result:
-            edges.append({
-                "from": record['source'],
-                "to": record['target'],
-                "label": record['type'],
-                "title": f"Type: {record['type']}\nProperties: {str(record['properties'])}"
-            })
-        
-        return jsonify({
-            "nodes": nodes,
-            "edges": edges,
-            "stats": {
-                "total_nodes": len(nodes),
-                "total_edges": len(edges)
-            }
-        })
-        
+        # A layout finishing in the background changes the payload without a graph version bump
+        layout_version = graph_explorer.layout_version(username, labels) if layout else None
+        etag = graph_versions.etag(username, 'graph_data', sorted(labels), sorted(types), cursor, limit, compact,
+                                   layout, layout_version)
+        return graph_response(etag, lambda: graph_explorer.page(username, labels, types, cursor, limit, compact, layout))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"Failed to fetch graph data: {str(e)}"}), 500
-    finally:
-        try:
-            neo4j_session.close()
-            driver.close()
-        except:
-            pass
+
+@app.route('/api/graph_neighbors')
+def get_graph_neighbors():
+    """API endpoint to fetch the k-hop neighborhood of a node of the user's subgraph
+    
+    Query parameters: id (defaults to the user's own node), hops, limit (neighbors per node),
+    types (comma-separated filter), cursor (a "more" cursor from a previous response),
+    format as for /api/graph_data, and layout=1 to include the cached whole-subgraph
+    positions (off by default, since expanding a node should only touch its neighborhood).
+    """
+    if 'email' not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    node_id = request.args.get('id') or None
+    types = [rel_type for rel_type in request.args.get('types', '').split(',') if rel_type]
+    try:
+        hops = int(request.args.get('hops', 1))
+        limit = int(request.args.get('limit', 25))
+    except ValueError:
+        return jsonify({"error": "hops and limit must be numbers"}), 400
+    
+    cursor = request.args.get('cursor')
+    compact = request.args.get('format', 'compact') != 'full'
+    layout = request.args.get('layout', '0') == '1'
+    username = session['username']
+    
+    def build_payload():
+        result = graph_explorer.neighborhood(username, node_id, hops, limit, cursor, types, compact, layout)
+        if result is None:
+            raise LookupError("Node not found")
+        return result
+    
+    try:
+        layout_version = graph_explorer.layout_version(username) if layout else None
+        etag = graph_versions.etag(username, 'graph_neighbors', node_id, sorted(types), hops, limit, cursor, compact,
+                                   layout, layout_version)
+        return graph_response(etag, build_payload)
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch neighbors: {str(e)}"}), 500
+
+@app.route('/api/memory_overview')
+def get_memory_overview():
+    """API endpoint with node counts per label, relationship counts per type, the label graph and the user's layer sizes"""
+    if 'email' not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    try:
+        return jsonify(graph_overview.overview(session['username']))
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch memory overview: {str(e)}"}), 500
+
+@app.route('/api/graph_node')
+def get_graph_node():
+    """API endpoint to fetch the properties of one node of the user's subgraph"""
+    if 'email' not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    try:
+        details = graph_explorer.node_details(session['username'], request.args.get('id', ''))
+        if not details:
+            return jsonify({"error": "Node not found"}), 404
+        return jsonify(details)
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch node: {str(e)}"}), 500
 
 @app.route('/migrate_social_memory')
 def migrate_social_memory():
@@ -972,45 +988,28 @@ def migrate_sensory_memory():
 def hardware_heartbeat():
     """Receive heartbeat from ESP32 devices"""
     try:
-        data = request.get_json()
-        print(f"Received heartbeat data: {data}")  # Debug print
-        
+        data = request.get_json(silent=True) or {}
         device_id = data.get('device_id')
         
         if not device_id:
-            print("Missing device_id in heartbeat")  # Debug print
             return jsonify({"error": "Missing device_id"}), 400
         
-        # Update device status
-        hardware_devices[device_id] = {
-            'last_seen': datetime.now(),
-            'status': data.get('status', 'unknown'),
-            'temperature': data.get('temperature'),
-            'humidity': data.get('humidity'),
-            'pressure': data.get('pressure'),
-            'wifi_rssi': data.get('wifi_rssi'),
-            'timestamp': data.get('timestamp')
-        }
-        
-        # Store sensor data in Neo4j with SensoryMemory_SensorBased label (overwrites existing)
         try:
-            memory_manager.sensory.save_sensor_data(
-                device_id=device_id,
-                temperature=data.get('temperature'),
-                humidity=data.get('humidity'),
-                pressure=data.get('pressure'),
-                wifi_rssi=data.get('wifi_rssi'),
-                timestamp=datetime.now().isoformat()
-            )
-        except Exception as e:
-            print(f"Error storing sensor data to Neo4j: {e}")
-        
-        print(f"Updated device {device_id}: temp={data.get('temperature')}°C, humidity={data.get('humidity')}%, pressure={data.get('pressure')}hPa")  # Debug print
+            readings = clean_readings(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Everything here is in memory: the device registry, the sensor ring buffer, and the
+        # batcher that writes each device's latest reading to Neo4j in the background
+        timestamp = datetime.now().isoformat()
+        hardware_status.heartbeat(device_id, data)
+        sensor_series.append(device_id, **readings)
+        heartbeat_batcher.submit(device_id, {'device_id': device_id, 'timestamp': timestamp, **readings})
         
         return jsonify({
             "status": "success",
             "message": "Heartbeat received",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": timestamp
         })
         
     except Exception as e:
@@ -1036,13 +1035,9 @@ def trigger_speak_button(device_id):
 def get_hardware_commands(device_id):
     """Get pending commands for a specific device"""
     try:
-        commands = hardware_commands.get(device_id, [])
-        
-        if commands:
-            # Return the first command and remove it from queue
-            command = commands.pop(0)
-            if not commands:  # If queue is empty, remove the key
-                del hardware_commands[device_id]
+        # Return the first command and remove it from queue
+        command = hardware_commands.pop(device_id)
+        if command:
             return jsonify(command)
         else:
             return jsonify({"message": "No pending commands"}), 204
@@ -1051,6 +1046,24 @@ def get_hardware_commands(device_id):
         print(f"Error getting hardware commands: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+@app.route('/api/hardware/commands/<device_id>/poll', methods=['GET'])
+def poll_hardware_commands(device_id):
+    """Long-poll for commands: waits up to ?wait= seconds and returns every pending command at once"""
+    try:
+        wait = float(request.args.get('wait', 20))
+    except ValueError:
+        return jsonify({"error": "wait must be a number"}), 400
+    
+    try:
+        commands = hardware_commands.wait(device_id, wait)
+        if commands:
+            return jsonify({"commands": commands})
+        return jsonify({"message": "No pending commands"}), 204
+        
+    except Exception as e:
+        print(f"Error polling hardware commands: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
 @app.route('/api/hardware/commands/ack', methods=['POST'])
 def acknowledge_hardware_command():
     """Acknowledge command completion from device"""
@@ -1058,55 +1071,75 @@ def acknowledge_hardware_command():
         data = request.get_json()
         device_id = data.get('device_id')
         command_id = data.get('command_id')
-        status = data.get('status')
+        status = data.get('status', 'completed')
         
-        print(f"Command {command_id} for device {device_id} completed with status: {status}")
+        if not command_id:
+            return jsonify({"error": "command_id is required"}), 400
         
-        return jsonify({"status": "acknowledged"})
+        state = hardware_commands.acknowledge(command_id, status, data.get('error'))
+        if state is None:
+            # Unknown, already finished, or expired before the ack arrived
+            return jsonify({"status": "ignored", "command_id": command_id}), 404
+        
+        print(f"Command {command_id} for device {device_id} {state} with status: {status}")
+        return jsonify({"status": "acknowledged", "state": state})
         
     except Exception as e:
         print(f"Error acknowledging hardware command: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+@app.route('/api/hardware/command_stats')
+def get_hardware_command_stats():
+    """Get fleet-wide command queue states and delivery latency"""
+    try:
+        window = int(request.args.get('window', 3600))
+        return jsonify(hardware_commands.stats(window))
+        
+    except ValueError:
+        return jsonify({"error": "window must be an integer number of seconds"}), 400
+    except Exception as e:
+        print(f"Error getting hardware command stats: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route('/api/hardware/sensors/<device_id>')
+def get_hardware_sensor_series(device_id):
+    """Get a device's sensor readings over a time range, raw or as minute/hour/day rollups"""
+    try:
+        end = float(request.args.get('end', time.time()))
+        start = float(request.args.get('start', end - float(request.args.get('hours', 24)) * 3600))
+        resolution = request.args.get('resolution') or None
+        return jsonify(sensor_series.query(device_id, start, end, resolution))
+        
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error getting sensor series: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route('/api/hardware/ingest_stats')
+def get_hardware_ingest_stats():
+    """Get heartbeat batching counters (received, coalesced, dropped, flushed)"""
+    return jsonify(heartbeat_batcher.metrics())
+
 @app.route('/api/hardware/status')
 def get_hardware_status():
     """Get status of all connected hardware devices"""
     try:
-        current_time = datetime.now()
-        device_list = []
-        
-        print(f"Hardware status check - Found {len(hardware_devices)} devices: {list(hardware_devices.keys())}")  # Debug print
-        
-        for device_id, device_info in hardware_devices.items():
-            # Check if device is online (last seen within 30 seconds)
-            time_diff = current_time - device_info['last_seen']
-            is_online = time_diff.total_seconds() < 30
-            
-            print(f"Device {device_id}: last_seen={device_info['last_seen']}, time_diff={time_diff.total_seconds()}s, online={is_online}")  # Debug print
-            
-            device_list.append({
-                'device_id': device_id,
-                'online': is_online,
-                'last_seen': device_info['last_seen'].isoformat(),
-                'temperature': device_info.get('temperature'),
-                'humidity': device_info.get('humidity'),
-                'pressure': device_info.get('pressure'),
-                'wifi_rssi': device_info.get('wifi_rssi')
-            })
-        
-        response_data = {
-            "devices": device_list,
-            "timestamp": current_time.isoformat()
-        }
-        
-        print(f"Sending hardware status response: {response_data}")  # Debug print
-        
-        return jsonify(response_data)
+        return jsonify({
+            "devices": hardware_status.snapshot(),
+            "timestamp": datetime.now().isoformat()
+        })
         
     except Exception as e:
         print(f"Error getting hardware status: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+@app.route('/api/hardware/events')
+def hardware_events():
+    """Server-Sent Events stream: a snapshot of all devices, then online/offline transitions and changed readings"""
+    return Response(hardware_status.stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/hardware/speak/<device_id>', methods=['POST'])
 def trigger_hardware_speak(device_id):
     """Capture microphone audio, process through bot, and send response to ESP32"""
@@ -1247,11 +1280,10 @@ def send_hardware_command(device_id, command, parameters=None):
         if parameters:
             command_data.update(parameters)
         
-        if device_id not in hardware_commands:
-            hardware_commands[device_id] = []
-        
-        hardware_commands[device_id].append(command_data)
-        print(f"Command queued for device {device_id}: {command}")
+        if hardware_commands.push(device_id, command_data):
+            print(f"Command queued for device {device_id}: {command}")
+        else:
+            print(f"Command queue full for device {device_id}, dropped: {command}")
         
     except Exception as e:
         print(f"Error sending hardware command: {e}")
@@ -1345,6 +1377,12 @@ def logout():
             )
         except:
             pass
+        
+        # Close and compress the session's chat log segment
+        try:
+            chat_logger.end_session(session["session_key"])
+        except:
+            pass
     
     # Clear all session data
     session.clear()
@@ -4,14 +4,27 @@ Provides common Neo4j connection functionality for all memory systems
 """
 
 from neo4j import GraphDatabase
+from .memory_counts import WriteTally, CountingSession
 
 class BaseNeo4jMemory:
     """Base class for Neo4j-based memory systems"""
+
+    # Label shared by the nodes this memory layer writes
+    layer = None
     
     def __init__(self, neo4j_uri="bolt://localhost:7687", neo4j_user="neo4j", neo4j_password="12345678"):
         """Initialize Neo4j connection"""
         self.driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+        self.tally = WriteTally()
+
+    def counting_session(self):
+        """Return a session whose writes are tallied for this thread (see take_tally)"""
+        return CountingSession(self.driver.session(), self.tally)
+
+    def take_tally(self):
+        """Return (nodes, relationships) written by this thread since the last call"""
+        return self.tally.take()
 
     def close(self):
         """Close Neo4j connection"""
-        self.driver.close() 
\ No newline at end of file
+        self.driver.close()
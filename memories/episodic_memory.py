@@ -13,6 +13,8 @@ from .base_memory import BaseNeo4jMemory
 class EpisodicMemory(BaseNeo4jMemory):
     """Stores time-stamped, context-rich user episodes"""
 
+    layer = "EpisodicMemory"
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.sia = SentimentIntensityAnalyzer()
@@ -25,7 +27,7 @@ class EpisodicMemory(BaseNeo4jMemory):
         emotion = self._detect_emotion(text)
         timestamp = time.time()
 
-        with self.driver.session() as ses:
+        with self.counting_session() as ses:
             # Check if there's an active session episode for this user
             existing_episode = ses.run("""
                 MATCH (u:User {id: $user_id})-[:EXPERIENCED]->(e:Episode:EpisodicMemory)
@@ -0,0 +1,172 @@
+"""
+Fact Store
+SQLite-backed store for the per-user Prolog facts that used to live only in
+prolog/facts/*.pl. A (user, predicate, arg1, arg2) unique index makes appends
+idempotent and race-free, and the .pl files can still be exported for pytholog.
+"""
+
+import os
+import glob
+import sqlite3
+import threading
+from datetime import datetime
+from .kinship_rules import parse_file, parse_program, format_term, format_fact
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS facts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user TEXT NOT NULL,
+    predicate TEXT NOT NULL,
+    arg1 TEXT NOT NULL DEFAULT '',
+    arg2 TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS facts_unique ON facts (user, predicate, arg1, arg2);
+"""
+
+def fact_file_user(fact_file):
+    """Return the user key of a prolog/facts/<user>.pl file (user@x.com -> user_at_x.com.pl)"""
+    name = os.path.basename(fact_file)
+    if name.endswith(".pl"):
+        name = name[:-3]
+    return name.replace('_at_', '@')
+
+def user_fact_file(user, fact_dir="prolog/facts"):
+    """Return the .pl export path for a user"""
+    return os.path.join(fact_dir, f"{user.replace('@', '_at_')}.pl")
+
+class FactStore:
+    """Per-user fact table with a uniqueness index, WAL journaling and .pl export"""
+
+    def __init__(self, db_path="prolog/facts.db"):
+        """Initialize the store; connections are opened per thread on first use"""
+        self.db_path = db_path
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def _connect(self):
+        """Return this thread's connection, creating the database and schema if needed"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(pred, args):
+        """Encode a parsed fact as (predicate, arg1, arg2) columns of Prolog text"""
+        if len(args) > 2:
+            raise ValueError(f"Only facts with up to two arguments can be stored: {pred}/{len(args)}")
+        encoded = [format_term(arg, quoted=True) for arg in args]
+        return (pred, *(encoded + ['', ''])[:2])
+
+    @staticmethod
+    def _clauses(text):
+        """Parse fact text into (pred, args) pairs, rejecting rules"""
+        clauses = parse_program(text)
+        if any(body is not None for _, _, body in clauses):
+            raise ValueError("Rules cannot be stored as facts")
+        return [(pred, args) for pred, args, _ in clauses]
+
+    def add_facts(self, user, facts):
+        """Insert Prolog fact strings for a user in one transaction; returns the newly stored facts"""
+        clauses = []
+        for fact in facts:
+            clauses.extend(self._clauses(fact))
+        return self.add_clauses(user, clauses)
+
+    def add_clauses(self, user, clauses):
+        """Insert parsed (pred, args) facts for a user; returns the ones that were not already stored"""
+        now = datetime.now().isoformat()
+        inserted = []
+        conn = self._connect()
+        with conn:
+            for pred, args in clauses:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO facts (user, predicate, arg1, arg2, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (user, *self._row(pred, args), now))
+                if cursor.rowcount:
+                    inserted.append((pred, args))
+        return inserted
+
+    def add_fact(self, user, fact):
+        """Insert one Prolog fact string; returns False if the user already had it"""
+        return bool(self.add_facts(user, [fact]))
+
+    def facts(self, user, after_id=0):
+        """Return a user's facts as (id, pred, args) in insertion order, optionally only newer rows"""
+        rows = self._connect().execute(
+            "SELECT id, predicate, arg1, arg2 FROM facts WHERE user = ? AND id > ? ORDER BY id",
+            (user, after_id)).fetchall()
+        texts = [f"{pred}({','.join(arg for arg in (arg1, arg2) if arg)})." if arg1 else f"{pred}."
+                 for _, pred, arg1, arg2 in rows]
+        clauses = parse_program("\n".join(texts))
+        return [(row[0], pred, args) for row, (pred, args, _) in zip(rows, clauses)]
+
+    def users(self):
+        """Return every user with stored facts"""
+        return [user for (user,) in self._connect().execute("SELECT DISTINCT user FROM facts ORDER BY user")]
+
+    def count(self, user=None):
+        """Return the number of stored facts, for one user or overall"""
+        if user is None:
+            return self._connect().execute("SELECT COUNT(*) FROM facts").fetchone()[0]
+        return self._connect().execute("SELECT COUNT(*) FROM facts WHERE user = ?", (user,)).fetchone()[0]
+
+    def export_pl(self, user, path=None, fact_dir="prolog/facts"):
+        """Write a user's facts to a .pl file (atomically) for pytholog and older tooling"""
+        path = path or user_fact_file(user, fact_dir)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(f"% Facts for {user}\n")
+            for _, pred, args in self.facts(user):
+                f.write(format_fact(pred, args) + "\n")
+        os.replace(tmp_path, path)
+        return path
+
+    def import_file(self, fact_file, user=None):
+        """Import the facts of one .pl file; returns how many were new"""
+        clauses = [(pred, args) for pred, args, body in parse_file(fact_file) if body is None]
+        return len(self.add_clauses(user or fact_file_user(fact_file), clauses))
+
+    def import_directory(self, fact_dir="prolog/facts"):
+        """One-shot import of every prolog/facts/*.pl file; returns {user: new facts}"""
+        imported = {}
+        for fact_file in sorted(glob.glob(os.path.join(fact_dir, "*.pl"))):
+            try:
+                imported[fact_file_user(fact_file)] = self.import_file(fact_file)
+            except Exception as e:
+                print(f"Error importing {fact_file}: {e}")
+        return imported
+
+# Global instance
+fact_store = FactStore()
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Import prolog/facts/*.pl into the SQLite fact store or export it back")
+    arg_parser.add_argument("--db", default="prolog/facts.db")
+    arg_parser.add_argument("--facts-dir", default="prolog/facts")
+    arg_parser.add_argument("--export", action="store_true", help="Write every user's facts back to .pl files")
+    args = arg_parser.parse_args()
+
+    store = FactStore(args.db)
+    if args.export:
+        for user in store.users():
+            print(f"Exported {store.export_pl(user, fact_dir=args.facts_dir)}")
+    else:
+        for user, count in store.import_directory(args.facts_dir).items():
+            print(f"{user}: {count} new facts")
+        print(f"{store.count()} facts stored in {args.db}")
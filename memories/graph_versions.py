@@ -0,0 +1,40 @@
+"""
+Graph Versions
+Per-user counters bumped by the memory writers whenever they change a user's
+part of the Neo4j graph. Readers use them to key caches and to build strong
+ETags, so an unchanged graph can be answered with 304 Not Modified.
+"""
+
+import uuid
+import hashlib
+from threading import Lock
+
+class GraphVersions:
+    """In-process graph version per user; the epoch changes on restart so old ETags never match"""
+
+    def __init__(self):
+        """Initialize empty counters and a fresh epoch"""
+        self.epoch = uuid.uuid4().hex[:12]
+        self._versions = {}
+        self._lock = Lock()
+
+    def bump(self, user):
+        """Record a change to a user's graph; returns the new version"""
+        if not user:
+            return 0
+        with self._lock:
+            self._versions[user] = self._versions.get(user, 0) + 1
+            return self._versions[user]
+
+    def version(self, user):
+        """Return a user's current graph version"""
+        with self._lock:
+            return self._versions.get(user, 0)
+
+    def etag(self, user, *parts):
+        """Return an (unquoted) strong ETag value for a response derived from the user's graph and request parts"""
+        digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:16]
+        return f"{self.epoch}-{self.version(user)}-{digest}"
+
+# Global instance
+graph_versions = GraphVersions()
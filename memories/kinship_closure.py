@@ -0,0 +1,469 @@
+"""
+Kinship Closure
+Materializes every relation derivable from the kb.pl rules bottom-up and keeps
+the derived (relation, a, b) triples in per-person hash indexes, so "all
+relationships of X" is a dictionary lookup instead of ~120 Prolog queries.
+"""
+
+import os
+from threading import RLock
+from .kinship_rules import Var, parse_file, parse_program, unify, compare, walk, substitute, goal_predicates, rename
+
+# Predicates whose second argument is a value, not a person
+ATTRIBUTE_PREDICATES = {'gender', 'dob'}
+
+# The longest derivation in kb.pl spans four family edges (cousin, tayi, dewrani, ...),
+# so a new fact can only change triples between people within this many hops of it
+MAX_DERIVATION_HOPS = 4
+
+def _head_connected(args, body, non_linking):
+    """Check that a rule's head variables are joined through person-linking goals"""
+    groups = {}
+
+    def find(v):
+        while groups.setdefault(v, v) != v:
+            v = groups[v]
+        return v
+
+    def link(goal):
+        if goal[0] == 'call' and goal[1] not in non_linking:
+            names = [a for a in goal[2] if isinstance(a, Var)]
+            for other in names[1:]:
+                groups[find(other)] = find(names[0])
+        elif goal[0] == 'and':
+            for sub in goal[1]:
+                link(sub)
+        elif goal[0] == 'or':
+            # A disjunction only links what every branch links; kb.pl branches are symmetric
+            link(goal[1][0])
+
+    link(body)
+    head_vars = [a for a in args if isinstance(a, Var)]
+    return len({find(v) for v in head_vars}) <= 1
+
+class KinshipClosure:
+    """Bottom-up materialized kinship relations with incremental maintenance"""
+
+    def __init__(self):
+        """Initialize empty fact, rule and index storage"""
+        self.rules = {}
+        self.asserted = {}
+        self.relations = {}
+        self.forward = {}
+        self.backward = {}
+        self.neighbors = {}
+        self._loaded_files = {}
+        self._order = []
+        self.virtual = set()
+        self.version = 0
+        self._built = False
+        self._lock = RLock()
+
+    def load_file(self, path):
+        """Load facts and rules from a file, skipping files unchanged since the last load"""
+        if not os.path.exists(path):
+            return False
+        stat = os.stat(path)
+        signature = (stat.st_mtime, stat.st_size)
+        if self._loaded_files.get(path) == signature:
+            return False
+        self._loaded_files[path] = signature
+        self.add_clauses(parse_file(path))
+        return True
+
+    def add_text(self, text):
+        """Load facts and rules from Prolog source text"""
+        self.add_clauses(parse_program(text))
+
+    def add_clauses(self, clauses):
+        """Add parsed clauses; new rules trigger a rebuild, new facts an incremental update"""
+        with self._lock:
+            new_rules = False
+            new_facts = []
+            for pred, args, body in clauses:
+                if body is not None:
+                    self.rules.setdefault(pred, []).append((args, body))
+                    new_rules = True
+                elif args not in self.asserted.setdefault(pred, set()):
+                    self.asserted[pred].add(args)
+                    new_facts.append((pred, args))
+
+            for pred, args in new_facts:
+                self._link(pred, args)
+
+            if new_rules or not self._built:
+                self.rebuild()
+            elif new_facts:
+                self._update(new_facts)
+            if new_rules or new_facts:
+                self.version += 1
+
+    def _link(self, pred, args):
+        """Record person-to-person edges used to find the people a fact can affect"""
+        if pred in ATTRIBUTE_PREDICATES or len(args) != 2:
+            return
+        a, b = args
+        if isinstance(a, str) and isinstance(b, str):
+            self.neighbors.setdefault(a, set()).add(b)
+            self.neighbors.setdefault(b, set()).add(a)
+
+    def _rule_order(self):
+        """Order rule predicates so every predicate is derived after its dependencies"""
+        order = []
+        state = {}
+
+        def visit(pred):
+            if state.get(pred) == 'done':
+                return
+            if state.get(pred) == 'active':
+                raise ValueError(f"Recursive rule for {pred} is not supported")
+            state[pred] = 'active'
+            for args, body in self.rules.get(pred, []):
+                for dep, _ in goal_predicates(body):
+                    if dep in self.rules:
+                        visit(dep)
+            state[pred] = 'done'
+            order.append(pred)
+
+        for pred in self.rules:
+            visit(pred)
+        return order
+
+    def _classify(self, order):
+        """Find rule predicates relating people with no family path between them (e.g. older)
+
+        These are not materialized (they would be quadratic in the number of people) and
+        are evaluated on demand when another rule calls them.
+        """
+        virtual = set()
+        for pred in order:
+            non_linking = ATTRIBUTE_PREDICATES | virtual
+            if any(not _head_connected(args, body, non_linking) for args, body in self.rules[pred]):
+                virtual.add(pred)
+        return virtual
+
+    def rebuild(self):
+        """Recompute the full closure from all asserted facts"""
+        with self._lock:
+            self._order = self._rule_order()
+            self.virtual = self._classify(self._order)
+            self.relations = self._evaluate(self.asserted)
+            self.forward = {}
+            self.backward = {}
+            for pred, tuples in self.relations.items():
+                for args in tuples:
+                    self._index(pred, args)
+            self._built = True
+
+    def _evaluate(self, facts):
+        """Evaluate all rules bottom-up over a fact set"""
+        relations = {pred: set(tuples) for pred, tuples in facts.items()}
+        indexes = {}
+        for pred in self._order:
+            if pred in self.virtual:
+                continue
+            derived = relations.setdefault(pred, set())
+            for args, body in self.rules[pred]:
+                for binding in self._solve(body, {}, relations, indexes):
+                    head = substitute(args, binding)
+                    derived.add(head)
+            indexes.pop(pred, None)
+        return relations
+
+    def _lookup(self, pred, pattern, relations, indexes):
+        """Return candidate tuples for a goal using a first-bound-argument index"""
+        tuples = relations.get(pred)
+        if not tuples:
+            return ()
+        for pos, value in enumerate(pattern):
+            if isinstance(value, (str, int)):
+                by_pos = indexes.setdefault(pred, {})
+                if pos not in by_pos:
+                    index = {}
+                    for args in tuples:
+                        if len(args) > pos:
+                            index.setdefault(args[pos], []).append(args)
+                    by_pos[pos] = index
+                return by_pos[pos].get(value, ())
+        return tuples
+
+    def _solve(self, goal, binding, relations, indexes):
+        """Enumerate bindings that satisfy a body goal against materialized relations"""
+        kind = goal[0]
+        if kind == 'call' and goal[1] in self.virtual:
+            yield from self._solve_virtual(goal[1], goal[2], binding, relations, indexes)
+        elif kind == 'call':
+            pred, args = goal[1], goal[2]
+            pattern = tuple(walk(arg, binding) for arg in args)
+            for candidate in self._lookup(pred, pattern, relations, indexes):
+                if len(candidate) != len(pattern):
+                    continue
+                result = unify(pattern, candidate, binding)
+                if result is not None:
+                    yield result
+        elif kind == 'and':
+            yield from self._solve_all(goal[1], 0, binding, relations, indexes)
+        elif kind == 'or':
+            for branch in goal[1]:
+                yield from self._solve(branch, binding, relations, indexes)
+        elif kind == 'not':
+            for _ in self._solve(goal[1], binding, relations, indexes):
+                return
+            yield binding
+        elif kind == 'cmp':
+            result = compare(goal[1], goal[2], goal[3], binding)
+            if result is not None:
+                yield result
+
+    def _solve_virtual(self, pred, args, binding, relations, indexes):
+        """Evaluate a non-materialized predicate top-down for the current binding"""
+        pattern = tuple(substitute(arg, binding) for arg in args)
+        for candidate in relations.get(pred, ()):
+            result = unify(pattern, candidate, binding)
+            if result is not None:
+                yield result
+        for number, (head, body) in enumerate(self.rules[pred]):
+            renamed = rename(head, body, number)
+            local = unify(pattern, renamed[0], {})
+            if local is None:
+                continue
+            seen = set()
+            for solved in self._solve(renamed[1], local, relations, indexes):
+                answer = substitute(pattern, solved)
+                if answer in seen:
+                    continue
+                seen.add(answer)
+                result = unify(pattern, answer, binding)
+                if result is not None:
+                    yield result
+
+    def _solve_all(self, goals, i, binding, relations, indexes):
+        """Solve a conjunction left to right"""
+        if i == len(goals):
+            yield binding
+            return
+        for result in self._solve(goals[i], binding, relations, indexes):
+            yield from self._solve_all(goals, i + 1, result, relations, indexes)
+
+    def _persons(self, pred, args):
+        """Return the person arguments of a tuple"""
+        if pred in ATTRIBUTE_PREDICATES:
+            args = args[:1]
+        return [arg for arg in args if isinstance(arg, str)]
+
+    def _neighbors(self, person):
+        """Return the people sharing an asserted family edge with a person"""
+        return self.neighbors.get(person, ())
+
+    def _ball(self, people, hops):
+        """Return everyone within a number of family edges of the given people"""
+        seen = set(people)
+        frontier = set(people)
+        for _ in range(hops):
+            frontier = {n for p in frontier for n in self._neighbors(p)} - seen
+            if not frontier:
+                break
+            seen |= frontier
+        return seen
+
+    def _update(self, new_facts):
+        """Recompute only the triples between people a batch of new facts can affect"""
+        touched = {p for pred, args in new_facts for p in self._persons(pred, args)}
+        affected = self._ball(touched, MAX_DERIVATION_HOPS)
+        region = self._ball(affected, MAX_DERIVATION_HOPS)
+
+        local_facts = {}
+        for pred, tuples in self._fact_sets():
+            kept = {args for args in tuples if all(p in region for p in self._persons(pred, args))}
+            if kept:
+                local_facts.setdefault(pred, set()).update(kept)
+        local = self._evaluate(local_facts)
+
+        # Every derived predicate is in local, and asserted tuples are never stale
+        for pred, derived in local.items():
+            stale = {args for args in self._triples(pred)
+                     if not self._is_asserted(pred, args) and all(p in affected for p in self._persons(pred, args))}
+            fresh = {args for args in derived if all(p in affected for p in self._persons(pred, args))}
+            for args in stale - fresh:
+                self._discard_triple(pred, args)
+            for args in fresh - stale:
+                self._add_triple(pred, args)
+
+    def _fact_sets(self):
+        """Return (predicate, asserted tuples) pairs"""
+        return self.asserted.items()
+
+    def _is_asserted(self, pred, args):
+        """Check whether a tuple is an asserted fact"""
+        return args in self.asserted.get(pred, ())
+
+    def _triples(self, pred):
+        """Return the tuples of a predicate in the closure"""
+        return self.relations.get(pred, ())
+
+    def _add_triple(self, pred, args):
+        """Add a tuple to the closure and its indexes (a no-op if present)"""
+        self.relations.setdefault(pred, set()).add(args)
+        self._index(pred, args)
+
+    def _discard_triple(self, pred, args):
+        """Remove a tuple from the closure and its indexes"""
+        self.relations.get(pred, set()).discard(args)
+        self._unindex(pred, args)
+
+    def _index(self, pred, args):
+        """Add a binary person triple to the per-person indexes"""
+        if len(args) == 2 and isinstance(args[0], str) and isinstance(args[1], str):
+            self.forward.setdefault(args[0], {}).setdefault(pred, set()).add(args[1])
+            self.backward.setdefault(args[1], {}).setdefault(pred, set()).add(args[0])
+
+    def _unindex(self, pred, args):
+        """Remove a binary person triple from the per-person indexes"""
+        if len(args) == 2 and isinstance(args[0], str) and isinstance(args[1], str):
+            self.forward.get(args[0], {}).get(pred, set()).discard(args[1])
+            self.backward.get(args[1], {}).get(pred, set()).discard(args[0])
+
+    def has(self, pred, args):
+        """Check whether a tuple is in the closure"""
+        return args in self._triples(pred)
+
+    def holds(self, pred, a, b):
+        """Check whether pred(a, b) is in the closure"""
+        return self.has(pred, (a, b))
+
+    def linked(self, person, pred, outgoing):
+        """Return the set of X with pred(person, X) if outgoing, else pred(X, person)"""
+        index = self.forward if outgoing else self.backward
+        return index.get(person, {}).get(pred, set())
+
+    def linked_predicates(self, person):
+        """Return the predicates with a binary tuple involving a person"""
+        return set(self.forward.get(person, ())) | set(self.backward.get(person, ()))
+
+    def subjects(self, pred, b):
+        """Return every X with pred(X, b)"""
+        return sorted(self.linked(b, pred, False))
+
+    def objects(self, pred, a):
+        """Return every X with pred(a, X)"""
+        return sorted(self.linked(a, pred, True))
+
+    def relationships_of(self, person, relation_types=None):
+        """Return {relation: [X for relation(X, person)] + [X for relation(person, X)]}"""
+        with self._lock:
+            relation_types = relation_types or sorted(self.linked_predicates(person))
+            result = {}
+            for pred in relation_types:
+                people = self.subjects(pred, person) + self.objects(pred, person)
+                if people:
+                    result[pred] = people
+            return result
+
+class KinshipClosureOverlay(KinshipClosure):
+    """One user's facts layered over a shared base closure
+
+    The base's rules, facts and triples are read through, not copied: the overlay keeps
+    its own facts, the triples they add, and the base triples they make underivable
+    (through negation, e.g. a dob fact turning a chacha into a taya). The base must not
+    change while overlays over it are in use.
+    """
+
+    def __init__(self, base):
+        """Initialize an empty overlay sharing the base's rules"""
+        super().__init__()
+        self.base = base
+        self.rules = base.rules
+        self._order = base._order
+        self.virtual = base.virtual
+        self._built = True
+        self.removed = {}
+        self._removed_forward = {}
+        self._removed_backward = {}
+
+    def rebuild(self):
+        """Overlays are only maintained incrementally over their base"""
+        raise ValueError("Rules can only be added to the base closure")
+
+    def add_clauses(self, clauses):
+        """Add facts to the overlay; facts the base already asserts are skipped"""
+        with self._lock:
+            new_facts = []
+            for pred, args, body in clauses:
+                if body is not None:
+                    raise ValueError("Rules can only be added to the base closure")
+                if not self._is_asserted(pred, args):
+                    self.asserted.setdefault(pred, set()).add(args)
+                    new_facts.append((pred, args))
+                    self._link(pred, args)
+            if new_facts:
+                self._update(new_facts)
+                self.version += 1
+
+    def _neighbors(self, person):
+        """Return the people sharing an asserted family edge with a person in the base or overlay"""
+        own = self.neighbors.get(person)
+        shared = self.base.neighbors.get(person, set())
+        return shared | own if own else shared
+
+    def _fact_sets(self):
+        """Return the base's (predicate, tuples) pairs followed by the overlay's"""
+        return [*self.base.asserted.items(), *self.asserted.items()]
+
+    def _is_asserted(self, pred, args):
+        """Check whether a tuple is asserted in the base or the overlay"""
+        return args in self.asserted.get(pred, ()) or args in self.base.asserted.get(pred, ())
+
+    def _triples(self, pred):
+        """Return the base's tuples still derivable plus the overlay's own"""
+        shared = self.base.relations.get(pred, set())
+        removed = self.removed.get(pred)
+        own = self.relations.get(pred)
+        if removed:
+            shared = shared - removed
+        return shared | own if own else shared
+
+    def has(self, pred, args):
+        """Check whether a tuple is in the overlay, or in the base and not removed"""
+        if args in self.relations.get(pred, ()):
+            return True
+        return args in self.base.relations.get(pred, ()) and args not in self.removed.get(pred, ())
+
+    def _add_triple(self, pred, args):
+        """Add a tuple, restoring it if it is a removed base tuple"""
+        if args in self.removed.get(pred, ()):
+            self.removed[pred].discard(args)
+            self._removed_index(pred, args, False)
+        elif args not in self.base.relations.get(pred, ()):
+            super()._add_triple(pred, args)
+
+    def _discard_triple(self, pred, args):
+        """Remove a tuple, hiding it if it comes from the base"""
+        if args in self.relations.get(pred, ()):
+            super()._discard_triple(pred, args)
+        else:
+            self.removed.setdefault(pred, set()).add(args)
+            self._removed_index(pred, args, True)
+
+    def _removed_index(self, pred, args, add):
+        """Add a binary person triple to, or drop it from, the indexes of hidden base tuples"""
+        if len(args) == 2 and isinstance(args[0], str) and isinstance(args[1], str):
+            for index, a, b in ((self._removed_forward, args[0], args[1]),
+                                (self._removed_backward, args[1], args[0])):
+                people = index.setdefault(a, {}).setdefault(pred, set())
+                if add:
+                    people.add(b)
+                else:
+                    people.discard(b)
+
+    def linked(self, person, pred, outgoing):
+        """Return the base's linked people still derivable plus the overlay's own"""
+        shared = self.base.linked(person, pred, outgoing)
+        removed = (self._removed_forward if outgoing else self._removed_backward).get(person, {}).get(pred)
+        own = super().linked(person, pred, outgoing)
+        if removed:
+            shared = shared - removed
+        return shared | own if own else shared
+
+    def linked_predicates(self, person):
+        """Return the predicates with a binary tuple involving a person in the base or overlay"""
+        return self.base.linked_predicates(person) | super().linked_predicates(person)
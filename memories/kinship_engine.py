@@ -0,0 +1,267 @@
+"""
+Kinship Engine
+Indexed, tabled top-down evaluator for the kb.pl Prolog subset. It has the
+interface of the pytholog KnowledgeBase used by SocialMemory: from_file,
+clear_cache and query return the same shapes ([{'X': ...}], ['Yes'], ['No']).
+
+It is opt-in (SocialMemory(engine="native")) because its answers are not
+identical to pytholog's on all of kb.pl:
+- pytholog cannot parse \\=, \\+, disjunction (;) or compound terms such as
+  date(Y,M,D), so its answers for rules using them (and every relation built
+  on those) differ from this engine's, which evaluates them as Prolog does.
+- The order of multiple solutions is not guaranteed to match pytholog's, so
+  callers that take result[0] may pick a different person.
+On the rules both engines can evaluate the answer sets are the same, which
+`python kinship_benchmark.py --check` verifies.
+"""
+
+import os
+from threading import RLock
+from .kinship_rules import (Var, parse_file, parse_program, parse_query, unify, compare,
+                            substitute, term_variables, format_term)
+
+# Call tables are dropped wholesale once they hold this many call patterns
+MAX_TABLES = 200000
+
+def _canonical(pattern):
+    """Replace the variables of a call pattern with positional ones so equal calls share a table"""
+    mapping = {}
+
+    def term(t):
+        if isinstance(t, Var):
+            if t not in mapping:
+                mapping[t] = Var(f"?{len(mapping)}")
+            return mapping[t]
+        if isinstance(t, tuple):
+            return tuple(term(a) for a in t)
+        return t
+
+    return tuple(term(t) for t in pattern)
+
+class KinshipEngine:
+    """Facts indexed by predicate and argument position, rules evaluated with memoized tabling"""
+
+    def __init__(self, name="family"):
+        """Initialize empty fact indexes, rules and call tables"""
+        self.name = name
+        self.facts = {}
+        self.fact_index = {}
+        self.rules = {}
+        self.tables = {}
+        self._active = set()
+        self._lock = RLock()
+        self.table_hits = 0
+        self.table_misses = 0
+
+    def from_file(self, path):
+        """Load facts and rules from a Prolog file"""
+        if os.path.exists(path):
+            self.add_clauses(parse_file(path))
+
+    def add_text(self, text):
+        """Load facts and rules from Prolog source text"""
+        self.add_clauses(parse_program(text))
+
+    def add_clauses(self, clauses):
+        """Add parsed clauses, ignoring facts and rules that are already known; returns True on change"""
+        with self._lock:
+            changed = False
+            for pred, args, body in clauses:
+                if body is not None:
+                    if (args, body) not in self.rules.setdefault(pred, []):
+                        self.rules[pred].append((args, body))
+                        changed = True
+                elif self.assert_fact(pred, args, clear=False):
+                    changed = True
+            if changed:
+                self.clear_cache()
+            return changed
+
+    def assert_fact(self, pred, args, clear=True):
+        """Add one ground fact to the per-position indexes; returns False for duplicates"""
+        with self._lock:
+            known = self.facts.setdefault(pred, {})
+            if args in known:
+                return False
+            known[args] = None  # dict keeps insertion order, like pytholog's clause list
+            positions = self.fact_index.setdefault(pred, [])
+            while len(positions) < len(args):
+                positions.append({})
+            for pos, value in enumerate(args):
+                positions[pos].setdefault(value, []).append(args)
+            if clear:
+                self.clear_cache()
+            return True
+
+    def overlay(self, name=None):
+        """Return an empty per-user fact overlay that shares this engine's rules and facts"""
+        return KinshipOverlay(self, name)
+
+    def clear_cache(self):
+        """Drop all call tables (called whenever facts or rules change)"""
+        with self._lock:
+            self.tables = {}
+
+    def _fact_candidates(self, pred, pattern):
+        """Return stored facts for a call using the smallest bound-argument bucket"""
+        known = self.facts.get(pred)
+        if not known:
+            return ()
+        best = None
+        positions = self.fact_index[pred]
+        for pos, value in enumerate(pattern):
+            if pos < len(positions) and not term_variables(value):
+                bucket = positions[pos].get(value, ())
+                if best is None or len(bucket) < len(best):
+                    best = bucket
+                    if not best:
+                        break
+        return known if best is None else best
+
+    def _call(self, pred, pattern):
+        """Return every answer tuple for a call pattern, computing and tabling it once"""
+        key = (pred, _canonical(pattern))
+        answers = self.tables.get(key)
+        if answers is not None:
+            self.table_hits += 1
+            return answers
+        self.table_misses += 1
+        if key in self._active:
+            raise ValueError(f"Recursive call to {pred} is not supported")
+
+        canonical = key[1]
+        found = {}
+        self._active.add(key)
+        try:
+            for args in self._fact_candidates(pred, canonical):
+                if len(args) == len(canonical) and unify(canonical, args, {}) is not None:
+                    found.setdefault(args, None)
+            for head, body in self.rules.get(pred, ()):
+                if len(head) != len(canonical):
+                    continue
+                binding = unify(canonical, head, {})
+                if binding is None:
+                    continue
+                for solved in self._solve(body, binding):
+                    found.setdefault(substitute(canonical, solved), None)
+        finally:
+            self._active.discard(key)
+
+        if len(self.tables) >= MAX_TABLES:
+            self.tables = {}
+        answers = list(found)
+        self.tables[key] = answers
+        return answers
+
+    def _solve(self, goal, binding):
+        """Enumerate bindings that satisfy a body goal"""
+        kind = goal[0]
+        if kind == 'call':
+            pattern = substitute(goal[2], binding)
+            for answer in self._call(goal[1], pattern):
+                result = unify(pattern, answer, binding)
+                if result is not None:
+                    yield result
+        elif kind == 'and':
+            yield from self._solve_all(goal[1], binding)
+        elif kind == 'or':
+            for branch in goal[1]:
+                yield from self._solve(branch, binding)
+        elif kind == 'not':
+            for _ in self._solve(goal[1], binding):
+                return
+            yield binding
+        elif kind == 'cmp':
+            result = compare(goal[1], goal[2], goal[3], binding)
+            if result is not None:
+                yield result
+
+    def _estimate(self, goal, binding):
+        """Rank a conjunct for selection: ready filters first, then calls with bound arguments"""
+        kind = goal[0]
+        if kind in ('cmp', 'not'):
+            ready = goal[1] == '=' or not term_variables(substitute(goal[1:], binding))
+            return (0, 0, 0) if ready else (2, 0, 0)
+        if kind != 'call':
+            return (1, 1, 0)
+        pattern = substitute(goal[2], binding)
+        bound = sum(1 for arg in pattern if not term_variables(arg))
+        if goal[1] in self.rules:
+            size = 0 if bound == len(pattern) else len(self.facts.get(goal[1], ())) + 1
+        else:
+            size = len(self._fact_candidates(goal[1], pattern))
+        return (1, len(pattern) - bound if bound else len(pattern) + 1, size)
+
+    def _solve_all(self, goals, binding):
+        """Solve a conjunction, picking the most selective remaining goal at each step
+
+        Negation and comparisons wait until their variables are bound, so reordering keeps
+        the meaning of the rule while avoiding scans such as male(X) before parent(X, ali).
+        """
+        if not goals:
+            yield binding
+            return
+        best = min(range(len(goals)), key=lambda j: (self._estimate(goals[j], binding), j))
+        rest = goals[:best] + goals[best + 1:]
+        for result in self._solve(goals[best], binding):
+            yield from self._solve_all(rest, result)
+
+    def solve(self, expr):
+        """Return the distinct variable bindings for a query string as raw terms"""
+        goal = parse_query(expr)
+        variables = [v for v in term_variables(goal) if not v.name.startswith('_')]
+        with self._lock:
+            answers = {}
+            for binding in self._solve(goal, {}):
+                answers.setdefault(tuple(substitute(v, binding) for v in variables), None)
+        return variables, list(answers)
+
+    def query(self, expr):
+        """Answer a query the way pytholog does: [{'X': ...}, ...], ['Yes'] or ['No']"""
+        variables, answers = self.solve(str(expr))
+        if not answers:
+            return ['No']
+        if not variables:
+            return ['Yes']
+        return [{v.name: format_term(value) for v, value in zip(variables, answer)} for answer in answers]
+
+    def table_stats(self):
+        """Return call table hit/miss counters"""
+        total = self.table_hits + self.table_misses
+        return {
+            'hits': self.table_hits,
+            'misses': self.table_misses,
+            'tables': len(self.tables),
+            'hit_rate': self.table_hits / total if total else 0.0
+        }
+
+class KinshipOverlay(KinshipEngine):
+    """One user's facts layered over a shared base engine; base rules and facts are not copied"""
+
+    def __init__(self, base, name=None):
+        """Initialize an empty overlay reading rules and facts through to the base engine"""
+        super().__init__(name or base.name)
+        self.base = base
+        self.rules = base.rules
+
+    def add_clauses(self, clauses):
+        """Add facts to the overlay; rules belong in the shared base"""
+        if any(body is not None for _, _, body in clauses):
+            raise ValueError("Rules can only be added to the base knowledge base")
+        return super().add_clauses(clauses)
+
+    def assert_fact(self, pred, args, clear=True):
+        """Add a fact unless the overlay or the base already has it"""
+        if args in self.base.facts.get(pred, ()):
+            return False
+        return super().assert_fact(pred, args, clear)
+
+    def _fact_candidates(self, pred, pattern):
+        """Return matching base facts followed by the overlay's own"""
+        own = super()._fact_candidates(pred, pattern)
+        shared = self.base._fact_candidates(pred, pattern)
+        if not own:
+            return shared
+        if not shared:
+            return own
+        return [*shared, *own]
@@ -0,0 +1,174 @@
+"""
+Kinship Paths
+Shortest relation chains between two people over the parent, married and
+sibling edges of a KinshipClosure, found with bidirectional BFS and named
+with a kinship term where one exists ("father's sister's son" -> cousin).
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+# Gendered words for each step: (male, female, unknown)
+STEP_WORDS = {
+    'parent': ('father', 'mother', 'parent'),
+    'child': ('son', 'daughter', 'child'),
+    'sibling': ('brother', 'sister', 'sibling'),
+    'spouse': ('husband', 'wife', 'spouse'),
+}
+
+# Generic step chains and their kinship terms: (male, female, unknown)
+CHAIN_TERMS = {
+    ('parent',): ('father', 'mother', 'parent'),
+    ('child',): ('son', 'daughter', 'child'),
+    ('sibling',): ('brother', 'sister', 'sibling'),
+    ('spouse',): ('husband', 'wife', 'spouse'),
+    ('parent', 'parent'): ('grandfather', 'grandmother', 'grandparent'),
+    ('child', 'child'): ('grandson', 'granddaughter', 'grandchild'),
+    ('parent', 'sibling'): ('uncle', 'aunt', 'pibling'),
+    ('parent', 'sibling', 'spouse'): ('uncle', 'aunt', 'pibling'),
+    ('sibling', 'child'): ('nephew', 'niece', 'nibling'),
+    ('spouse', 'sibling', 'child'): ('nephew', 'niece', 'nibling'),
+    ('parent', 'sibling', 'child'): ('cousin', 'cousin', 'cousin'),
+    ('parent', 'spouse'): ('stepfather', 'stepmother', 'step-parent'),
+    ('spouse', 'child'): ('stepson', 'stepdaughter', 'stepchild'),
+    ('spouse', 'parent'): ('father-in-law', 'mother-in-law', 'parent-in-law'),
+    ('child', 'spouse'): ('son-in-law', 'daughter-in-law', 'child-in-law'),
+    ('spouse', 'sibling'): ('brother-in-law', 'sister-in-law', 'sibling-in-law'),
+    ('sibling', 'spouse'): ('brother-in-law', 'sister-in-law', 'sibling-in-law'),
+    ('parent', 'parent', 'parent'): ('great-grandfather', 'great-grandmother', 'great-grandparent'),
+    ('child', 'child', 'child'): ('great-grandson', 'great-granddaughter', 'great-grandchild'),
+    ('parent', 'parent', 'sibling'): ('great-uncle', 'great-aunt', 'great-pibling'),
+    ('sibling', 'child', 'child'): ('grandnephew', 'grandniece', 'grandnibling'),
+    ('parent', 'sibling', 'child', 'child'): ('first cousin once removed',) * 3,
+    ('parent', 'parent', 'sibling', 'child'): ('first cousin once removed',) * 3,
+    ('parent', 'parent', 'sibling', 'child', 'child'): ('second cousin',) * 3,
+}
+
+def _gender_index(gender):
+    """Map 'male'/'female'/None to a STEP_WORDS / CHAIN_TERMS column"""
+    return 0 if gender == 'male' else 1 if gender == 'female' else 2
+
+class KinshipPathFinder:
+    """Bidirectional BFS over a closure's family edges with a per-pair result cache"""
+
+    def __init__(self, closure, cache_size=4096, max_depth=8):
+        """Initialize over a KinshipClosure; the cache is dropped whenever the closure changes"""
+        self.closure = closure
+        self.cache_size = cache_size
+        self.max_depth = max_depth
+        self._cache = OrderedDict()
+        self._cache_version = None
+        self._lock = Lock()
+
+    def gender(self, person):
+        """Return 'male', 'female' or None from male/1, female/1 or gender/2 facts"""
+        has = self.closure.has
+        if has('male', (person,)) or has('gender', (person, 'male')):
+            return 'male'
+        if has('female', (person,)) or has('gender', (person, 'female')):
+            return 'female'
+        return None
+
+    def neighbors(self, person):
+        """Yield (other, step) for every family edge, step naming other relative to person"""
+        linked = self.closure.linked
+        for other in linked(person, 'parent', False):
+            yield other, 'parent'
+        for other in linked(person, 'parent', True):
+            yield other, 'child'
+        for other in linked(person, 'married', True) | linked(person, 'married', False):
+            yield other, 'spouse'
+        for other in linked(person, 'sibling', True):
+            yield other, 'sibling'
+
+    def _search(self, source, target):
+        """Return the list of (person, step) hops from source to target, or None"""
+        if source == target:
+            return []
+        # prev maps a node to (node one hop closer to source, step); succ likewise toward target
+        prev = {source: None}
+        succ = {target: None}
+        frontier_f, frontier_b = [source], [target]
+        depth = 0
+        while frontier_f and frontier_b and depth < self.max_depth:
+            depth += 1
+            if len(frontier_f) <= len(frontier_b):
+                next_frontier = []
+                for person in frontier_f:
+                    for other, step in self.neighbors(person):
+                        if other in prev:
+                            continue
+                        prev[other] = (person, step)
+                        if other in succ:
+                            return self._join(other, prev, succ)
+                        next_frontier.append(other)
+                frontier_f = next_frontier
+            else:
+                next_frontier = []
+                for person in frontier_b:
+                    for other, _ in self.neighbors(person):
+                        if other in succ:
+                            continue
+                        succ[other] = person
+                        if other in prev:
+                            return self._join(other, prev, succ)
+                        next_frontier.append(other)
+                frontier_b = next_frontier
+        return None
+
+    def _join(self, meeting, prev, succ):
+        """Rebuild the hop list through the node where both searches met"""
+        hops = []
+        node = meeting
+        while prev[node] is not None:
+            before, step = prev[node]
+            hops.append((node, step))
+            node = before
+        hops.reverse()
+
+        node = meeting
+        while succ[node] is not None:
+            after = succ[node]
+            step = next(s for other, s in self.neighbors(node) if other == after)
+            hops.append((after, step))
+            node = after
+        return hops
+
+    def describe(self, hops):
+        """Name a hop list: ("father's sister's son", 'cousin') with the term None if unknown"""
+        words = [STEP_WORDS[step][_gender_index(self.gender(person))] for person, step in hops]
+        steps = tuple(step for _, step in hops)
+        terms = CHAIN_TERMS.get(steps)
+        term = terms[_gender_index(self.gender(hops[-1][0]))] if terms else None
+        return "'s ".join(words), term
+
+    def find(self, person1, person2):
+        """Return how person2 is related to person1 as a dict, or None if unconnected"""
+        a, b = person1.lower(), person2.lower()
+        with self._lock:
+            if self._cache_version != self.closure.version:
+                self._cache.clear()
+                self._cache_version = self.closure.version
+            if (a, b) in self._cache:
+                self._cache.move_to_end((a, b))
+                return self._cache[(a, b)]
+
+        with self.closure._lock:
+            version = self.closure.version
+            hops = self._search(a, b)
+            result = None
+            if hops:
+                description, term = self.describe(hops)
+                result = {
+                    'path': [a] + [person for person, _ in hops],
+                    'steps': [step for _, step in hops],
+                    'description': description,
+                    'term': term
+                }
+
+        with self._lock:
+            if self._cache_version == version:
+                self._cache[(a, b)] = result
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return result
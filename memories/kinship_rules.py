@@ -0,0 +1,281 @@
+"""
+Kinship Rules Parser
+Parses the Prolog subset used by prolog/kb.pl and the user fact files:
+facts, rules with conjunction, parenthesised disjunction, negation as failure
+(\\+), comparisons (=, \\=, <, >, =<, >=) and compound terms such as date(Y,M,D).
+
+Like pytholog, unquoted atoms may contain @, - and inner dots so e-mail style user
+names such as ali@example.com work in queries without quoting.
+
+Terms are plain Python values: atoms are str, integers are int, variables are
+Var instances and compound terms are tuples (functor, arg1, ...).
+Body goals are tuples: ('call', pred, args), ('and', goals), ('or', goals),
+('not', goal) and ('cmp', op, left, right).
+"""
+
+import re
+
+class Var:
+    """Logic variable"""
+
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, other):
+        return isinstance(other, Var) and other.name == self.name
+
+    def __hash__(self):
+        return hash(('var', self.name))
+
+    def __repr__(self):
+        return self.name
+
+COMPARISON_OPS = ('\\=', '=<', '>=', '==', '=', '<', '>')
+
+TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+|%[^\n]*|/\*.*?\*/)
+  | (?P<neck>:-)
+  | (?P<naf>\\\+)
+  | (?P<op>\\=|=<|>=|==|=|<|>)
+  | (?P<punct>[(),;])
+  | (?P<end>\.(?=\s|%|$))
+  | (?P<quoted>'(?:[^'\\]|\\.)*')
+  | (?P<number>-?\d+)
+  | (?P<var>[A-Z_][A-Za-z0-9_]*)
+  | (?P<atom>[a-z](?:[A-Za-z0-9_@-]|\.(?=[A-Za-z0-9_]))*)
+""", re.VERBOSE | re.DOTALL)
+
+def tokenize(text):
+    """Split Prolog source into (kind, value) tokens"""
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = TOKEN_RE.match(text, pos)
+        if not match:
+            raise SyntaxError(f"Unexpected character {text[pos]!r} at offset {pos}")
+        kind = match.lastgroup
+        if kind != 'ws':
+            tokens.append((kind, match.group(kind)))
+        pos = match.end()
+    return tokens
+
+class _Parser:
+    """Recursive-descent parser over a token list"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        token = self.peek()
+        if token[0] is None or (kind and token[0] != kind) or (value and token[1] != value):
+            raise SyntaxError(f"Expected {value or kind}, found {token[1]!r}")
+        self.pos += 1
+        return token
+
+    def clauses(self):
+        result = []
+        while self.peek()[0] is not None:
+            head = self.term()
+            body = None
+            if self.peek()[0] == 'neck':
+                self.take('neck')
+                body = self.disjunction()
+            self.take('end')
+            if isinstance(head, str):
+                head = (head,)
+            if not isinstance(head, tuple):
+                raise SyntaxError(f"Invalid clause head {head!r}")
+            result.append((head[0], tuple(head[1:]), body))
+        return result
+
+    def disjunction(self):
+        branches = [self.conjunction()]
+        while self.peek() == ('punct', ';'):
+            self.take()
+            branches.append(self.conjunction())
+        return branches[0] if len(branches) == 1 else ('or', branches)
+
+    def conjunction(self):
+        goals = [self.unary()]
+        while self.peek() == ('punct', ','):
+            self.take()
+            goals.append(self.unary())
+        return goals[0] if len(goals) == 1 else ('and', goals)
+
+    def unary(self):
+        if self.peek()[0] == 'naf':
+            self.take()
+            return ('not', self.unary())
+        if self.peek() == ('punct', '('):
+            self.take()
+            goal = self.disjunction()
+            self.take('punct', ')')
+            return goal
+        left = self.term()
+        if self.peek()[0] == 'op':
+            op = self.take()[1]
+            return ('cmp', op, left, self.term())
+        if isinstance(left, str):
+            return ('call', left, ())
+        if isinstance(left, tuple):
+            return ('call', left[0], tuple(left[1:]))
+        raise SyntaxError(f"Invalid goal {left!r}")
+
+    def term(self):
+        kind, value = self.take()
+        if kind == 'var':
+            return Var(value)
+        if kind == 'number':
+            return int(value)
+        if kind == 'quoted':
+            return re.sub(r"\\(.)", r"\1", value[1:-1])
+        if kind == 'atom':
+            if self.peek() == ('punct', '('):
+                self.take()
+                args = [self.term()]
+                while self.peek() == ('punct', ','):
+                    self.take()
+                    args.append(self.term())
+                self.take('punct', ')')
+                return (value, *args)
+            return value
+        raise SyntaxError(f"Unexpected token {value!r}")
+
+def parse_program(text):
+    """Parse Prolog source into a list of (pred, args, body) clauses; body is None for facts"""
+    return _Parser(tokenize(text)).clauses()
+
+def parse_query(text):
+    """Parse a query such as "father(X,ali)" (trailing period optional) into a body goal"""
+    tokens = tokenize(text.strip())
+    if tokens and tokens[-1][0] == 'end':
+        tokens.pop()
+    parser = _Parser(tokens)
+    goal = parser.disjunction()
+    if parser.peek()[0] is not None:
+        raise SyntaxError(f"Unexpected {parser.peek()[1]!r} in query {text!r}")
+    return goal
+
+def parse_file(path):
+    """Parse a Prolog file into clauses"""
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_program(f.read())
+
+def walk(term, binding):
+    """Resolve a term through a binding until it is not a bound variable"""
+    while isinstance(term, Var) and term in binding:
+        term = binding[term]
+    return term
+
+def substitute(term, binding):
+    """Apply a binding to a term recursively"""
+    term = walk(term, binding)
+    if isinstance(term, tuple):
+        return tuple(substitute(t, binding) for t in term)
+    return term
+
+def term_variables(term, found=None):
+    """Return the variables of a term or goal in order of first appearance"""
+    found = [] if found is None else found
+    if isinstance(term, Var):
+        if term not in found:
+            found.append(term)
+    elif isinstance(term, (tuple, list)):
+        for t in term:
+            term_variables(t, found)
+    return found
+
+ATOM_RE = re.compile(r"[a-z][A-Za-z0-9_]*$")
+
+def format_term(term, quoted=False):
+    """Render a term as Prolog text, e.g. date(1992,8,22); quoted=True keeps it parseable"""
+    if isinstance(term, tuple):
+        return f"{term[0]}({','.join(format_term(t, quoted) for t in term[1:])})"
+    if quoted and isinstance(term, str) and not ATOM_RE.match(term):
+        return "'" + term.replace("\\", "\\\\").replace("'", "\\'") + "'"
+    return str(term)
+
+def format_fact(pred, args):
+    """Render a fact as a Prolog clause line"""
+    return f"{pred}({','.join(format_term(arg, True) for arg in args)})." if args else f"{pred}."
+
+def is_ground(term):
+    """Check whether a term contains no variables"""
+    if isinstance(term, Var):
+        return False
+    if isinstance(term, tuple):
+        return all(is_ground(t) for t in term)
+    return True
+
+def unify(left, right, binding):
+    """Unify two terms, returning an extended binding or None"""
+    left = walk(left, binding)
+    right = walk(right, binding)
+    if left == right and type(left) is type(right):
+        return binding
+    if isinstance(left, Var):
+        return {**binding, left: right}
+    if isinstance(right, Var):
+        return {**binding, right: left}
+    if isinstance(left, tuple) and isinstance(right, tuple) and len(left) == len(right):
+        for l, r in zip(left, right):
+            binding = unify(l, r, binding)
+            if binding is None:
+                return None
+        return binding
+    return None
+
+def compare(op, left, right, binding):
+    """Evaluate a comparison goal, returning the resulting binding or None"""
+    if op == '=':
+        return unify(left, right, binding)
+    if op == '\\=':
+        return binding if unify(left, right, binding) is None else None
+
+    left = substitute(left, binding)
+    right = substitute(right, binding)
+    if op == '==':
+        return binding if left == right and type(left) is type(right) else None
+    if not isinstance(left, int) or not isinstance(right, int):
+        return None  # Arithmetic comparison needs bound integers
+    ok = {'<': left < right, '>': left > right, '=<': left <= right, '>=': left >= right}[op]
+    return binding if ok else None
+
+def goal_predicates(goal):
+    """Yield (pred, negated) for every predicate called in a body goal"""
+    kind = goal[0]
+    if kind == 'call':
+        yield goal[1], False
+    elif kind == 'not':
+        for pred, _ in goal_predicates(goal[1]):
+            yield pred, True
+    elif kind in ('and', 'or'):
+        for sub in goal[1]:
+            yield from goal_predicates(sub)
+
+def rename(head, body, suffix):
+    """Give a rule's variables fresh names so they cannot clash with the caller's"""
+    def term(t):
+        if isinstance(t, Var):
+            return Var(f"{t.name}#{suffix}")
+        if isinstance(t, tuple):
+            return tuple(term(a) for a in t)
+        return t
+
+    def goal(g):
+        kind = g[0]
+        if kind == 'call':
+            return ('call', g[1], term(g[2]))
+        if kind in ('and', 'or'):
+            return (kind, [goal(sub) for sub in g[1]])
+        if kind == 'not':
+            return ('not', goal(g[1]))
+        return ('cmp', g[1], term(g[2]), term(g[3]))
+
+    return term(head), goal(body)
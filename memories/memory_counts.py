@@ -0,0 +1,175 @@
+"""
+Memory Counts
+Per-user node and relationship counts for each memory layer, kept up to date
+by the writers themselves: their sessions tally the created and deleted
+counters Neo4j reports for every write, and the totals are added to a small
+SQLite table, so reading a user's layer sizes never touches the graph.
+"""
+
+import os
+import sqlite3
+import threading
+
+MEMORY_LAYERS = [
+    'SensoryMemory_TextBased',
+    'SemanticMemory',
+    'PerceptualAssociativeMemory',
+    'EpisodicMemory',
+    'SocialMemory',
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS memory_counts (
+    user TEXT NOT NULL,
+    layer TEXT NOT NULL,
+    nodes INTEGER NOT NULL DEFAULT 0,
+    relationships INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user, layer)
+);
+"""
+
+class WriteTally(threading.local):
+    """Net nodes and relationships written by the current thread since the last take()"""
+
+    def __init__(self):
+        """Start from zero"""
+        self.nodes = 0
+        self.relationships = 0
+        self.pending = None
+
+    def track(self, result):
+        """Count the previous query's result, which must have been read by now, and remember this one"""
+        self.flush()
+        self.pending = result
+
+    def flush(self):
+        """Add the created minus deleted counts of the pending result (consume() drops any unread records)"""
+        if self.pending is not None:
+            try:
+                counters = self.pending.consume().counters
+                self.nodes += counters.nodes_created - counters.nodes_deleted
+                self.relationships += counters.relationships_created - counters.relationships_deleted
+            except Exception:
+                pass
+            self.pending = None
+
+    def add(self, nodes, relationships):
+        """Add counts collected elsewhere, e.g. from a committed transaction"""
+        self.nodes += nodes
+        self.relationships += relationships
+
+    def take(self):
+        """Return (nodes, relationships) and reset to zero"""
+        self.flush()
+        totals = (self.nodes, self.relationships)
+        self.nodes = self.relationships = 0
+        return totals
+
+class CountingSession:
+    """Neo4j session wrapper that adds every query's write counters to a tally"""
+
+    def __init__(self, session, tally):
+        """Wrap an open session"""
+        self._session = session
+        self._tally = tally
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._tally.flush()
+        self._session.close()
+
+    def run(self, query, **parameters):
+        """Run a query like Session.run"""
+        result = self._session.run(query, **parameters)
+        self._tally.track(result)
+        return result
+
+    def execute_write(self, work, *args, **kwargs):
+        """Run a transaction function like Session.execute_write; only the committed attempt is tallied"""
+        attempt = {}
+
+        def counted(tx, *work_args, **work_kwargs):
+            counting = CountingTransaction(tx)
+            value = work(counting, *work_args, **work_kwargs)
+            attempt['counts'] = counting.counts()
+            return value
+
+        value = self._session.execute_write(counted, *args, **kwargs)
+        self._tally.add(*attempt.get('counts', (0, 0)))
+        return value
+
+class CountingTransaction:
+    """Transaction wrapper that keeps its results so their write counters can be summed before commit"""
+
+    def __init__(self, tx):
+        """Wrap a managed transaction"""
+        self._tx = tx
+        self._results = []
+
+    def run(self, query, **parameters):
+        """Run a query like ManagedTransaction.run"""
+        result = self._tx.run(query, **parameters)
+        self._results.append(result)
+        return result
+
+    def counts(self):
+        """Return the net (nodes, relationships) written so far; consume() drops any unread records"""
+        nodes = relationships = 0
+        for result in self._results:
+            counters = result.consume().counters
+            nodes += counters.nodes_created - counters.nodes_deleted
+            relationships += counters.relationships_created - counters.relationships_deleted
+        return nodes, relationships
+
+class MemoryCounts:
+    """Per-user, per-layer counters in SQLite with one upsert per write batch"""
+
+    def __init__(self, db_path="data/memory_counts.db"):
+        """Initialize the store; connections are opened per thread on first use"""
+        self.db_path = db_path
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def _connect(self):
+        """Return this thread's connection, creating the database and schema if needed"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def add(self, user, layer, nodes=0, relationships=0):
+        """Add net node and relationship changes to a user's layer"""
+        if not user or not (nodes or relationships):
+            return
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                INSERT INTO memory_counts (user, layer, nodes, relationships) VALUES (?, ?, ?, ?)
+                ON CONFLICT (user, layer) DO UPDATE SET
+                    nodes = MAX(nodes + excluded.nodes, 0),
+                    relationships = MAX(relationships + excluded.relationships, 0)
+            """, (user, layer, nodes, relationships))
+
+    def for_user(self, user):
+        """Return {layer: {'nodes': n, 'relationships': m}} for every memory layer"""
+        counts = {layer: {'nodes': 0, 'relationships': 0} for layer in MEMORY_LAYERS}
+        rows = self._connect().execute(
+            "SELECT layer, nodes, relationships FROM memory_counts WHERE user = ?", (user,))
+        for layer, nodes, relationships in rows:
+            counts[layer] = {'nodes': nodes, 'relationships': relationships}
+        return counts
+
+# Global instance
+memory_counts = MemoryCounts()
@@ -3,21 +3,25 @@ from .semantic_memory import SemanticMemory
 from .perceptual_memory import PerceptualAssociativeMemory
 from .social_memory import SocialMemory
 from .episodic_memory import EpisodicMemory
+from .graph_versions import graph_versions
+from .memory_counts import memory_counts
+from .sensor_series import sensor_series
 from threading import Thread
 import re
+import time
 
 class MemoryManager:
     """Manages multiple memory systems and coordinates their interactions"""
     
     def __init__(self, neo4j_uri="bolt://localhost:7687", 
                  neo4j_user="neo4j", neo4j_password="12345678",
-                 kb_file="prolog/kb.pl"):
-        """Initialize all memory systems"""
+                 kb_file="prolog/kb.pl", kinship_engine="pytholog"):
+        """Initialize all memory systems; kinship_engine="native" opts into the indexed Prolog engine"""
         self.sensory = SensoryMemory(neo4j_uri, neo4j_user, neo4j_password)
         self.semantic = SemanticMemory(neo4j_uri, neo4j_user, neo4j_password)
         self.perceptual = PerceptualAssociativeMemory(neo4j_uri, neo4j_user, neo4j_password)
         self.episodic = EpisodicMemory(neo4j_uri, neo4j_user, neo4j_password)   
-        self.social = SocialMemory(kb_file)
+        self.social = SocialMemory(kb_file, engine=kinship_engine)
 
     def process_input(self, text, ip_address, user_id, user_fact_file=None, session_key=None):
         """Process input text through all memory systems synchronously"""
@@ -40,6 +44,7 @@ class MemoryManager:
             self.episodic.save(user_id=user_id or "anonymous", text=text, session_key=session_key)
         except:
             pass
+        self._record_writes(user_id)
         
         if user_fact_file:
             try:
@@ -47,6 +52,16 @@ class MemoryManager:
             except:
                 pass
 
+    def _record_writes(self, user_id):
+        """Bump the user's graph version and add this thread's per-layer write tallies to their counts"""
+        graph_versions.bump(user_id)
+        for memory in (self.sensory, self.semantic, self.perceptual, self.episodic):
+            nodes, relationships = memory.take_tally()
+            try:
+                memory_counts.add(user_id, memory.layer, nodes, relationships)
+            except Exception as e:
+                print(f"Error updating {memory.layer} counts for {user_id}: {e}")
+
     def async_process_input(self, text, ip_address, user_id, user_fact_file=None, session_key=None):
         """Process input text through all memory systems asynchronously"""
         def _async_save_all():
@@ -69,6 +84,7 @@ class MemoryManager:
                 self.episodic.save(user_id=user_id or "anonymous", text=text, session_key=session_key)
             except:
                 pass
+            self._record_writes(user_id)
             
             if user_fact_file:
                 try:
@@ -191,16 +207,16 @@ class MemoryManager:
         except:
             pass
 
-    def find_person_info(self, person_name):
-        """Get all available information about a person"""
+    def find_person_info(self, person_name, user=None):
+        """Get all available information about a person, including the user's own facts"""
         return {
-            "dob": self.social.find_dob(person_name),
-            "gender": self.social.find_gender(person_name)
+            "dob": self.social.find_dob(person_name, user),
+            "gender": self.social.find_gender(person_name, user)
         }
 
-    def find_relationships(self, person1, relation, person2=None):
+    def find_relationships(self, person1, relation, person2=None, user=None):
         """Find or verify relationships between people"""
-        return self.social.find_relation(person1, relation, person2)
+        return self.social.find_relation(person1, relation, person2, user)
 
     def add_person_fact(self, fact_file, fact_type, person, value, related_person=None):
         """Add a new fact about a person"""
@@ -215,16 +231,29 @@ class MemoryManager:
         """Return the most recent episodic memories for user"""
         return self.episodic.recall(user_id=user_id, limit=limit)
     
-    def get_sensor_data(self, device_id=None, limit=10):
-        """Get sensor data from sensory memory"""
-        return self.sensory.get_sensor_data(device_id=device_id, limit=limit)
+    def get_sensor_data(self, device_id=None, limit=10, hours=None):
+        """Get sensor readings from the time-series store: the latest ones, or with hours, each device's series over that window"""
+        if hours is not None:
+            end = time.time()
+            device_ids = [device_id] if device_id else sensor_series.devices()
+            return [sensor_series.query(device, end - hours * 3600, end) for device in device_ids]
+        if device_id:
+            return sensor_series.latest(device_id, limit)
+        latest = [reading for device in sensor_series.devices() for reading in sensor_series.latest(device)]
+        return sorted(latest, key=lambda reading: reading['ts'], reverse=True)[:limit]
     
     def save_sensor_data(self, device_id, temperature=None, humidity=None, pressure=None, wifi_rssi=None, timestamp=None):
-        """Save sensor data to sensory memory with SensoryMemory_SensorBased label"""
+        """Append a reading to the sensor time series and update the device's SensoryMemory_SensorBased node"""
+        sensor_series.append(device_id, temperature=temperature, humidity=humidity,
+                             pressure=pressure, wifi_rssi=wifi_rssi)
         return self.sensory.save_sensor_data(device_id=device_id, temperature=temperature, 
                                             humidity=humidity, pressure=pressure, 
                                             wifi_rssi=wifi_rssi, timestamp=timestamp)
 
+    def save_sensor_batch(self, readings):
+        """Update the SensoryMemory_SensorBased nodes of many devices in one write"""
+        return self.sensory.save_sensor_batch(readings)
+
     def get_user_ip_history(self, user_id: str, limit: int = 10):
         """Get user's IP history from sensory memory"""
         return self.sensory.get_user_ip_history(user_id, limit)
@@ -9,6 +9,8 @@ except ImportError:
 
 class PerceptualAssociativeMemory(BaseNeo4jMemory):
     """Processes sensory input for patterns, sentiment, and named entities"""
+
+    layer = "PerceptualAssociativeMemory"
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -55,7 +57,7 @@ class PerceptualAssociativeMemory(BaseNeo4jMemory):
     def save(self, text, ip_address, user_id=None):
         """Save perceptual analysis of text including sentiment, POS tags, and named entities"""
         try:
-            with self.driver.session() as neo4j_session:
+            with self.counting_session() as neo4j_session:
                 sentences = sent_tokenize(text)
                 
                 for sentence in sentences:
@@ -4,6 +4,8 @@ from .base_memory import BaseNeo4jMemory
 
 class SemanticMemory(BaseNeo4jMemory):
     """Stores semantic relationships and word meanings"""
+
+    layer = "SemanticMemory"
     
     def get_wordnet_pos(self, treebank_tag):
         """Convert treebank POS tag to WordNet POS tag"""
@@ -23,7 +25,7 @@ class SemanticMemory(BaseNeo4jMemory):
         words = word_tokenize(text)
         tagged_words = pos_tag(words)
 
-        with self.driver.session() as neo4j_session:
+        with self.counting_session() as neo4j_session:
             for word, tag in tagged_words:
                 wn_pos = self.get_wordnet_pos(tag)
                 if wn_pos:
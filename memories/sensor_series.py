@@ -0,0 +1,331 @@
+"""
+Sensor Series
+Append-only time series of ESP32 heartbeat readings. Each device keeps its
+recent readings in a NumPy ring buffer, so recent-window queries never leave
+memory. A background thread appends batches to SQLite together with minute,
+hour and day rollups (count, sum, min, max per field, in UTC buckets). Older
+ranges are answered from those tables, and nothing here touches Neo4j.
+"""
+
+import os
+import math
+import time
+import atexit
+import sqlite3
+import threading
+import numpy as np
+from datetime import datetime
+
+SENSOR_FIELDS = ('temperature', 'humidity', 'pressure', 'wifi_rssi')
+
+# Bucket width in seconds and how long each table is kept (None = forever)
+RESOLUTIONS = {
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400,
+}
+RETENTION = {
+    'raw': 7 * 86400,
+    'minute': 30 * 86400,
+    'hour': 365 * 86400,
+    'day': None,
+}
+
+def clean_readings(data):
+    """Return the sensor fields of a dict as floats (None if missing); ValueError if one is not a finite number"""
+    readings = {}
+    for field in SENSOR_FIELDS:
+        value = data.get(field)
+        if value is not None:
+            try:
+                if isinstance(value, bool):
+                    raise ValueError
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{field} must be a number") from None
+            if not math.isfinite(value):
+                raise ValueError(f"{field} must be a finite number")
+        readings[field] = value
+    return readings
+
+def _rollup_columns():
+    """Return the count/sum/min/max column names of every field"""
+    return [f"{field}_{stat}" for field in SENSOR_FIELDS for stat in ('count', 'sum', 'min', 'max')]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS sensor_readings (
+    device_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    {', '.join(f'{field} REAL' for field in SENSOR_FIELDS)}
+);
+CREATE INDEX IF NOT EXISTS sensor_readings_range ON sensor_readings (device_id, ts);
+CREATE TABLE IF NOT EXISTS sensor_rollups (
+    device_id TEXT NOT NULL,
+    resolution TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    {', '.join(f'{column} REAL' for column in _rollup_columns())},
+    PRIMARY KEY (device_id, resolution, bucket)
+);
+"""
+
+# Merges a batch's per-bucket aggregates into the stored rollups; MIN/MAX with a NULL argument
+# return NULL in SQLite, so each side falls back to the other
+ROLLUP_UPSERT = f"""
+INSERT INTO sensor_rollups (device_id, resolution, bucket, {', '.join(_rollup_columns())})
+SELECT device_id, ?, CAST(ts / ? AS INTEGER) * ?,
+       {', '.join(f'COUNT({field}), SUM({field}), MIN({field}), MAX({field})' for field in SENSOR_FIELDS)}
+FROM sensor_batch WHERE true
+GROUP BY device_id, CAST(ts / ? AS INTEGER)
+ON CONFLICT (device_id, resolution, bucket) DO UPDATE SET
+    {', '.join(
+        f'{field}_count = {field}_count + excluded.{field}_count, '
+        f'{field}_sum = COALESCE({field}_sum, 0) + COALESCE(excluded.{field}_sum, 0), '
+        f'{field}_min = MIN(COALESCE({field}_min, excluded.{field}_min), COALESCE(excluded.{field}_min, {field}_min)), '
+        f'{field}_max = MAX(COALESCE({field}_max, excluded.{field}_max), COALESCE(excluded.{field}_max, {field}_max))'
+        for field in SENSOR_FIELDS)}
+"""
+
+class RingBuffer:
+    """Fixed-capacity buffer of (timestamp, field values) rows, oldest overwritten first"""
+
+    def __init__(self, capacity):
+        """Allocate the timestamp and value arrays; missing values are NaN"""
+        self.ts = np.zeros(capacity)
+        self.values = np.full((capacity, len(SENSOR_FIELDS)), np.nan)
+        self.capacity = capacity
+        self.size = 0
+        self.head = 0
+
+    def append(self, ts, values):
+        """Add one reading"""
+        self.ts[self.head] = ts
+        self.values[self.head] = values
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def oldest(self):
+        """Return the timestamp of the oldest buffered reading, or None"""
+        if not self.size:
+            return None
+        return self.ts[(self.head - self.size) % self.capacity]
+
+    def window(self, start, end):
+        """Return (ts, values) of the buffered readings with start <= ts < end, oldest first"""
+        order = (np.arange(self.head - self.size, self.head)) % self.capacity
+        ts = self.ts[order]
+        low, high = np.searchsorted(ts, [start, end])
+        return ts[low:high], self.values[order[low:high]]
+
+class SensorSeries:
+    """Per-device ring buffers in front of an append-only SQLite log with rollups"""
+
+    def __init__(self, db_path="data/sensor_series.db", ring_size=8640, flush_interval=1.0,
+                 max_points=1500):
+        """Initialize the store; ring_size holds 24 hours of heartbeats at one every 10 seconds"""
+        self.db_path = db_path
+        self.ring_size = ring_size
+        self.flush_interval = flush_interval
+        self.max_points = max_points
+        self._rings = {}
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+        self._flusher = None
+        self._pruned_at = 0.0
+
+    def _connect(self):
+        """Return this thread's connection, creating the database and schema if needed"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def _ring(self, device_id):
+        """Return a device's ring buffer, loading its most recent stored readings on first use (lock held)
+
+        Only append creates rings; reads use self._rings.get and fall back to SQLite, so
+        querying unknown device ids cannot grow memory.
+        """
+        ring = self._rings.get(device_id)
+        if ring is None:
+            ring = self._rings[device_id] = RingBuffer(self.ring_size)
+            rows = self._connect().execute(f"""
+                SELECT ts, {', '.join(SENSOR_FIELDS)} FROM sensor_readings
+                WHERE device_id = ? ORDER BY ts DESC LIMIT ?
+            """, (device_id, self.ring_size)).fetchall()
+            for row in reversed(rows):
+                ring.append(row[0], [np.nan if value is None else value for value in row[1:]])
+        return ring
+
+    def append(self, device_id, ts=None, **readings):
+        """Record one reading (temperature, humidity, pressure, wifi_rssi; missing ones are None)"""
+        ts = time.time() if ts is None else ts
+        values = list(clean_readings(readings).values())
+        self._ensure_flusher()
+        with self._lock:
+            self._ring(device_id).append(ts, [np.nan if value is None else value for value in values])
+            self._pending.append((device_id, ts, *values))
+
+    def _ensure_flusher(self):
+        """Start the background flush thread on first use"""
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+                self._flusher.start()
+                atexit.register(self.flush)
+
+    def _flush_loop(self):
+        """Flush pending readings every flush_interval seconds"""
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing sensor series: {e}")
+
+    def flush(self):
+        """Append pending readings and merge them into the rollups in one transaction"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            conn = self._connect()
+            placeholders = ', '.join('?' * (2 + len(SENSOR_FIELDS)))
+            with conn:
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS sensor_batch AS SELECT * FROM sensor_readings WHERE 0")
+                conn.execute("DELETE FROM sensor_batch")
+                conn.executemany(f"INSERT INTO sensor_batch VALUES ({placeholders})", batch)
+                conn.execute("INSERT INTO sensor_readings SELECT * FROM sensor_batch")
+                for resolution, width in RESOLUTIONS.items():
+                    conn.execute(ROLLUP_UPSERT, (resolution, width, width, width))
+                if time.time() - self._pruned_at > 3600:
+                    self._prune(conn)
+
+    def _prune(self, conn):
+        """Drop raw readings and rollups older than their retention"""
+        now = time.time()
+        conn.execute("DELETE FROM sensor_readings WHERE ts < ?", (now - RETENTION['raw'],))
+        for resolution, keep in RETENTION.items():
+            if resolution != 'raw' and keep is not None:
+                conn.execute("DELETE FROM sensor_rollups WHERE resolution = ? AND bucket < ?",
+                             (resolution, now - keep))
+        self._pruned_at = now
+
+    def devices(self):
+        """Return the ids of every device with stored readings"""
+        self.flush()
+        return [row[0] for row in self._connect().execute("SELECT DISTINCT device_id FROM sensor_readings")]
+
+    def latest(self, device_id, limit=1):
+        """Return the device's most recent readings as dicts, newest first"""
+        with self._lock:
+            ring = self._rings.get(device_id)
+            if ring is not None:
+                ts, values = ring.window(-np.inf, np.inf)
+        if ring is None:
+            self.flush()
+            rows = self._connect().execute(f"""
+                SELECT ts, {', '.join(SENSOR_FIELDS)} FROM sensor_readings
+                WHERE device_id = ? ORDER BY ts DESC LIMIT ?
+            """, (device_id, limit)).fetchall()
+            ts = np.array([row[0] for row in rows[::-1]])
+            values = np.array([row[1:] for row in rows[::-1]], dtype=float).reshape(-1, len(SENSOR_FIELDS))
+        return [self._reading(device_id, t, row) for t, row in zip(ts[::-1][:limit], values[::-1][:limit])]
+
+    def _reading(self, device_id, ts, values):
+        """Return one reading as a dict with an ISO timestamp"""
+        return {
+            'device_id': device_id,
+            **{field: None if np.isnan(value) else float(value) for field, value in zip(SENSOR_FIELDS, values)},
+            'timestamp': datetime.fromtimestamp(ts).isoformat(),
+            'last_updated': datetime.fromtimestamp(ts).isoformat(),
+            'ts': float(ts)
+        }
+
+    def pick_resolution(self, device_id, start, end):
+        """Return the finest resolution with at most max_points points over the range"""
+        span = max(end - start, 0)
+        with self._lock:
+            # The ring's reading rate estimates how many raw readings the range holds
+            ring = self._rings.get(device_id)
+            rate = ring.size / max(time.time() - ring.oldest(), 1) if ring is not None and ring.size else None
+        if rate is None:
+            # Without a ring, count stored readings in the range, stopping past max_points
+            raw = self._connect().execute("""
+                SELECT COUNT(*) FROM (SELECT 1 FROM sensor_readings WHERE device_id = ? AND ts >= ? AND ts < ? LIMIT ?)
+            """, (device_id, start, end, self.max_points + 1)).fetchone()[0]
+        else:
+            raw = span * rate
+        if raw <= self.max_points:
+            return 'raw'
+        for resolution, width in RESOLUTIONS.items():
+            if span / width <= self.max_points:
+                return resolution
+        return 'day'
+
+    def query(self, device_id, start=None, end=None, resolution=None):
+        """Return a device's readings in [start, end) (epoch seconds) as columns
+
+        resolution is 'raw', 'minute', 'hour' or 'day', or None to pick the finest one that
+        keeps the response under max_points. Raw ranges inside the ring buffer are served
+        from memory; everything else comes from SQLite.
+        """
+        end = time.time() if end is None else end
+        start = end - 86400 if start is None else start
+        resolution = resolution or self.pick_resolution(device_id, start, end)
+        if resolution != 'raw' and resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution: {resolution}")
+
+        columns = {'device_id': device_id, 'resolution': resolution, 'start': start, 'end': end}
+        if resolution == 'raw':
+            with self._lock:
+                ring = self._rings.get(device_id)
+                covered = ring is not None and (ring.size < ring.capacity or ring.oldest() <= start)
+                if covered:
+                    ts, values = ring.window(start, end)
+            if not covered:
+                self.flush()
+                rows = self._connect().execute(f"""
+                    SELECT ts, {', '.join(SENSOR_FIELDS)} FROM sensor_readings
+                    WHERE device_id = ? AND ts >= ? AND ts < ? ORDER BY ts
+                """, (device_id, start, end)).fetchall()
+                ts = np.array([row[0] for row in rows])
+                values = np.array([row[1:] for row in rows], dtype=float).reshape(-1, len(SENSOR_FIELDS))
+            columns['ts'] = ts.tolist()
+            for i, field in enumerate(SENSOR_FIELDS):
+                columns[field] = [None if np.isnan(value) else value for value in values[:, i].tolist()]
+            return columns
+
+        self.flush()
+        width = RESOLUTIONS[resolution]
+        rows = self._connect().execute(f"""
+            SELECT bucket, {', '.join(_rollup_columns())} FROM sensor_rollups
+            WHERE device_id = ? AND resolution = ? AND bucket >= ? AND bucket < ? ORDER BY bucket
+        """, (device_id, resolution, int(start // width) * width, end)).fetchall()
+        columns['ts'] = [row[0] for row in rows]
+        for i, field in enumerate(SENSOR_FIELDS):
+            stats = [row[1 + 4 * i:5 + 4 * i] for row in rows]
+            columns[field] = {
+                'count': [int(count) for count, _, _, _ in stats],
+                'mean': [total / count if count else None for count, total, _, _ in stats],
+                'min': [low for _, _, low, _ in stats],
+                'max': [high for _, _, _, high in stats]
+            }
+        return columns
+
+# Global instance
+sensor_series = SensorSeries()
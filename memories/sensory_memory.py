@@ -19,12 +19,14 @@ def get_location_from_ip(ip_address):
 
 class SensoryMemory(BaseNeo4jMemory):
     """Stores raw sensory input with user IP tracking"""
+
+    layer = "SensoryMemory_TextBased"
     
     def save(self, text, ip_address=None, user_id=None):
         """Save text to sensory memory and track user IP separately"""
         timestamp = datetime.now().isoformat()
         
-        with self.driver.session() as neo4j_session:
+        with self.counting_session() as neo4j_session:
             # Create text node without IP information
             neo4j_session.run("""
                 MERGE (t:Text:SensoryMemory_TextBased {
@@ -142,7 +144,7 @@ class SensoryMemory(BaseNeo4jMemory):
             return [record.data() for record in result]
 
     def save_sensor_data(self, device_id, temperature=None, humidity=None, pressure=None, wifi_rssi=None, timestamp=None):
-        """Save sensor data with SensoryMemory_SensorBased label - overwrites existing data"""
+        """Save the latest sensor reading with SensoryMemory_SensorBased label - overwrites existing data (history is in sensor_series)"""
         if timestamp is None:
             timestamp = datetime.now().isoformat()
         
@@ -168,6 +170,20 @@ class SensoryMemory(BaseNeo4jMemory):
             
             print(f"Sensor data saved/updated for device {device_id}: temp={temperature}°C, humidity={humidity}%, pressure={pressure}hPa")
 
+    def save_sensor_batch(self, readings):
+        """Save the latest reading of many devices in one UNWIND (dicts with device_id, the sensor fields and timestamp)"""
+        with self.driver.session() as neo4j_session:
+            neo4j_session.run("""
+                UNWIND $readings AS reading
+                MERGE (sd:SensorData:SensoryMemory_SensorBased {device_id: reading.device_id})
+                SET sd.temperature = reading.temperature,
+                    sd.humidity = reading.humidity,
+                    sd.pressure = reading.pressure,
+                    sd.wifi_rssi = reading.wifi_rssi,
+                    sd.timestamp = reading.timestamp,
+                    sd.last_updated = reading.timestamp
+            """, readings=readings).consume()
+
     def get_sensor_data(self, device_id=None, limit=10):
         """Get sensor data - all devices or specific device"""
         with self.driver.session() as neo4j_session:
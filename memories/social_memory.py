@@ -1,34 +1,242 @@
 import pytholog as pl
 from dateutil import parser
 import os
+import time
 import calendar
+import itertools
 from datetime import date
+from collections import OrderedDict
+from threading import Lock, RLock
 from nltk.corpus import wordnet as wn
 from nltk.sentiment import SentimentIntensityAnalyzer
 from nltk import pos_tag, ne_chunk
 from nltk.tree import Tree
+from .kinship_closure import KinshipClosure, KinshipClosureOverlay
+from .kinship_engine import KinshipEngine
+from .kinship_paths import KinshipPathFinder
+from .kinship_rules import format_fact, parse_file
+from .fact_store import fact_store, fact_file_user, user_fact_file
+
+# All relationship types reported by find_all_relationships, from the Prolog KB
+KINSHIP_RELATIONS = [
+    # Western relationships
+    'father', 'mother', 'parent', 'child', 'son', 'daughter',
+    'brother', 'sister', 'sibling', 'grandfather', 'grandmother',
+    'grandson', 'granddaughter', 'grandchild', 'uncle', 'aunt',
+    'nephew', 'niece', 'cousin', 'husband', 'wife', 'married',
+
+    # Eastern relationships
+    'abu', 'ami', 'taya', 'tayi', 'chacha', 'chachi', 'mama', 'mami',
+    'khala', 'khalu', 'dada', 'dadi', 'nana', 'nani', 'dewar', 'dewrani',
+    'jeth', 'jethani', 'saas', 'sasur', 'nand', 'bahu', 'damad',
+    'saala', 'saali', 'bhanoyi', 'beta', 'beti', 'bhai', 'behn',
+    'bhatija', 'bhatiji', 'pota', 'poti', 'nawasa', 'nawasi',
+    'bhanja', 'bhanji'
+]
 
 class SocialMemory:
     """Manages social knowledge using Prolog knowledge base"""
     
-    def __init__(self, kb_file="prolog/kb.pl"):
-        """Initialize social memory with knowledge base"""
-        self.kb = pl.KnowledgeBase("family")
-        self.kb.from_file(kb_file)
+    def __init__(self, kb_file="prolog/kb.pl", engine="pytholog", query_cache_size=2048,
+                 max_overlays=32, overlay_idle_seconds=1800):
+        """Initialize social memory with knowledge base ('pytholog', or the opt-in 'native' indexed engine)
+
+        kb.pl is loaded once into a shared base; each active user's facts live in a small
+        overlay kept in an LRU of at most max_overlays users, evicted after overlay_idle_seconds.
+        Overlays layer over the shared kinship closure and, with the native engine, over the
+        shared rule engine. pytholog cannot layer knowledge bases, so with it each overlay
+        holds its own copy of kb.pl.
+        """
+        self.engine = engine
+        self.facts = fact_store
+        self.kb_version = 0
+        self.query_cache_size = query_cache_size
+        self._query_cache = OrderedDict()
+        self._cache_lock = Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.max_overlays = max_overlays
+        self.overlay_idle_seconds = overlay_idle_seconds
+        self._overlays = OrderedDict()
+        self._overlay_lock = RLock()
+        self.overlay_evictions = 0
+        self._overlay_versions = itertools.count(1)  # Never reused, so evicted overlays cannot hit stale results
+        self._imported_users = set()
+        self._build_kb(kb_file)
         self.myBot = None
         self.session = None
         self.mood = ""
         self.sia = SentimentIntensityAnalyzer()
-        
-    def reload_kb(self, kb_file="prolog/kb.pl"):
-        """Reload knowledge base from file"""
-        self.kb.clear_cache()
+
+    @staticmethod
+    def _file_signature(path):
+        """Return (mtime, size) for change detection, or None if the file is missing"""
+        try:
+            stat = os.stat(path)
+            return stat.st_mtime, stat.st_size
+        except OSError:
+            return None
+
+    def _build_kb(self, kb_file):
+        """Load kb.pl into a fresh shared base backend and kinship closure"""
+        self.kb_file = kb_file
+        self.kb = KinshipEngine("family") if self.engine == "native" else pl.KnowledgeBase("family")
         self.kb.from_file(kb_file)
+        try:
+            base_clauses = parse_file(kb_file) if os.path.exists(kb_file) else []
+        except Exception as e:
+            print(f"Error parsing {kb_file} for kinship closure: {e}")
+            base_clauses = []
+        self.kinship = KinshipClosure()
+        self.kinship.add_clauses(base_clauses)
+        self.paths = KinshipPathFinder(self.kinship)
+        self._kb_signature = self._file_signature(kb_file)
+        with self._overlay_lock:
+            self._overlays.clear()  # Overlays are rebuilt over the new base on demand
+        self._bump_version()
+
+    def _bump_version(self):
+        """Invalidate cached query results after the shared base actually changed"""
+        with self._cache_lock:
+            self.kb_version += 1
+            self._query_cache.clear()
 
-    def load_user_facts(self, fact_file):
-        """Load user-specific facts from their fact file"""
-        if os.path.exists(fact_file):
-            self.kb.from_file(fact_file)
+    def reload_kb(self, kb_file="prolog/kb.pl"):
+        """Reload knowledge base from file if it changed since it was last loaded"""
+        if self._file_signature(kb_file) != self._kb_signature:
+            self._build_kb(kb_file)
+
+    def _new_overlay(self, user):
+        """Create an empty fact overlay for a user over the shared base"""
+        if self.engine == "native":
+            kb = self.kb.overlay(f"family_{user}")
+        else:
+            # pytholog has no layering, so its overlay is a full copy of kb.pl
+            kb = pl.KnowledgeBase(f"family_{user}")
+            kb.from_file(self.kb_file)
+        kinship = KinshipClosureOverlay(self.kinship)
+        return {'kb': kb, 'kinship': kinship, 'paths': KinshipPathFinder(kinship), 'cursors': {},
+                'version': next(self._overlay_versions), 'used': time.time()}
+
+    def _overlay(self, user, create=True):
+        """Return a user's overlay, marking it recently used and evicting idle or excess ones"""
+        with self._overlay_lock:
+            overlay = self._overlays.get(user)
+            if overlay is None:
+                if not create:
+                    return None
+                overlay = self._overlays[user] = self._new_overlay(user)
+            overlay['used'] = time.time()
+            self._overlays.move_to_end(user)
+
+            idle_before = overlay['used'] - self.overlay_idle_seconds
+            while len(self._overlays) > 1:
+                oldest_user, oldest = next(iter(self._overlays.items()))
+                if len(self._overlays) <= self.max_overlays and oldest['used'] >= idle_before:
+                    break
+                del self._overlays[oldest_user]
+                self.overlay_evictions += 1
+            return overlay
+
+    def _user_overlay(self, user):
+        """Return a user's resident overlay, or None to query the shared base"""
+        return self._overlay(user, create=False) if user else None
+
+    def _session_user(self):
+        """Return the overlay user of the current request's session, if any"""
+        fact_file = self.session.get("fact_file") if self.session else None
+        return fact_file_user(fact_file) if fact_file else None
+
+    def load_user_facts(self, fact_file, username=None):
+        """Load a user's fact overlay, bulk-adding store rows not loaded yet; returns the overlay user
+
+        Facts stored under the display name (by RelationshipManager) are included when
+        username is given. Queries see the overlay only when called with this user.
+        """
+        user = fact_file_user(fact_file)
+        sources = [user] + ([username] if username and username != user else [])
+
+        for source in sources:
+            if source not in self._imported_users:
+                # Facts appended to the .pl file before the store existed are imported once
+                source_file = fact_file if source == user else user_fact_file(source)
+                if os.path.exists(source_file):
+                    self.facts.import_file(source_file, source)
+                self._imported_users.add(source)
+
+        overlay = self._overlay(user)
+        for source in sources:
+            self._add_new_rows(overlay, source)
+        return user
+
+    def _add_new_rows(self, overlay, source):
+        """Add a source's store rows past the overlay's cursor to its backends; True if any were new
+
+        Only the new rows are passed on: pytholog does not deduplicate, so reloading the
+        whole fact file would add every earlier fact again.
+        """
+        with self._overlay_lock:
+            rows = self.facts.facts(source, overlay['cursors'].get(source, 0))
+            if not rows:
+                return False
+            clauses = [(pred, args, None) for _, pred, args in rows]
+            if self.engine == "native":
+                overlay['kb'].add_clauses(clauses)
+            else:
+                # pytholog clauses take no final period
+                overlay['kb']([format_fact(pred, args)[:-1] for _, pred, args in rows])
+            overlay['kinship'].add_clauses(clauses)
+            overlay['cursors'][source] = rows[-1][0]
+            overlay['version'] = next(self._overlay_versions)
+            return True
+
+    def overlay_stats(self):
+        """Return the number of resident user overlays and evictions so far"""
+        with self._overlay_lock:
+            return {
+                'overlays': len(self._overlays),
+                'max_overlays': self.max_overlays,
+                'evictions': self.overlay_evictions,
+                'users': list(self._overlays)
+            }
+
+    def _run_query(self, kb, expr):
+        """Run a query string against a backend knowledge base"""
+        if self.engine == "native":
+            return kb.query(expr)
+        return kb.query(pl.Expr(expr))
+
+    def _query(self, expr, user=None):
+        """Run a query against a user's overlay (or the shared base), reusing results for the same versions"""
+        overlay = self._user_overlay(user)
+        kb = overlay['kb'] if overlay else self.kb
+        key = (user if overlay else None, expr, self.kb_version, overlay['version'] if overlay else 0)
+        with self._cache_lock:
+            result = self._query_cache.get(key)
+            if result is not None:
+                self._query_cache.move_to_end(key)
+                self.cache_hits += 1
+                return result
+            self.cache_misses += 1
+
+        result = self._run_query(kb, expr)
+        with self._cache_lock:
+            if key[2] == self.kb_version:
+                self._query_cache[key] = result
+                if len(self._query_cache) > self.query_cache_size:
+                    self._query_cache.popitem(last=False)
+        return result
+
+    def query_cache_stats(self):
+        """Return query cache hit/miss counters"""
+        total = self.cache_hits + self.cache_misses
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'size': len(self._query_cache),
+            'kb_version': self.kb_version,
+            'hit_rate': self.cache_hits / total if total else 0.0
+        }
 
     def get_description(self, word):
         """Get word descriptions from WordNet"""
@@ -99,7 +307,7 @@ class SocialMemory:
             return
         return
 
-    def find_person(self, person, relation):
+    def find_person(self, person, relation, user=None):
         """Find person in relationship from Prolog KB with comprehensive relationship support"""
         try:
             person_lower = person.lower()
@@ -113,7 +321,7 @@ class SocialMemory:
             
             for query in queries_to_try:
                 try:
-                    result = self.kb.query(pl.Expr(query))
+                    result = self._query(query, user)
                     if result and len(result) > 0:
                         if isinstance(result[0], dict) and 'X' in result[0]:
                             return result[0]['X'].capitalize()
@@ -126,83 +334,38 @@ class SocialMemory:
         except:
             return None
 
-    def find_all_relationships(self, person):
-        """Find all relationships for a given person"""
-        relationships = {}
-        person_lower = person.lower()
-        
-        # Define all possible relationship types from the Prolog KB
-        relationship_types = [
-            # Western relationships
-            'father', 'mother', 'parent', 'child', 'son', 'daughter',
-            'brother', 'sister', 'sibling', 'grandfather', 'grandmother',
-            'grandson', 'granddaughter', 'grandchild', 'uncle', 'aunt',
-            'nephew', 'niece', 'cousin', 'husband', 'wife', 'married',
-            
-            # Eastern relationships
-            'abu', 'ami', 'taya', 'tayi', 'chacha', 'chachi', 'mama', 'mami',
-            'khala', 'khalu', 'dada', 'dadi', 'nana', 'nani', 'dewar', 'dewrani',
-            'jeth', 'jethani', 'saas', 'sasur', 'nand', 'bahu', 'damad',
-            'saala', 'saali', 'bhanoyi', 'beta', 'beti', 'bhai', 'behn',
-            'bhatija', 'bhatiji', 'pota', 'poti', 'nawasa', 'nawasi',
-            'bhanja', 'bhanji'
-        ]
-        
-        for rel_type in relationship_types:
-            try:
-                # Try both query directions
-                queries = [
-                    f"{rel_type}(X,{person_lower})",  # who is person's relation
-                    f"{rel_type}({person_lower},X)",  # who is person the relation of
-                ]
-                
-                for query in queries:
-                    try:
-                        result = self.kb.query(pl.Expr(query))
-                        if result and len(result) > 0:
-                            for res in result:
-                                if isinstance(res, dict) and 'X' in res:
-                                    if rel_type not in relationships:
-                                        relationships[rel_type] = []
-                                    relationships[rel_type].append(res['X'].capitalize())
-                                elif isinstance(res, str):
-                                    if rel_type not in relationships:
-                                        relationships[rel_type] = []
-                                    relationships[rel_type].append(res.capitalize())
-                    except:
-                        continue
-            except:
-                continue
-        
-        return relationships
+    def find_all_relationships(self, person, user=None):
+        """Find all relationships for a given person from a user's kinship closure"""
+        overlay = self._user_overlay(user)
+        kinship = overlay['kinship'] if overlay else self.kinship
+        relationships = kinship.relationships_of(person.lower(), KINSHIP_RELATIONS)
+        return {rel_type: [p.capitalize() for p in people] for rel_type, people in relationships.items()}
 
-    def get_relationship_description(self, person1, person2):
+    def find_relationship_path(self, person1, person2, user=None):
+        """Find the shortest relation chain from person1 to person2 in a user's family graph"""
+        overlay = self._user_overlay(user)
+        paths = overlay['paths'] if overlay else self.paths
+        return paths.find(person1, person2)
+
+    def get_relationship_description(self, person1, person2, user=None):
         """Get a natural language description of the relationship between two people"""
-        person1_lower = person1.lower()
-        person2_lower = person2.lower()
-        
-        # Find all relationships for person1
-        relationships = self.find_all_relationships(person1)
-        
-        # Check if person2 is in any relationship with person1
-        for rel_type, related_people in relationships.items():
-            if any(p.lower() == person2_lower for p in related_people):
-                return f"{person2.capitalize()} is the {rel_type} of {person1.capitalize()}"
-        
-        # Try reverse relationship
-        relationships_reverse = self.find_all_relationships(person2)
-        for rel_type, related_people in relationships_reverse.items():
-            if any(p.lower() == person1_lower for p in related_people):
-                return f"{person1.capitalize()} is the {rel_type} of {person2.capitalize()}"
-        
-        return f"I don't know the relationship between {person1.capitalize()} and {person2.capitalize()}"
+        name1 = person1.capitalize()
+        name2 = person2.capitalize()
+        path = self.find_relationship_path(person1, person2, user)
+        if not path:
+            return f"I don't know the relationship between {name1} and {name2}"
+        if not path['term']:
+            return f"{name2} is {name1}'s {path['description']}"
+        if len(path['steps']) == 1:
+            return f"{name2} is the {path['term']} of {name1}"
+        return f"{name2} is the {path['term']} of {name1} ({name1}'s {path['description']})"
 
-    def check_relation(self, rel, person1):
+    def check_relation(self, rel, person1, user=None):
         """Check if person1 has a specific relation"""
         if not self.myBot:
             return
             
-        result = self.find_person(person1, rel)
+        result = self.find_person(person1, rel, user)
         if result:
             self.myBot.setPredicate("rel", rel)
             self.myBot.setPredicate("person1", person1)
@@ -214,14 +377,14 @@ class SocialMemory:
             self.myBot.setPredicate("person2", "")
             return
 
-    def find_dob(self, person_name):
+    def find_dob(self, person_name, user=None):
         """Find date of birth for a person"""
         if not self.myBot:
             return
             
         try:
             expr = f"dob({person_name},Y)"
-            result = self.kb.query(pl.Expr(expr))
+            result = self._query(expr, user)
             if result and len(result) > 0:
                 date_str = result[0]['Y'] if isinstance(result[0], dict) else result[0]
                 try:
@@ -239,14 +402,14 @@ class SocialMemory:
         self.myBot.setPredicate("dob", "")
         return None
 
-    def find_gender(self, person_name):
+    def find_gender(self, person_name, user=None):
         """Find gender for a person"""
         if not self.myBot:
             return
             
         try:
             expr = f"gender({person_name},Y)"
-            result = self.kb.query(pl.Expr(expr))
+            result = self._query(expr, user)
             if result and len(result) > 0:
                 gender = result[0]['Y'] if isinstance(result[0], dict) else result[0]
                 self.myBot.setPredicate("gender_person", person_name)
@@ -259,14 +422,14 @@ class SocialMemory:
         self.myBot.setPredicate("gender", "")
         return None
 
-    def find_age(self, person_name):
+    def find_age(self, person_name, user=None):
         """Calculate age from date of birth"""
         if not self.myBot:
             return
             
         try:
             expr = f"dob({person_name},Y)"
-            result = self.kb.query(pl.Expr(expr))
+            result = self._query(expr, user)
             if result and len(result) > 0:
                 date_str = result[0]['Y'] if isinstance(result[0], dict) else result[0]
                 try:
@@ -286,30 +449,24 @@ class SocialMemory:
         return None
 
     def append_fact(self, fact_file, fact):
-        """Append a fact to the knowledge base file"""
+        """Store a fact for the fact file's user; duplicates are a no-op"""
         try:
-            # Ensure the directory exists
-            os.makedirs(os.path.dirname(fact_file), exist_ok=True)
-            
-            # Check if fact already exists to prevent duplicates
-            if os.path.exists(fact_file):
-                with open(fact_file, "r") as f:
-                    existing_content = f.read()
-                if fact.strip() in existing_content:
-                    return  # Fact already exists
-            
-            with open(fact_file, "a") as f:
-                f.write(fact + "\n")
-                
-            # Reload the knowledge base to include new fact
-            self.kb.from_file(fact_file)
+            user = fact_file_user(fact_file)
+            added = self.facts.add_facts(user, [fact])
+            if not added:
+                return  # Fact already exists
+
+            # Add the new rows to the user's overlay if it is resident
+            overlay = self._overlay(user, create=False)
+            if overlay is not None:
+                self._add_new_rows(overlay, user)
         except Exception as e:
             print(f"Error appending fact: {e}")
 
     def append_gender_fact(self, username, gender):
         """Append gender fact to user's fact file"""
         fact_file = f"prolog/facts/{username.replace('@', '_at_')}.pl"
-        fact = f"gender({username.lower()},{gender.lower()})."
+        fact = format_fact('gender', (username.lower(), gender.lower()))
         self.append_fact(fact_file, fact)
         
         try:
@@ -323,7 +480,7 @@ class SocialMemory:
         try:
             parsed_date = parser.parse(dob)
             formatted_date = parsed_date.strftime("%Y-%m-%d")
-            fact = f"dob({username.lower()},'{formatted_date}')."
+            fact = format_fact('dob', (username.lower(), formatted_date))
             self.append_fact(fact_file, fact)
         except Exception as e:
             print(f"Error appending DOB fact: {e}")
@@ -331,7 +488,7 @@ class SocialMemory:
     def append_relation_fact(self, username, person1, relation):
         """Append relationship fact to user's fact file"""
         fact_file = f"prolog/facts/{username.replace('@', '_at_')}.pl"
-        fact = f"{relation.lower()}({person1.lower()},{username.lower()})."
+        fact = format_fact(relation.lower(), (person1.lower(), username.lower()))
         self.append_fact(fact_file, fact)
         
         try:
@@ -362,13 +519,13 @@ class SocialMemory:
         
         driver.close()
 
-    def find_relation(self, person1, relation, person2=None):
+    def find_relation(self, person1, relation, person2=None, user=None):
         """Find or verify relationships between people"""
         try:
             if person2:
                 # Verify specific relationship
                 expr = f"{relation.lower()}({person1.lower()},{person2.lower()})"
-                result = self.kb.query(pl.Expr(expr))
+                result = self._query(expr, user)
                 return len(result) > 0 if result else False
             else:
                 # Find relationship
@@ -379,7 +536,7 @@ class SocialMemory:
                 
                 for query in queries_to_try:
                     try:
-                        result = self.kb.query(pl.Expr(query))
+                        result = self._query(query, user)
                         if result and len(result) > 0:
                             if isinstance(result[0], dict) and 'X' in result[0]:
                                 return result[0]['X']
@@ -396,6 +553,7 @@ class SocialMemory:
         """Process AIML predicates and execute corresponding actions"""
         if not self.myBot or not self.session:
             return
+        user = self._session_user()
             
         # Check word meanings
         word = self.myBot.getPredicate("word")
@@ -410,23 +568,23 @@ class SocialMemory:
         # Check person's date of birth
         dob_person = self.myBot.getPredicate("dob_person")
         if dob_person and dob_person != "":
-            self.find_dob(dob_person)
+            self.find_dob(dob_person, user)
         
         # Check person's age
         age_person = self.myBot.getPredicate("age_person")
         if age_person and age_person != "":
-            self.find_age(age_person)
+            self.find_age(age_person, user)
         
         # Check person's gender
         gender_person = self.myBot.getPredicate("gender_person")
         if gender_person and gender_person != "":
-            self.find_gender(gender_person)
+            self.find_gender(gender_person, user)
 
         # Check relationships
         rel = self.myBot.getPredicate("rel")
         person1 = self.myBot.getPredicate("person1")
         if rel and person1 and rel != "" and person1 != "":
-            self.check_relation(rel, person1)
+            self.check_relation(rel, person1, user)
         
         # Store gender information
         person = self.myBot.getPredicate("person")
@@ -447,7 +605,7 @@ class SocialMemory:
         # Handle other predicates for user information
         other_dob_person = self.myBot.getPredicate("other_dob_person")
         if other_dob_person and other_dob_person != "":
-            self.find_dob(other_dob_person)
+            self.find_dob(other_dob_person, user)
         
         other_dob = self.myBot.getPredicate("other_dob")
         if other_dob and other_dob != "":
@@ -455,7 +613,7 @@ class SocialMemory:
             
         other_gender_person = self.myBot.getPredicate("other_gender_person")
         if other_gender_person and other_gender_person != "":
-            self.find_gender(other_gender_person)
+            self.find_gender(other_gender_person, user)
         
         other_gender = self.myBot.getPredicate("other_gender")
         if other_gender and other_gender != "":
@@ -2,6 +2,137 @@ import pandas as pd
 import re
 from neo4j import GraphDatabase
 from datetime import datetime
+from simple_gender_predictor import simple_gender_predictor as gender_predictor
+from memories.fact_store import fact_store
+from memories.graph_versions import graph_versions
+from memories.memory_counts import memory_counts, WriteTally, CountingSession
+from memories.kinship_rules import format_fact
+from relationship_ontology import RelationshipOntology
+
+# Age rules per relation: (aliases, min gap, max gap, requirement); gap = person's age - user's age
+AGE_GAP_RULES = [
+    (('father', 'dad', 'papa'), 18, None, "must be at least 18 years older than you"),
+    (('mother', 'mom', 'mama'), 18, None, "must be at least 18 years older than you"),
+    (('elder_brother', 'elder brother', 'big brother'), 1, None, "must be older than you"),
+    (('elder_sister', 'elder sister', 'big sister'), 1, None, "must be older than you"),
+    (('younger_brother', 'younger brother', 'little brother'), None, -1, "must be younger than you"),
+    (('younger_sister', 'younger sister', 'little sister'), None, -1, "must be younger than you"),
+    (('son',), None, -13, "must be significantly younger than you"),
+    (('daughter',), None, -13, "must be significantly younger than you"),
+    (('grandfather', 'grandpa'), 40, None, "must be much older than you"),
+    (('grandmother', 'grandma'), 40, None, "must be much older than you"),
+]
+AGE_GAPS = {alias: (min_gap, max_gap, requirement)
+            for aliases, min_gap, max_gap, requirement in AGE_GAP_RULES for alias in aliases}
+
+# Gender implied by each relationship type, used for new Person nodes
+RELATION_GENDERS = {
+    # Male relationships
+    'father': 'male', 'son': 'male', 'brother': 'male', 'elder_brother': 'male', 'younger_brother': 'male', 'husband': 'male',
+    'grandfather': 'male', 'grandson': 'male', 'uncle': 'male', 'nephew': 'male',
+    'father_in_law': 'male', 'brother_in_law': 'male', 'son_in_law': 'male',
+    'stepfather': 'male', 'stepbrother': 'male', 'stepson': 'male',
+    'half_brother': 'male', 'great_grandfather': 'male', 'great_uncle': 'male',
+    'boyfriend': 'male', 'fiance': 'male', 'godfather': 'male', 'godson': 'male',
+    'adoptive_father': 'male', 'foster_father': 'male',
+
+    # Female relationships
+    'mother': 'female', 'daughter': 'female', 'sister': 'female', 'elder_sister': 'female', 'younger_sister': 'female', 'wife': 'female',
+    'grandmother': 'female', 'granddaughter': 'female', 'aunt': 'female', 'niece': 'female',
+    'mother_in_law': 'female', 'sister_in_law': 'female', 'daughter_in_law': 'female',
+    'stepmother': 'female', 'stepsister': 'female', 'stepdaughter': 'female',
+    'half_sister': 'female', 'great_grandmother': 'female', 'great_aunt': 'female',
+    'girlfriend': 'female', 'godmother': 'female', 'goddaughter': 'female',
+    'adoptive_mother': 'female', 'foster_mother': 'female',
+
+    # Gender-neutral or unknown
+    'parent': 'unknown', 'sibling': 'unknown', 'child': 'unknown',
+    'grandparent': 'unknown', 'grandchild': 'unknown', 'pibling': 'unknown',
+    'nibling': 'unknown', 'cousin': 'unknown', 'partner': 'unknown',
+    'friend': 'unknown', 'best_friend': 'unknown', 'colleague': 'unknown',
+    'boss': 'unknown', 'employee': 'unknown', 'teacher': 'unknown',
+    'student': 'unknown', 'mentor': 'unknown', 'mentee': 'unknown',
+    'neighbor': 'unknown', 'roommate': 'unknown', 'landlord': 'unknown',
+    'tenant': 'unknown', 'foster_child': 'unknown', 'pet': 'unknown'
+}
+
+# Relationship types a user can only have one of
+UNIQUE_RELATIONSHIPS = ('father', 'mother', 'husband', 'wife', 'grandfather', 'grandmother')
+
+def neo4j_relationship_type(relationship_type):
+    """Convert a relationship type to a Neo4j relationship name (elder brother -> ELDER_BROTHER)"""
+    return re.sub(r'[^A-Z0-9_]', '_', relationship_type.upper())
+
+def relationship_upsert_query(edge_types):
+    """Build the UNWIND query that MERGEs Person nodes and typed edges for rows of one user
+
+    Rows carry person_name, relationship_type, neo4j_type, gender and an optional age. Relationship
+    types cannot be query parameters, so there is one FOREACH branch per type present in the rows.
+    """
+    branches = "\n    ".join(
+        f"FOREACH (_ IN CASE WHEN row.neo4j_type = '{edge_type}' THEN [1] ELSE [] END | "
+        f"MERGE (u)-[r:{edge_type}]->(p) SET r.created_at = $timestamp)"
+        for edge_type in sorted(set(edge_types)))
+    return f"""
+    MATCH (u:User {{name: $user_name}})
+    OPTIONAL MATCH (u)-[h:HAS_RELATION]->(:Person)
+    DELETE h
+    WITH DISTINCT u
+    UNWIND $rows AS row
+    MERGE (p:Person:SocialMemory {{name: row.person_name, user: $user_name}})
+    ON CREATE SET p.relation = row.relationship_type,
+                  p.gender = row.gender,
+                  p.created_at = $timestamp
+    ON MATCH SET p.relation = row.relationship_type,
+                 p.gender = row.gender,
+                 p.updated_at = $timestamp
+    FOREACH (_ IN CASE WHEN row.age IS NULL THEN [] ELSE [1] END | SET p.age = row.age)
+    {branches}
+    RETURN row.index AS index
+    """
+
+UPSERT_LOOKUP_QUERY = """
+MATCH (u:User {name: $user_name})
+SET u._lock = true
+REMOVE u._lock
+WITH u
+UNWIND $rows AS row
+OPTIONAL MATCH (u)-[r]->(p:Person)
+WHERE type(r) = row.neo4j_type
+WITH row, p, r
+ORDER BY r.created_at DESC
+WITH row, collect(p.name) AS names
+RETURN row.index AS index, row.person_name IN names AS known, names[0] AS existing_person
+"""
+
+def _upsert_relationships_tx(tx, user_name, rows, timestamp):
+    """Transaction function for upsert_relationships; returns (created, known, conflicts)"""
+    existing = {record['index']: record for record in tx.run(UPSERT_LOOKUP_QUERY, user_name=user_name, rows=rows)}
+
+    # Resolve conflicts in memory, including two different names for one unique type in this message
+    created, known, conflicts = [], [], []
+    taken = {}
+    pending = []
+    for row in rows:
+        rel_type, person_name = row['relationship_type'], row['person_name']
+        record = existing.get(row['index'])
+        if record and record['known']:
+            known.append((rel_type, person_name))
+            continue
+        if rel_type in UNIQUE_RELATIONSHIPS:
+            holder = taken.get(rel_type) or (record['existing_person'] if record else None)
+            if holder and holder != person_name:
+                conflicts.append((rel_type, person_name, holder))
+                continue
+            taken[rel_type] = person_name
+        pending.append(row)
+
+    if pending:
+        written = {record['index'] for record in tx.run(
+            relationship_upsert_query(row['neo4j_type'] for row in pending),
+            user_name=user_name, rows=pending, timestamp=timestamp)}
+        created = [(row['relationship_type'], row['person_name']) for row in pending if row['index'] in written]
+    return created, known, conflicts
 
 class RelationshipManager:
     """Manages user relationships and stores them in Neo4j database"""
@@ -9,6 +140,7 @@ class RelationshipManager:
     def __init__(self, neo4j_uri="bolt://localhost:7687", neo4j_user="neo4j", neo4j_password="12345678"):
         """Initialize the relationship manager with Neo4j connection"""
         self.driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+        self.tally = WriteTally()
         self.load_relationship_types()
         
         self.relationship_patterns = {
@@ -124,6 +256,10 @@ class RelationshipManager:
             'pet': ['pet', 'dog', 'cat', 'puppy', 'kitten']
         }
         
+        # Alias index and is-a closure over the patterns and Relations_set.csv, built once
+        self.ontology = RelationshipOntology(self.relationship_patterns, self.valid_relationships)
+        self.relation_aliases = self.ontology.aliases
+        
         self.invalid_names = {
             'who', 'what', 'where', 'when', 'why', 'how',
             'is', 'was', 'are', 'were', 'be', 'been',
@@ -134,6 +270,20 @@ class RelationshipManager:
             'yes', 'no', 'maybe', 'ok', 'okay'
         }
     
+    def counting_session(self):
+        """Return a session whose writes are tallied for this thread (see record_changes)"""
+        return CountingSession(self.driver.session(), self.tally)
+
+    def record_changes(self, user_name, changed=True):
+        """Add this thread's tallied writes to the user's SocialMemory counts and bump their graph version"""
+        nodes, relationships = self.tally.take()
+        try:
+            memory_counts.add(user_name, 'SocialMemory', nodes, relationships)
+        except Exception as e:
+            print(f"Error updating SocialMemory counts for {user_name}: {e}")
+        if changed or nodes or relationships:
+            graph_versions.bump(user_name)
+
     def load_relationship_types(self):
         """Load relationship types from CSV file"""
         try:
@@ -244,7 +394,7 @@ class RelationshipManager:
     
     def update_user_age(self, user_name, age):
         """Update user's age in Neo4j"""
-        with self.driver.session() as session:
+        with self.counting_session() as session:
             try:
                 query = """
                 MATCH (u:User {name: $user_name})
@@ -255,6 +405,7 @@ class RelationshipManager:
                     user_name=user_name,
                     age=age,
                     timestamp=datetime.now().isoformat())
+                self.record_changes(user_name)
                 return True
             except Exception as e:
                 print(f"Error updating user age: {e}")
@@ -303,72 +454,111 @@ class RelationshipManager:
         
         return age_info
     
+    def check_age_gap(self, user_name, user_age, relation, age):
+        """Check one age against the AGE_GAPS rule for a relation; returns (is_valid, error_message)"""
+        if not user_age or not relation:
+            return True, None  # No validation without the user's age or a known relationship
+
+        rule = AGE_GAPS.get(relation.lower())
+        if not rule:
+            return True, None
+        min_gap, max_gap, requirement = rule
+        gap = age - user_age
+        if (min_gap is None or gap >= min_gap) and (max_gap is None or gap <= max_gap):
+            return True, None
+
+        # Get appropriate greeting based on user's gender
+        try:
+            predicted_gender = gender_predictor.predict(user_name)[0]
+            greeting = "Ma'am" if predicted_gender == 'female' else "Sir"
+        except:
+            greeting = "Sir"  # Default fallback
+        return False, f"{greeting}, you're telling me a fake age. Your {relation.lower().replace('_', ' ')} {requirement}."
+
+    def get_age_context(self, user_name, person_names):
+        """Fetch the user's age and each named person's relation and age in one query"""
+        with self.driver.session() as session:
+            try:
+                query = """
+                OPTIONAL MATCH (u:User {name: $user_name})
+                WITH u
+                UNWIND $person_names AS person_name
+                OPTIONAL MATCH (u)-[]->(p:Person {name: person_name, user: $user_name})
+                WITH u, person_name, collect(p)[0] AS p
+                RETURN u.age AS user_age, person_name, p.relation AS relationship,
+                       p.age AS age, p IS NOT NULL AS exists
+                """
+                records = list(session.run(query, user_name=user_name, person_names=list(person_names)))
+                user_age = records[0]['user_age'] if records else None
+                people = {record['person_name']: {
+                    'relationship': record['relationship'],
+                    'age': record['age'],
+                    'exists': record['exists']
+                } for record in records}
+                return user_age, people
+            except Exception as e:
+                print(f"Error getting age context for {user_name}: {e}")
+                return None, {}
+
+    def update_person_ages(self, user_name, ages):
+        """Set the age of several people in one UNWIND; returns the names that were updated"""
+        if not ages:
+            return set()
+        with self.counting_session() as session:
+            try:
+                query = """
+                UNWIND $ages AS row
+                MATCH (u:User {name: $user_name})-[]->(p:Person {name: row.person_name, user: $user_name})
+                WITH DISTINCT p, row
+                SET p.age = row.age, p.updated_at = $timestamp
+                RETURN DISTINCT p.name AS person_name
+                """
+                result = session.run(query,
+                    user_name=user_name,
+                    ages=[{'person_name': name, 'age': age} for name, age in ages],
+                    timestamp=datetime.now().isoformat())
+                updated = {record['person_name'] for record in result}
+                self.record_changes(user_name, changed=bool(updated))
+                return updated
+            except Exception as e:
+                print(f"Error updating ages for {user_name}: {e}")
+                return set()
+
+    def validate_person_ages(self, user_name, age_info):
+        """Validate and store (person_name, age) pairs with one read and one write round trip"""
+        age_info = list(dict.fromkeys(age_info))
+        if not age_info:
+            return []
+        user_age, people = self.get_age_context(user_name, {name for name, _ in age_info})
+
+        results = []
+        accepted = []
+        for person_name, age in age_info:
+            person = people.get(person_name, {})
+            is_valid, error_msg = self.check_age_gap(user_name, user_age, person.get('relationship'), age)
+            results.append([person_name, age, is_valid, error_msg])
+            if is_valid and person.get('exists'):
+                accepted.append((person_name, age))
+
+        updated = self.update_person_ages(user_name, accepted)
+        age_updates = []
+        for person_name, age, is_valid, error_msg in results:
+            if not is_valid:
+                age_updates.append({'person_name': person_name, 'age': age, 'message': error_msg})
+            elif person_name in updated:
+                age_updates.append({
+                    'person_name': person_name,
+                    'age': age,
+                    'message': f"I've noted that {person_name} is {age} years old. Thank you for the information! Wanna tell more?"
+                })
+        return age_updates
+
     def validate_person_age(self, user_name, person_name, age):
         """Validate age based on relationship constraints"""
         try:
-            # Get user's age first
-            user_age = self.get_user_age(user_name)
-            if not user_age:
-                return True, None  # No validation if user age not set
-            
-            # Get person's relationship with user
-            relationship = self.get_person_relationship(user_name, person_name)
-            if not relationship:
-                return True, None  # No validation if relationship not found
-            
-            rel_type = relationship.lower()
-            
-            # Get appropriate greeting based on user's gender
-            try:
-                from simple_gender_predictor import simple_gender_predictor as gender_predictor
-                predicted_gender = gender_predictor.predict_gender(user_name)
-                greeting = "Ma'am" if predicted_gender == 'female' else "Sir"
-            except:
-                greeting = "Sir"  # Default fallback
-            
-            # Age restriction rules
-            if rel_type in ['father', 'dad', 'papa']:
-                if age < user_age + 18:
-                    return False, f"{greeting}, you're telling me a fake age. Your {rel_type} must be at least 18 years older than you."
-            
-            elif rel_type in ['mother', 'mom', 'mama']:
-                if age < user_age + 18:
-                    return False, f"{greeting}, you're telling me a fake age. Your {rel_type} must be at least 18 years older than you."
-            
-            elif rel_type in ['elder_brother', 'elder brother', 'big brother']:
-                if age <= user_age:
-                    return False, f"{greeting}, you're telling me a fake age. Your elder brother must be older than you."
-            
-            elif rel_type in ['elder_sister', 'elder sister', 'big sister']:
-                if age <= user_age:
-                    return False, f"{greeting}, you're telling me a fake age. Your elder sister must be older than you."
-            
-            elif rel_type in ['younger_brother', 'younger brother', 'little brother']:
-                if age >= user_age:
-                    return False, f"{greeting}, you're telling me a fake age. Your younger brother must be younger than you."
-            
-            elif rel_type in ['younger_sister', 'younger sister', 'little sister']:
-                if age >= user_age:
-                    return False, f"{greeting}, you're telling me a fake age. Your younger sister must be younger than you."
-            
-            elif rel_type in ['son']:
-                if age >= user_age - 12:  # Minimum 12 year gap
-                    return False, f"{greeting}, you're telling me a fake age. Your son must be significantly younger than you."
-            
-            elif rel_type in ['daughter']:
-                if age >= user_age - 12:  # Minimum 12 year gap
-                    return False, f"{greeting}, you're telling me a fake age. Your daughter must be significantly younger than you."
-            
-            elif rel_type in ['grandfather', 'grandpa']:
-                if age < user_age + 40:  # Minimum 40 year gap
-                    return False, f"{greeting}, you're telling me a fake age. Your grandfather must be much older than you."
-            
-            elif rel_type in ['grandmother', 'grandma']:
-                if age < user_age + 40:  # Minimum 40 year gap
-                    return False, f"{greeting}, you're telling me a fake age. Your grandmother must be much older than you."
-            
-            return True, None
-            
+            user_age, people = self.get_age_context(user_name, [person_name])
+            relationship = people.get(person_name, {}).get('relationship')
+            return self.check_age_gap(user_name, user_age, relationship, age)
         except Exception as e:
             print(f"Error validating age: {e}")
             return True, None  # Allow if validation fails
@@ -401,7 +591,7 @@ class RelationshipManager:
     
     def update_specific_person_age(self, user_name, person_name, age):
         """Update age for a specific person by name"""
-        with self.driver.session() as session:
+        with self.counting_session() as session:
             try:
                 query = """
                 MATCH (u:User {name: $user_name})-[r]->(p:Person {name: $person_name, user: $user_name})
@@ -413,6 +603,7 @@ class RelationshipManager:
                     person_name=person_name,
                     age=age,
                     timestamp=datetime.now().isoformat()).single()
+                self.record_changes(user_name)
                 return result is not None
             except Exception as e:
                 print(f"Error updating age for {person_name}: {e}")
@@ -438,38 +629,7 @@ class RelationshipManager:
         if properties is None:
             properties = {}
         
-        # Determine gender based on relationship type
-        gender_mapping = {
-            # Male relationships
-            'father': 'male', 'son': 'male', 'brother': 'male', 'elder_brother': 'male', 'younger_brother': 'male', 'husband': 'male',
-            'grandfather': 'male', 'grandson': 'male', 'uncle': 'male', 'nephew': 'male',
-            'father_in_law': 'male', 'brother_in_law': 'male', 'son_in_law': 'male',
-            'stepfather': 'male', 'stepbrother': 'male', 'stepson': 'male',
-            'half_brother': 'male', 'great_grandfather': 'male', 'great_uncle': 'male',
-            'boyfriend': 'male', 'fiance': 'male', 'godfather': 'male', 'godson': 'male',
-            'adoptive_father': 'male', 'foster_father': 'male',
-            
-            # Female relationships
-            'mother': 'female', 'daughter': 'female', 'sister': 'female', 'elder_sister': 'female', 'younger_sister': 'female', 'wife': 'female',
-            'grandmother': 'female', 'granddaughter': 'female', 'aunt': 'female', 'niece': 'female',
-            'mother_in_law': 'female', 'sister_in_law': 'female', 'daughter_in_law': 'female',
-            'stepmother': 'female', 'stepsister': 'female', 'stepdaughter': 'female',
-            'half_sister': 'female', 'great_grandmother': 'female', 'great_aunt': 'female',
-            'girlfriend': 'female', 'godmother': 'female', 'goddaughter': 'female',
-            'adoptive_mother': 'female', 'foster_mother': 'female',
-            
-            # Gender-neutral or unknown
-            'parent': 'unknown', 'sibling': 'unknown', 'child': 'unknown',
-            'grandparent': 'unknown', 'grandchild': 'unknown', 'pibling': 'unknown',
-            'nibling': 'unknown', 'cousin': 'unknown', 'partner': 'unknown',
-            'friend': 'unknown', 'best_friend': 'unknown', 'colleague': 'unknown',
-            'boss': 'unknown', 'employee': 'unknown', 'teacher': 'unknown',
-            'student': 'unknown', 'mentor': 'unknown', 'mentee': 'unknown',
-            'neighbor': 'unknown', 'roommate': 'unknown', 'landlord': 'unknown',
-            'tenant': 'unknown', 'foster_child': 'unknown', 'pet': 'unknown'
-        }
-        
-        gender = gender_mapping.get(relationship_type.lower(), 'unknown')
+        gender = RELATION_GENDERS.get(relationship_type.lower(), 'unknown')
         
         # Update properties with all required attributes
         properties.update({
@@ -480,7 +640,7 @@ class RelationshipManager:
             'created_at': datetime.now().isoformat()
         })
         
-        with self.driver.session() as session:
+        with self.counting_session() as session:
             try:
                 # Use MATCH-MERGE pattern to update existing node or create if doesn't exist
                 query = """
@@ -492,24 +652,25 @@ class RelationshipManager:
                             p.updated_at = $timestamp
                 RETURN p
                 """
-                return session.run(query, 
+                record = session.run(query, 
                     name=name, 
                     user_name=user_name, 
                     relationship_type=relationship_type,
                     gender=gender,
                     timestamp=datetime.now().isoformat(),
                     properties=properties).single()
+                self.record_changes(user_name)
+                return record
             except Exception as e:
                 print(f"Error creating person node for {name}: {e}")
                 return None
     
     def create_relationship(self, user_name, person_name, relationship_type):
         """Create relationship between user and person in Neo4j"""
-        with self.driver.session() as session:
+        with self.counting_session() as session:
             try:
                 # For unique relationships, delete existing ones of the same type
-                unique_relationships_list = ['father', 'mother', 'husband', 'wife', 'grandfather', 'grandmother']
-                if relationship_type in unique_relationships_list:
+                if relationship_type in UNIQUE_RELATIONSHIPS:
                     delete_query = f"""
                     MATCH (u:User {{name: $user_name}})-[r:{relationship_type.upper()}]->(p:Person)
                     DELETE r, p
@@ -523,43 +684,12 @@ class RelationshipManager:
                 """
                 session.run(cleanup_query, user_name=user_name)
                 
-                # Determine gender based on relationship type
-                gender_mapping = {
-                    # Male relationships
-                    'father': 'male', 'son': 'male', 'brother': 'male', 'husband': 'male',
-                    'grandfather': 'male', 'grandson': 'male', 'uncle': 'male', 'nephew': 'male',
-                    'father_in_law': 'male', 'brother_in_law': 'male', 'son_in_law': 'male',
-                    'stepfather': 'male', 'stepbrother': 'male', 'stepson': 'male',
-                    'half_brother': 'male', 'great_grandfather': 'male', 'great_uncle': 'male',
-                    'boyfriend': 'male', 'fiance': 'male', 'godfather': 'male', 'godson': 'male',
-                    'adoptive_father': 'male', 'foster_father': 'male',
-                    
-                    # Female relationships
-                    'mother': 'female', 'daughter': 'female', 'sister': 'female', 'wife': 'female',
-                    'grandmother': 'female', 'granddaughter': 'female', 'aunt': 'female', 'niece': 'female',
-                    'mother_in_law': 'female', 'sister_in_law': 'female', 'daughter_in_law': 'female',
-                    'stepmother': 'female', 'stepsister': 'female', 'stepdaughter': 'female',
-                    'half_sister': 'female', 'great_grandmother': 'female', 'great_aunt': 'female',
-                    'girlfriend': 'female', 'godmother': 'female', 'goddaughter': 'female',
-                    'adoptive_mother': 'female', 'foster_mother': 'female',
-                    
-                    # Gender-neutral or unknown
-                    'parent': 'unknown', 'sibling': 'unknown', 'child': 'unknown',
-                    'grandparent': 'unknown', 'grandchild': 'unknown', 'pibling': 'unknown',
-                    'nibling': 'unknown', 'cousin': 'unknown', 'partner': 'unknown',
-                    'friend': 'unknown', 'best_friend': 'unknown', 'colleague': 'unknown',
-                    'boss': 'unknown', 'employee': 'unknown', 'teacher': 'unknown',
-                    'student': 'unknown', 'mentor': 'unknown', 'mentee': 'unknown',
-                    'neighbor': 'unknown', 'roommate': 'unknown', 'landlord': 'unknown',
-                    'tenant': 'unknown', 'foster_child': 'unknown', 'pet': 'unknown'
-                }
-                
-                gender = gender_mapping.get(relationship_type.lower(), 'unknown')
+                gender = RELATION_GENDERS.get(relationship_type.lower(), 'unknown')
                 timestamp = datetime.now().isoformat()
                 
                 # Create or update the person node and relationship in a single transaction
                 # Convert relationship type to valid Neo4j relationship name
-                neo4j_rel_type = relationship_type.upper().replace(' ', '_').replace('-', '_')
+                neo4j_rel_type = neo4j_relationship_type(relationship_type)
                 
                 query = f"""
                 MATCH (u:User {{name: $user_name}})
@@ -575,12 +705,14 @@ class RelationshipManager:
                 RETURN r
                 """
                 
-                return session.run(query, 
+                record = session.run(query, 
                     user_name=user_name, 
                     person_name=person_name,
                     relationship_type=relationship_type,
                     gender=gender,
                     timestamp=timestamp).single()
+                self.record_changes(user_name)
+                return record
                 
             except Exception as e:
                 print(f"Error creating relationship {relationship_type} between {user_name} and {person_name}: {e}")
@@ -609,6 +741,53 @@ class RelationshipManager:
                 print(f"Error getting relationships for {user_name}: {e}")
                 return []
     
+    def get_relationship_counts(self, user_name):
+        """Count the user's people per relationship type, rolled up the ontology (sibling includes elder_brother)"""
+        with self.driver.session() as session:
+            try:
+                query = """
+                MATCH (u:User {name: $user_name})-[r]->(p:Person)
+                RETURN coalesce(p.relation, toLower(type(r))) AS relation, count(p) AS count
+                """
+                counts = {}
+                for record in session.run(query, user_name=user_name):
+                    rel_type = self.ontology.canonical(record['relation']) or record['relation']
+                    counts[rel_type] = counts.get(rel_type, 0) + record['count']
+                return self.ontology.rollup(counts)
+            except Exception as e:
+                print(f"Error counting relationships for {user_name}: {e}")
+                return {}
+
+    def get_people_by_relationship(self, user_name, relation):
+        """Return the names of people whose relationship is the given type or a more specific one"""
+        query_type = self.ontology.canonical(relation)
+        if not query_type:
+            return []
+        names = []
+        for rel in self.get_user_relationships(user_name):
+            rel_type = self.ontology.canonical(rel.get('relationship'))
+            if rel_type and self.ontology.is_a(rel_type, query_type) and rel['person_name'] not in names:
+                names.append(rel['person_name'])
+        return names
+
+    def is_person_relationship(self, user_name, person_name, relation):
+        """Check whether a person's stored relationship is the given type or a more specific one"""
+        query_type = self.ontology.canonical(relation)
+        if not query_type:
+            return False
+        with self.driver.session() as session:
+            try:
+                query = """
+                MATCH (u:User {name: $user_name})-[r]->(p:Person)
+                WHERE toLower(p.name) = toLower($person_name)
+                RETURN coalesce(p.relation, toLower(type(r))) AS relation
+                """
+                return any(self.ontology.is_a(self.ontology.canonical(record['relation']), query_type)
+                           for record in session.run(query, user_name=user_name, person_name=person_name))
+            except Exception as e:
+                print(f"Error verifying relationship of {person_name}: {e}")
+                return False
+
     def check_existing_relationship(self, user_name, relationship_type):
         """Check if a relationship of this type already exists for the user"""
         with self.driver.session() as session:
@@ -683,36 +862,89 @@ class RelationshipManager:
                 print(f"Error updating relationship {relationship_type} for {user_name}: {e}")
                 return None
 
+    def upsert_relationships(self, user_name, relationships):
+        """Create (relationship_type, person_name) pairs in one write transaction: one lookup and one UNWIND write
+
+        The lookup first write-locks the User node, so concurrent messages for the same user are
+        serialized and cannot both pass the uniqueness check for father, mother, etc.
+
+        Returns (created, known, conflicts): pairs that were written, pairs that already existed,
+        and (relationship_type, new_person, existing_person) for unique types that are already taken.
+        """
+        relationships = list(dict.fromkeys(relationships))
+        if not relationships:
+            return [], [], []
+
+        rows = [{
+            'index': i,
+            'person_name': person_name,
+            'relationship_type': rel_type,
+            'neo4j_type': neo4j_relationship_type(rel_type),
+            'gender': RELATION_GENDERS.get(rel_type.lower(), 'unknown'),
+            'age': None
+        } for i, (rel_type, person_name) in enumerate(relationships)]
+
+        created, known, conflicts = [], [], []
+        with self.counting_session() as session:
+            try:
+                created, known, conflicts = session.execute_write(
+                    _upsert_relationships_tx, user_name, rows, datetime.now().isoformat())
+            except Exception as e:
+                print(f"Error upserting relationships for {user_name}: {e}")
+
+        self.record_changes(user_name, changed=bool(created))
+        if created:
+            try:
+                fact_store.add_facts(user_name, [format_fact(rel_type.lower(), (person_name.lower(), user_name.lower()))
+                                                 for rel_type, person_name in created])
+            except Exception as e:
+                print(f"Error storing facts in prolog: {e}")
+        return created, known, conflicts
+
+    def canonical_relationship(self, relation):
+        """Return the relationship type for a relation name or alias ('Big-Brother' -> elder_brother), or None"""
+        return self.ontology.canonical(relation, concrete=True)
+
+    def get_unique_relationship_holders(self, user_name):
+        """Return {relationship_type: person_name} for the user's unique relationships (father, mother, ...)"""
+        with self.driver.session() as session:
+            try:
+                query = """
+                MATCH (u:User {name: $user_name})-[r]->(p:Person)
+                WHERE type(r) IN $types
+                RETURN toLower(type(r)) AS relationship, p.name AS person_name
+                ORDER BY r.created_at
+                """
+                types = [neo4j_relationship_type(rel_type) for rel_type in UNIQUE_RELATIONSHIPS]
+                return {record['relationship']: record['person_name']
+                        for record in session.run(query, user_name=user_name, types=types)}
+            except Exception as e:
+                print(f"Error getting unique relationships for {user_name}: {e}")
+                return {}
+
+    def write_relationship_rows(self, user_name, rows):
+        """MERGE prepared rows (see relationship_upsert_query) in one UNWIND transaction; returns written indexes"""
+        if not rows:
+            return set()
+        with self.counting_session() as session:
+            try:
+                result = session.run(relationship_upsert_query(row['neo4j_type'] for row in rows),
+                    user_name=user_name, rows=rows, timestamp=datetime.now().isoformat())
+                written = {record['index'] for record in result}
+                self.record_changes(user_name)
+                return written
+            except Exception as e:
+                print(f"Error writing relationships for {user_name}: {e}")
+                return set()
+
     def store_fact_in_prolog(self, username, person_name, relationship_type):
-        """Store relationship fact in user's prolog file"""
+        """Store relationship fact - relationship(person, user) - in the user's fact store"""
         try:
-            import os
-            
-            # Ensure facts directory exists
-            fact_dir = "prolog/facts"
-            os.makedirs(fact_dir, exist_ok=True)
-            
-            # Create fact file path
-            fact_file = os.path.join(fact_dir, f"{username.replace('@', '_at_')}.pl")
-            
-            # Create the fact - relationship(person, user)
-            fact = f"{relationship_type.lower()}({person_name.lower()},{username.lower()}).\n"
-            
-            # Check if fact already exists to prevent duplicates
-            if os.path.exists(fact_file):
-                with open(fact_file, "r") as f:
-                    existing_content = f.read()
-                if fact.strip() in existing_content:
-                    return  # Fact already exists
-            
-            # Append the fact
-            with open(fact_file, "a") as f:
-                f.write(fact)
-                
+            fact = format_fact(relationship_type.lower(), (person_name.lower(), username.lower()))
+            fact_store.add_fact(username, fact)
         except Exception as e:
             print(f"Error storing fact in prolog: {e}")
 
-
     
     def process_user_input(self, text, user_name):
         """Process user input and create relationships if found"""
@@ -743,81 +975,41 @@ class RelationshipManager:
         else:
             # Check for age information with person names
             age_info = self.detect_person_age_information(text)
-            age_updates = []
-            
-            for person_name, age in age_info:
-                # Check age restrictions before updating
-                age_valid, error_msg = self.validate_person_age(user_name, person_name, age)
-                if not age_valid:
-                    age_updates.append({
-                        'person_name': person_name,
-                        'age': age,
-                        'message': error_msg
-                    })
-                else:
-                    # Update age for this specific person
-                    updated = self.update_specific_person_age(user_name, person_name, age)
-                    if updated:
-                        age_updates.append({
-                            'person_name': person_name,
-                            'age': age,
-                            'message': f"I've noted that {person_name} is {age} years old. Thank you for the information! Wanna tell more?"
-                        })
+            age_updates = self.validate_person_ages(user_name, age_info)
         
         relationships_found = self.detect_relationships(text)
         created_relationships = []
         conflict_messages = []
         
-        # Remove duplicates from relationships_found
-        unique_relationships = list(dict.fromkeys(relationships_found))
+        created, known, conflicts = self.upsert_relationships(user_name, relationships_found)
         
-        for rel_type, person_name in unique_relationships:
-            # Check if this specific person already exists for this relationship type
-            existing_person_rel = self.check_specific_person_relationship(user_name, rel_type, person_name)
-            
-            if existing_person_rel:
-                # This exact person-relationship combination already exists
-                if not any(msg.get('message', '').startswith(f"I already know that {person_name}") for msg in created_relationships):
-                    created_relationships.append({
-                        'relationship_type': rel_type,
-                        'person_name': person_name,
-                        'user': user_name,
-                        'created': False,
-                        'message': f"I already know that {person_name} is your {rel_type}."
-                    })
-            else:
-                # For unique relationships (father, mother, husband, wife), check if any exists
-                unique_relationships_list = ['father', 'mother', 'husband', 'wife', 'grandfather', 'grandmother']
-                if rel_type in unique_relationships_list:
-                    existing_rel = self.check_existing_relationship(user_name, rel_type)
-                    if existing_rel['exists']:
-                        existing_person = existing_rel['person_name']
-                        if not any(msg.get('message', '').startswith(f"I know your {rel_type}'s name already") for msg in conflict_messages):
-                            conflict_messages.append({
-                                'relationship_type': rel_type,
-                                'new_person': person_name,
-                                'existing_person': existing_person,
-                                'user': user_name,
-                                'conflict': True,
-                                'message': f"I know your {rel_type}'s name already. This name you have given is wrong. Your {rel_type} name is {existing_person}."
-                            })
-                        continue
-                # Create new relationship
-                person_node = self.create_person_node(person_name, user_name, rel_type)
-                
-                if person_node:
-                    relationship = self.create_relationship(user_name, person_name, rel_type)
-                    if relationship:
-                        # Store the fact in prolog file
-                        self.store_fact_in_prolog(user_name, person_name, rel_type)
-                        
-                        created_relationships.append({
-                            'relationship_type': rel_type,
-                            'person_name': person_name,
-                            'user': user_name,
-                            'created': True,
-                            'message': f"I've noted that {person_name} is your {rel_type}."
-                        })
+        for rel_type, person_name in known:
+            created_relationships.append({
+                'relationship_type': rel_type,
+                'person_name': person_name,
+                'user': user_name,
+                'created': False,
+                'message': f"I already know that {person_name} is your {rel_type}."
+            })
+        
+        for rel_type, person_name, existing_person in conflicts:
+            conflict_messages.append({
+                'relationship_type': rel_type,
+                'new_person': person_name,
+                'existing_person': existing_person,
+                'user': user_name,
+                'conflict': True,
+                'message': f"I know your {rel_type}'s name already. This name you have given is wrong. Your {rel_type} name is {existing_person}."
+            })
+        
+        for rel_type, person_name in created:
+            created_relationships.append({
+                'relationship_type': rel_type,
+                'person_name': person_name,
+                'user': user_name,
+                'created': True,
+                'message': f"I've noted that {person_name} is your {rel_type}."
+            })
         
         # Combine all conflicts and remove duplicates
         all_conflicts = conflict_messages
@@ -860,7 +1052,7 @@ class RelationshipManager:
     
     def clear_user_relationships(self, user_name):
         """Clear all relationships for a specific user"""
-        with self.driver.session() as session:
+        with self.counting_session() as session:
             try:
                 query = """
                 MATCH (u:User {name: $user_name})-[r]->(p:Person {user: $user_name})
@@ -874,6 +1066,7 @@ class RelationshipManager:
                 DELETE p
                 """
                 session.run(cleanup_query, user_name=user_name)
+                self.record_changes(user_name)
                 
                 return True
             except Exception as e:
@@ -882,7 +1075,7 @@ class RelationshipManager:
     
     def cleanup_generic_relationships(self, user_name):
         """Clean up generic HAS_RELATION relationships for a user"""
-        with self.driver.session() as session:
+        with self.counting_session() as session:
             try:
                 # Remove all HAS_RELATION relationships
                 cleanup_query = """
@@ -890,11 +1083,52 @@ class RelationshipManager:
                 DELETE r
                 """
                 result = session.run(cleanup_query, user_name=user_name)
+                self.record_changes(user_name)
                 return True
             except Exception as e:
                 print(f"Error cleaning up generic relationships for {user_name}: {e}")
                 return False
     
+    def backfill_person_genders(self, user_name=None):
+        """Predict gender for Person nodes with unknown gender in one bulk pass"""
+        with self.driver.session() as session:
+            try:
+                query = """
+                MATCH (p:Person)
+                WHERE coalesce(p.gender, 'unknown') = 'unknown'
+                  AND ($user_name IS NULL OR p.user = $user_name)
+                RETURN elementId(p) as id, p.name as name
+                """
+                records = list(session.run(query, user_name=user_name))
+                predictions = gender_predictor.predict_many([record['name'] for record in records])
+                
+                rows = [{'id': record['id'], 'gender': gender, 'confidence': confidence}
+                        for record, (gender, confidence) in zip(records, predictions)
+                        if gender != 'unknown']
+                if not rows:
+                    return 0
+                
+                update_query = """
+                UNWIND $rows AS row
+                MATCH (p:Person) WHERE elementId(p) = row.id
+                SET p.gender = row.gender, p.gender_confidence = row.confidence
+                WITH p
+                OPTIONAL MATCH (u:User)-->(p)
+                RETURN count(DISTINCT p) as updated_count,
+                       collect(DISTINCT u.name) + collect(DISTINCT p.user) as users
+                """
+                result = session.run(update_query, rows=rows).single()
+                if not result:
+                    return 0
+                
+                # Cached graph pages and layouts of every owner are now stale
+                for owner in set(result['users']):
+                    graph_versions.bump(owner)
+                return result['updated_count']
+            except Exception as e:
+                print(f"Error backfilling person genders: {e}")
+                return 0
+
     def migrate_existing_person_nodes_to_social_memory(self):
         """Add SocialMemory label to existing Person nodes that don't have it"""
         with self.driver.session() as session:
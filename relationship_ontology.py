@@ -0,0 +1,179 @@
+"""
+Relationship Ontology
+Maps every relationship alias and Relations_set.csv term to a canonical type
+and links the types with is-a edges (elder_brother -> brother -> sibling ->
+relative). The transitive closure is precomputed as integer bitsets, so
+"is X a kind of Y" is one AND and counts roll up to every ancestor in one pass.
+"""
+
+import re
+
+# Direct is-a links: type -> more general types
+IS_A = {
+    # Siblings
+    'elder_brother': ('brother',), 'younger_brother': ('brother',), 'half_brother': ('brother',),
+    'stepbrother': ('brother',),
+    'elder_sister': ('sister',), 'younger_sister': ('sister',), 'half_sister': ('sister',),
+    'stepsister': ('sister',),
+    'brother': ('sibling',), 'sister': ('sibling',),
+
+    # Parents and children
+    'stepfather': ('father',), 'adoptive_father': ('father',), 'foster_father': ('father',),
+    'stepmother': ('mother',), 'adoptive_mother': ('mother',), 'foster_mother': ('mother',),
+    'father': ('parent',), 'mother': ('parent',),
+    'stepson': ('son',), 'stepdaughter': ('daughter',),
+    'son': ('child',), 'daughter': ('child',), 'foster_child': ('child',),
+
+    # Spouses and partners
+    'husband': ('spouse',), 'wife': ('spouse',),
+    'boyfriend': ('partner',), 'girlfriend': ('partner',), 'fiance': ('partner',),
+
+    # Extended family
+    'grandfather': ('grandparent',), 'grandmother': ('grandparent',),
+    'great_grandfather': ('great_grandparent',), 'great_grandmother': ('great_grandparent',),
+    'grandson': ('grandchild',), 'granddaughter': ('grandchild',),
+    'uncle': ('pibling',), 'aunt': ('pibling',), 'great_uncle': ('great_pibling',), 'great_aunt': ('great_pibling',),
+    'nephew': ('nibling',), 'niece': ('nibling',),
+    'father_in_law': ('parent_in_law',), 'mother_in_law': ('parent_in_law',),
+    'brother_in_law': ('sibling_in_law',), 'sister_in_law': ('sibling_in_law',),
+    'son_in_law': ('child_in_law',), 'daughter_in_law': ('child_in_law',),
+    'parent_in_law': ('in_law',), 'sibling_in_law': ('in_law',), 'child_in_law': ('in_law',),
+    'sibling': ('relative',), 'parent': ('relative',), 'child': ('relative',), 'spouse': ('relative',),
+    'grandparent': ('relative',), 'great_grandparent': ('relative',), 'grandchild': ('relative',),
+    'pibling': ('relative',), 'great_pibling': ('relative',), 'nibling': ('relative',),
+    'cousin': ('relative',), 'in_law': ('relative',),
+
+    # Friends, godparents and work
+    'best_friend': ('friend',),
+    'godfather': ('godparent',), 'godmother': ('godparent',),
+    'godson': ('godchild',), 'goddaughter': ('godchild',),
+}
+
+# Relations_set.csv terms that are not relationship_patterns aliases but name a known type
+TERM_TYPES = {
+    'great granddad': 'great_grandfather', 'great grandparent': 'great_grandparent',
+    'grandad': 'grandfather', 'granddaddy': 'grandfather', 'grandmom': 'grandmother', 'nanna': 'grandmother',
+    'nan': 'grandmother', 'pappa': 'father', 'padre': 'father', 'female parent': 'mother',
+    'mamma': 'mother', 'mammy': 'mother', 'momma': 'mother', 'married woman': 'wife',
+    'male child': 'son', 'female child': 'daughter', 'fille': 'daughter', 'stepchild': 'child',
+    'half sibling': 'sibling', 'stepsibling': 'sibling',
+    'first cousin': 'cousin', 'full cousin': 'cousin', 'cousin german': 'cousin',
+    'in law': 'in_law', 'relative in law': 'in_law',
+    'kin': 'relative', 'kinsperson': 'relative', 'kinsfolk': 'relative', 'kindred': 'relative',
+    'relative': 'relative', 'relation': 'relative', 'family': 'relative',
+    'chum': 'friend', 'crony': 'friend', 'amigo': 'friend', 'homie': 'friend', 'companion': 'friend',
+    'bosom buddy': 'best_friend', 'lady friend': 'girlfriend',
+    'co worker': 'colleague', 'fellow worker': 'colleague', 'workfellow': 'colleague',
+    'teammate': 'colleague', 'team member': 'colleague',
+    'tutor': 'teacher', 'educator': 'teacher', 'schoolmaster': 'teacher', 'pedagogue': 'teacher',
+    'private instructor': 'teacher', 'prof': 'teacher',
+    'employer': 'boss', 'superior': 'boss', 'higher up': 'boss', 'honcho': 'boss', 'gaffer': 'boss',
+    'underling': 'employee', 'intern': 'employee', 'trainee': 'employee',
+    'schoolchild': 'student', 'scholar': 'student', 'disciple': 'student', 'educatee': 'student',
+}
+
+# Plurals the trailing-s rule gets wrong
+PLURALS = {'children': 'child', 'grandchildren': 'grandchild', 'wives': 'wife', 'kids': 'kid'}
+
+def normalize_term(term):
+    """Lowercase a relation name and collapse spaces, underscores and hyphens to single spaces"""
+    return re.sub(r'[\s_-]+', ' ', (term or '').strip().lower())
+
+class RelationshipOntology:
+    """Canonical relationship types with alias lookup and a precomputed is-a closure"""
+
+    def __init__(self, relationship_patterns, csv_terms=()):
+        """Build the alias index and the ancestor/descendant bitsets once"""
+        # Aliases name concrete types; canonical names win over aliases shared by several types ('dada')
+        self.aliases = {normalize_term(rel_type): rel_type for rel_type in relationship_patterns}
+        for rel_type, patterns in relationship_patterns.items():
+            for pattern in patterns:
+                self.aliases.setdefault(normalize_term(pattern), rel_type)
+
+        types = list(relationship_patterns)
+        for child, parents in IS_A.items():
+            types.extend((child,) + parents)
+        types.extend(TERM_TYPES.values())
+        self.types = list(dict.fromkeys(types))
+        self.ids = {rel_type: i for i, rel_type in enumerate(self.types)}
+
+        # Query names: concrete aliases, then every type name (spouse, sibling, in_law, ...) and CSV term
+        self.terms = dict(self.aliases)
+        self.terms.update({normalize_term(rel_type): rel_type for rel_type in self.types})
+        for term, rel_type in TERM_TYPES.items():
+            self.terms.setdefault(term, rel_type)
+        self.unlinked_terms = set()
+        for term in csv_terms:
+            if normalize_term(term) not in self.terms:
+                self.unlinked_terms.add(normalize_term(term))
+
+        self.ancestors = {}
+        for rel_type in self.types:
+            self._ancestor_bits(rel_type)
+        self.descendants = {rel_type: 0 for rel_type in self.types}
+        for rel_type, bits in self.ancestors.items():
+            for ancestor in self.expand(bits):
+                self.descendants[ancestor] |= 1 << self.ids[rel_type]
+        self._ancestor_lists = {rel_type: self.expand(bits) for rel_type, bits in self.ancestors.items()}
+
+    def _ancestor_bits(self, rel_type, visiting=()):
+        """Return the bitset of a type and all its ancestors, memoized"""
+        if rel_type in self.ancestors:
+            return self.ancestors[rel_type]
+        if rel_type in visiting:
+            raise ValueError(f"Cycle in relationship ontology at {rel_type}")
+        bits = 1 << self.ids[rel_type]
+        for parent in IS_A.get(rel_type, ()):
+            bits |= self._ancestor_bits(parent, visiting + (rel_type,))
+        self.ancestors[rel_type] = bits
+        return bits
+
+    def expand(self, bits):
+        """Return the type names in a bitset"""
+        names = []
+        while bits:
+            low = bits & -bits
+            names.append(self.types[low.bit_length() - 1])
+            bits ^= low
+        return names
+
+    def canonical(self, term, concrete=False):
+        """Return the type for a relation name, alias, CSV term or plural ('brothers'), or None
+
+        With concrete=True only relationship_patterns types are returned ('spouse' -> husband),
+        which is what storing a relationship needs; queries may also use general types (spouse).
+        """
+        index = self.aliases if concrete else self.terms
+        key = normalize_term(term)
+        candidates = [key, PLURALS.get(key)]
+        if key.endswith('s'):
+            candidates.append(key[:-1])
+        if key.endswith('es'):
+            candidates.append(key[:-2])
+        if key.endswith('ies'):
+            candidates.append(key[:-3] + 'y')
+        for candidate in candidates:
+            if candidate and candidate in index:
+                return index[candidate]
+        return None
+
+    def is_known(self, term):
+        """True for any alias, type or Relations_set.csv term, linked or not"""
+        return self.canonical(term) is not None or normalize_term(term) in self.unlinked_terms
+
+    def is_a(self, rel_type, general_type):
+        """True if rel_type is general_type or one of its descendants (elder_brother is_a sibling)"""
+        bits = self.ancestors.get(rel_type)
+        return bits is not None and general_type in self.ids and bool(bits >> self.ids[general_type] & 1)
+
+    def subtypes(self, rel_type):
+        """Return rel_type and every more specific type"""
+        return self.expand(self.descendants.get(rel_type, 0))
+
+    def rollup(self, counts):
+        """Add each type's count to all of its ancestors: {elder_brother: 1, brother: 1} -> brother 2, sibling 2"""
+        totals = {}
+        for rel_type, count in counts.items():
+            for ancestor in self._ancestor_lists.get(rel_type, (rel_type,)):
+                totals[ancestor] = totals.get(ancestor, 0) + count
+        return totals
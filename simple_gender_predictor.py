@@ -3,81 +3,294 @@
 Simple gender predictor using basic name patterns and built-in dataset
 """
 
-import pandas as pd
+import os
+import csv
+import mmap
+import struct
 import re
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+
+TABLE_MAGIC = b"NGT1"
+TABLE_HEADER = struct.Struct("<4sII")
+TABLE_OFFSET = struct.Struct("<I")
+
+def compile_name_table(csv_file="names_to_train.csv", table_file="names_to_train.bin"):
+    """Compile the name-gender CSV into a sorted string table with bit-packed labels
+
+    Layout: header (magic, name count, string blob size), (count + 1) uint32 offsets
+    into the blob, the blob of sorted lowercase UTF-8 names, then one label bit per
+    name (1 = male). Later CSV rows win for duplicate names, as in the CSV loader.
+    """
+    name_gender_map = {}
+    with open(csv_file, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            name = row['Names'].lower().strip()
+            name_gender_map[name.encode("utf-8")] = row['Labels'].strip() == "1"
+
+    names = sorted(name_gender_map)
+    offsets = [0]
+    for name in names:
+        offsets.append(offsets[-1] + len(name))
+
+    labels = bytearray((len(names) + 7) // 8)
+    for i, name in enumerate(names):
+        if name_gender_map[name]:
+            labels[i >> 3] |= 1 << (i & 7)
+
+    # Each compiler writes its own temp file so concurrent workers never interleave writes
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(table_file)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(TABLE_HEADER.pack(TABLE_MAGIC, len(names), offsets[-1]))
+            f.write(b"".join(TABLE_OFFSET.pack(offset) for offset in offsets))
+            f.write(b"".join(names))
+            f.write(bytes(labels))
+        os.replace(tmp_file, table_file)
+    except BaseException:
+        os.remove(tmp_file)
+        raise
+    return len(names)
+
+class NameGenderTable:
+    """Read-only memory-mapped name table searched with binary search"""
+
+    def __init__(self, table_file):
+        """Map the compiled table; pages are shared between processes"""
+        with open(table_file, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, blob_size = TABLE_HEADER.unpack_from(self._mm, 0)
+        if magic != TABLE_MAGIC:
+            raise ValueError(f"{table_file} is not a compiled name table")
+        self._offsets_at = TABLE_HEADER.size
+        self._blob_at = self._offsets_at + (self.count + 1) * TABLE_OFFSET.size
+        self._labels_at = self._blob_at + blob_size
+
+    def _name_at(self, i):
+        """Return the encoded name stored at sorted position i"""
+        start, end = struct.unpack_from("<II", self._mm, self._offsets_at + i * TABLE_OFFSET.size)
+        return self._mm[self._blob_at + start:self._blob_at + end]
+
+    def _find(self, name):
+        """Binary search for a name and return its position or -1"""
+        key = name.encode("utf-8")
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if self._name_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self._name_at(lo) == key:
+            return lo
+        return -1
+
+    def get(self, name, default=None):
+        """Return 'male'/'female' for a lowercase name, or default"""
+        i = self._find(name)
+        if i < 0:
+            return default
+        return "male" if self._mm[self._labels_at + (i >> 3)] >> (i & 7) & 1 else "female"
+
+    def __contains__(self, name):
+        return self._find(name) >= 0
+
+    def __getitem__(self, name):
+        gender = self.get(name)
+        if gender is None:
+            raise KeyError(name)
+        return gender
+
+    def __len__(self):
+        return self.count
 
 class SimpleGenderPredictor:
     """Gender predictor using name patterns and CSV dataset"""
-    
-    def __init__(self, csv_file="names_to_train.csv"):
-        """Initialize with name-based gender predictor"""
-        self.name_gender_map = {}
-        self.load_training_data(csv_file)
-        
+
+    def __init__(self, csv_file="names_to_train.csv", table_file=None, cache_size=4096,
+                 model_file="gender_ngram_model.npz"):
+        """Initialize with name-based gender predictor; the name table and model are opened lazily"""
+        self.csv_file = csv_file
+        self.table_file = table_file or os.path.splitext(csv_file)[0] + ".bin"
+        self._name_gender_map = None
+        self.model_file = model_file
+        self._ngram_model = None
+        self._ngram_model_loaded = False
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
         self.male_endings = ['son', 'man', 'boy', 'dad', 'father']
         self.female_endings = ['daughter', 'woman', 'girl', 'mom', 'mother']
-        
+
         self.male_patterns = ['john', 'michael', 'david', 'james', 'robert', 'william', 'richard', 'thomas', 'daniel', 'matthew']
         self.female_patterns = ['mary', 'patricia', 'jennifer', 'linda', 'elizabeth', 'barbara', 'susan', 'jessica', 'sarah', 'karen']
-    
+
+    @property
+    def name_gender_map(self):
+        """Name-gender lookup table, loaded on first use"""
+        if self._name_gender_map is None:
+            self._name_gender_map = self.load_training_data(self.csv_file)
+        return self._name_gender_map
+
     def load_training_data(self, csv_file):
-        """Load name-gender mappings from CSV file"""
+        """Open the compiled name table, rebuilding it when the CSV is newer"""
         try:
-            df = pd.read_csv(csv_file)
-            for _, row in df.iterrows():
-                name = row['Names'].lower().strip()
-                gender = 'male' if row['Labels'] == 1 else 'female'
-                self.name_gender_map[name] = gender
+            if (not os.path.exists(self.table_file) or
+                    (os.path.exists(csv_file) and os.path.getmtime(csv_file) > os.path.getmtime(self.table_file))):
+                compile_name_table(csv_file, self.table_file)
+            return NameGenderTable(self.table_file)
         except Exception as e:
             print(f"Could not load {csv_file}: {e}")
-    
-    def predict_gender(self, name):
-        """Predict gender using rules and name database"""
-        if not name or not isinstance(name, str):
-            return "unknown"
-        
-        name_clean = name.lower().strip()
-        
-        if name_clean in self.name_gender_map:
-            return self.name_gender_map[name_clean]
-        
+            return {}
+
+    @property
+    def ngram_model(self):
+        """Character n-gram model trained offline by gender_ngram_model.py, if available"""
+        if not self._ngram_model_loaded:
+            self._ngram_model_loaded = True
+            try:
+                if self.model_file and os.path.exists(self.model_file):
+                    from gender_ngram_model import NgramGenderModel
+                    self._ngram_model = NgramGenderModel.load(self.model_file)
+            except Exception as e:
+                print(f"Could not load {self.model_file}: {e}")
+        return self._ngram_model
+
+    @staticmethod
+    def _from_probability(p_male):
+        """Convert a model P(male) into (gender, confidence) below dataset confidence"""
+        p_male = float(p_male)
+        return ("male" if p_male >= 0.5 else "female"), round(min(max(p_male, 1 - p_male), 0.8), 2)
+
+    def _predict_uncached(self, name_clean):
+        """Predict gender and confidence for a normalized name with one table lookup"""
+        gender = self.name_gender_map.get(name_clean)
+        if gender is not None:
+            return gender, 0.85
+
+        if self.ngram_model is not None and any(c.isalpha() for c in name_clean):
+            return self._from_probability(self.ngram_model.predict_one(name_clean))
+
+        gender = self._predict_from_patterns(name_clean)
+        return gender, (0.0 if gender == "unknown" else 0.65)
+
+    def _predict_from_patterns(self, name_clean):
+        """Predict gender from name patterns for names missing from the dataset"""
         for male_name in self.male_patterns:
             if male_name in name_clean:
                 return "male"
-        
+
         for female_name in self.female_patterns:
             if female_name in name_clean:
                 return "female"
-        
+
         for ending in self.male_endings:
             if name_clean.endswith(ending):
                 return "male"
-        
+
         for ending in self.female_endings:
             if name_clean.endswith(ending):
                 return "female"
-        
+
         if any(char in name_clean for char in ['a', 'e', 'i']) and name_clean.endswith('a'):
             return "female"
-        
+
         if name_clean.endswith(('d', 'n', 'r', 't', 's')):
             return "male"
-        
+
         return "unknown"
-    
+
+    def predict(self, name):
+        """Predict (gender, confidence) for a name, memoized per normalized name"""
+        if not name or not isinstance(name, str):
+            return "unknown", 0.0
+
+        name_clean = name.lower().strip()
+        with self._cache_lock:
+            result = self._cache.get(name_clean)
+            if result is not None:
+                self._cache.move_to_end(name_clean)
+                self.cache_hits += 1
+                return result
+            self.cache_misses += 1
+
+        result = self._predict_uncached(name_clean)
+        with self._cache_lock:
+            self._cache[name_clean] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def predict_many(self, names):
+        """Predict (gender, confidence) for many names, resolving each distinct name once
+
+        Bulk results are not added to the memo cache so backfills do not evict hot names.
+        """
+        keys = [name.lower().strip() if name and isinstance(name, str) else None for name in names]
+        resolved = {None: ("unknown", 0.0)}
+        with self._cache_lock:
+            for key in set(keys):
+                if key in resolved:
+                    continue
+                cached = self._cache.get(key)
+                if cached is not None:
+                    resolved[key] = cached
+                    self.cache_hits += 1
+
+        # Dataset hits first, then score every remaining name in one model batch
+        unseen = []
+        for key in set(keys):
+            if key in resolved:
+                continue
+            self.cache_misses += 1
+            gender = self.name_gender_map.get(key)
+            if gender is not None:
+                resolved[key] = (gender, 0.85)
+            else:
+                unseen.append(key)
+
+        model = self.ngram_model
+        if model is not None:
+            scorable = [key for key in unseen if any(c.isalpha() for c in key)]
+            for key, p_male in zip(scorable, model.predict_proba(scorable)):
+                resolved[key] = self._from_probability(p_male)
+
+        for key in unseen:
+            if key not in resolved:
+                resolved[key] = self._predict_uncached(key)
+        return [resolved[key] for key in keys]
+
+    def cache_stats(self):
+        """Return memo cache hit/miss counters"""
+        total = self.cache_hits + self.cache_misses
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'size': len(self._cache),
+            'hit_rate': self.cache_hits / total if total else 0.0
+        }
+
+    def predict_gender(self, name):
+        """Predict gender using rules and name database"""
+        return self.predict(name)[0]
+
     def predict_with_confidence(self, name):
         """Predict gender with confidence score"""
-        gender = self.predict_gender(name)
-        
-        if gender == "unknown":
-            return gender, 0.0
-        
-        name_clean = name.lower().strip()
-        
-        if name_clean in self.name_gender_map:
-            return gender, 0.85
-        
-        return gender, 0.65
+        return self.predict(name)
 
 # Global instance
-simple_gender_predictor = SimpleGenderPredictor() 
\ No newline at end of file
+simple_gender_predictor = SimpleGenderPredictor()
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Compile names_to_train.csv into a memory-mappable name table")
+    arg_parser.add_argument("--csv", default="names_to_train.csv")
+    arg_parser.add_argument("--out", default="names_to_train.bin")
+    args = arg_parser.parse_args()
+
+    print(f"Compiled {compile_name_table(args.csv, args.out)} names into {args.out}")